@@ -0,0 +1,131 @@
+import os
+import time
+import zlib
+import tarfile
+import hashlib
+
+from collections import deque
+from executors import ContextThreadPoolExecutor
+from utils import AMLConfigurationException
+from tracing import traced
+
+
+PACKAGE_EXTENSIONS = {"gzip": "tar.gz", "zstd": "tar.zst"}
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+class HashingWriter():
+    # Counting and hashing the compressed bytes while they are written to the archive file
+    def __init__(self, fileobj):
+        self.fileobj = fileobj
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def write(self, data):
+        self.sha256.update(data)
+        self.size += len(data)
+        return self.fileobj.write(data)
+
+    def flush(self):
+        self.fileobj.flush()
+
+    def close(self):
+        pass
+
+
+class ParallelGzipWriter():
+    # Compressing fixed-size chunks as independent gzip members, the concatenated members form a valid gzip file
+    def __init__(self, fileobj, level=6, max_workers=4, chunk_size=CHUNK_SIZE):
+        self.fileobj = fileobj
+        self.level = level
+        self.chunk_size = chunk_size
+        self.max_pending = 2 * max_workers
+        self.executor = ContextThreadPoolExecutor(max_workers=max_workers)
+        self.pending = deque()
+        self.buffer = bytearray()
+
+    def write(self, data):
+        self.buffer += data
+        while len(self.buffer) >= self.chunk_size:
+            self.submit(bytes(self.buffer[:self.chunk_size]))
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def submit(self, chunk):
+        # Bounding the number of chunks in memory by writing finished members in order
+        self.pending.append(self.executor.submit(compress_gzip_member, chunk, self.level))
+        while len(self.pending) > self.max_pending:
+            self.fileobj.write(self.pending.popleft().result())
+
+    def close(self):
+        try:
+            if len(self.buffer) > 0:
+                self.submit(bytes(self.buffer))
+                self.buffer = bytearray()
+            while len(self.pending) > 0:
+                self.fileobj.write(self.pending.popleft().result())
+        finally:
+            self.executor.shutdown(wait=True)
+
+
+def compress_gzip_member(chunk, level):
+    # zlib releases the GIL while compressing, so that chunks are compressed in parallel
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress(chunk) + compressor.flush()
+
+
+@traced("package_model")
+def package_model(model_path, output_directory, compression="gzip", level=None, max_workers=4):
+    if compression not in PACKAGE_EXTENSIONS:
+        print(f"::error::Unsupported compression '{compression}'. Please use one of {list(PACKAGE_EXTENSIONS.keys())}.")
+        raise AMLConfigurationException(f"Unsupported compression '{compression}'")
+    level = level if level is not None else DEFAULT_LEVELS[compression]
+    if compression == "gzip" and level > 9:
+        print(f"::error::Compression level {level} is not supported by gzip. Please use a level between 1 and 9.")
+        raise AMLConfigurationException(f"Compression level {level} is not supported by gzip")
+    model_name = os.path.basename(os.path.normpath(model_path))
+    archive_path = os.path.join(output_directory, f"{model_name}.{PACKAGE_EXTENSIONS[compression]}")
+    statistics = {"files": 0, "bytes": 0}
+
+    def normalize(tarinfo):
+        # Removing owner information, so that the archive does not depend on the runner
+        tarinfo.uid = tarinfo.gid = 0
+        tarinfo.uname = tarinfo.gname = ""
+        if tarinfo.isfile():
+            statistics["files"] += 1
+            statistics["bytes"] += tarinfo.size
+        return tarinfo
+
+    # Streaming the tar archive through the compressor into the archive file
+    print(f"::debug::Packaging model '{model_path}' with {compression} (level {level}, {max_workers} workers)")
+    start = time.time()
+    with open(archive_path, "wb") as f:
+        output = HashingWriter(f)
+        if compression == "zstd":
+            try:
+                import zstandard
+            except ImportError:
+                print("::error::Packaging with zstd requires the 'zstandard' package. Please install it or use gzip.")
+                raise AMLConfigurationException("Packaging with zstd requires the 'zstandard' package")
+            writer = zstandard.ZstdCompressor(level=level, threads=max_workers).stream_writer(output)
+        else:
+            writer = ParallelGzipWriter(output, level=level, max_workers=max_workers)
+        try:
+            with tarfile.open(fileobj=writer, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                tar.add(model_path, arcname=model_name, filter=normalize)
+        finally:
+            writer.close()
+    duration = max(time.time() - start, 1e-6)
+    print(f"::debug::Packaged {statistics['files']} files with {statistics['bytes'] / 1024 ** 2:.1f} MB into {output.size / 1024 ** 2:.1f} MB in {duration:.1f} s ({statistics['bytes'] / 1024 ** 2 / duration:.1f} MB/s)")
+
+    # Model properties only support string values
+    package_properties = {
+        "package_format": PACKAGE_EXTENSIONS[compression],
+        "package_compression_level": str(level),
+        "package_files": str(statistics["files"]),
+        "package_source_bytes": str(statistics["bytes"]),
+        "package_bytes": str(output.size),
+        "package_sha256": output.sha256.hexdigest()
+    }
+    return archive_path, package_properties
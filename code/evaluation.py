@@ -0,0 +1,68 @@
+import numpy as np
+
+from utils import AMLConfigurationException
+
+
+def metrics_to_array(metrics, metric_names):
+    # Missing metrics are represented as NaN, so that they fail every comparison
+    array = np.full((len(metrics), len(metric_names)), np.nan)
+    for row, run_metrics in enumerate(metrics):
+        for column, metric_name in enumerate(metric_names):
+            value = run_metrics.get(metric_name, None)
+            if value is None:
+                continue
+            try:
+                array[row, column] = float(value)
+            except (TypeError, ValueError) as exception:
+                print(f"::error::Metric comparison failed for metric name '{metric_name}': {exception}")
+                raise AMLConfigurationException(f"Metric comparison failed for metric name '{metric_name}'")
+    return array
+
+
+def evaluate_candidates(candidate_metrics, baseline_metrics, metrics_max, metrics_min, metrics_tolerance=None, metrics_weights=None):
+    metric_names = list(metrics_max) + list(metrics_min)
+    candidate_ids = list(candidate_metrics.keys())
+    metrics_tolerance = metrics_tolerance if metrics_tolerance is not None else {}
+    metrics_weights = metrics_weights if metrics_weights is not None else {}
+
+    # Loading metrics into arrays with one row per run and one column per metric
+    candidates = metrics_to_array(
+        metrics=[candidate_metrics[candidate_id] for candidate_id in candidate_ids],
+        metric_names=metric_names
+    )
+    baselines = metrics_to_array(
+        metrics=baseline_metrics,
+        metric_names=metric_names
+    )
+    directions = np.array([1.0] * len(metrics_max) + [-1.0] * len(metrics_min))
+    tolerances = np.array([float(metrics_tolerance.get(metric_name, 0.0)) for metric_name in metric_names])
+    weights = np.array([float(metrics_weights.get(metric_name, 1.0)) for metric_name in metric_names])
+
+    # Orienting metrics, so that higher values are always better, and using the best baseline as reference
+    oriented_baselines = baselines * directions
+    missing_baselines = np.all(np.isnan(oriented_baselines), axis=0)
+    if np.any(missing_baselines):
+        metric_name = metric_names[int(np.argmax(missing_baselines))]
+        print(f"::error::Metric comparison failed for metric name '{metric_name}': Metric was not logged by the production model run")
+        raise AMLConfigurationException(f"Metric comparison failed for metric name '{metric_name}'")
+    reference = np.nanmax(oriented_baselines, axis=0) if len(baseline_metrics) > 0 else np.zeros(len(metric_names))
+
+    # Comparing all candidates and metrics in one pass
+    deltas = candidates * directions - reference
+    metrics_passed = deltas >= -tolerances
+    passed = np.all(metrics_passed, axis=1)
+    scale = np.where(np.abs(reference) > 0.0, np.abs(reference), 1.0)
+    relative_deltas = np.where(np.isnan(deltas), 0.0, deltas / scale)
+    scores = relative_deltas @ weights
+
+    # Ranking candidates that passed first and then by weighted relative improvement
+    order = np.lexsort((-scores, ~passed))
+    ranking = []
+    for index in order:
+        ranking.append({
+            "run_id": candidate_ids[index],
+            "passed": bool(passed[index]),
+            "score": float(scores[index]),
+            "failed_metrics": [metric_names[column] for column in np.flatnonzero(~metrics_passed[index])]
+        })
+    return ranking, bool(np.any(passed))
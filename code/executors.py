@@ -0,0 +1,9 @@
+import contextvars
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ContextThreadPoolExecutor(ThreadPoolExecutor):
+    # Running every task in a copy of the context of the submitting thread, so that context variables like the output of a service job reach the workers
+    def submit(self, fn, *args, **kwargs):
+        return super().submit(contextvars.copy_context().run, fn, *args, **kwargs)
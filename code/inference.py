@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import math
+import time
+import shutil
+import tempfile
+import subprocess
+
+from contextlib import contextmanager
+from utils import AMLConfigurationException, AMLModelPerformanceException, get_production_models, get_baseline_filter, get_baseline_key
+from tracing import traced
+from retries import call_with_retries
+
+
+INFERENCE_PROPERTY_PREFIX = "inference_"
+# Measurements for which a higher value of the new model is a regression, a lower throughput is a regression as well
+LOWER_IS_BETTER = ["latency_p50_ms", "latency_p99_ms", "load_seconds", "peak_rss_mb", "model_size_mb"]
+HIGHER_IS_BETTER = ["throughput_rows_per_second"]
+THREAD_VARIABLES = ["OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS", "TF_NUM_INTRAOP_THREADS"]
+
+
+def get_path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    return sum(os.path.getsize(os.path.join(root, file_name)) for root, _, file_names in os.walk(path) for file_name in file_names)
+
+
+def load_predict_function(model_path, framework, threads=None):
+    # Importing the framework lazily, so that only the framework of the benchmarked model has to be installed
+    framework = (framework or "").lower()
+    try:
+        if framework == "scikitlearn":
+            try:
+                import joblib
+                model = joblib.load(model_path)
+            except ImportError:
+                import pickle
+                with open(model_path, "rb") as f:
+                    model = pickle.load(f)
+            return model.predict
+        elif framework == "onnx":
+            import onnxruntime
+            options = onnxruntime.SessionOptions()
+            if threads is not None:
+                options.intra_op_num_threads = threads
+            session = onnxruntime.InferenceSession(model_path, sess_options=options)
+            input_name = session.get_inputs()[0].name
+            return lambda batch: session.run(None, {input_name: batch.astype("float32")})
+        elif framework in ["tensorflow", "keras"]:
+            import tensorflow
+            model = tensorflow.keras.models.load_model(model_path)
+            return model.predict_on_batch
+    except ImportError as exception:
+        raise AMLConfigurationException(f"The inference benchmark of '{framework}' models requires the framework to be installed: {exception}")
+    raise AMLConfigurationException(f"The inference benchmark does not support the model framework '{framework}'. Please use scikitlearn, onnx, tensorflow or keras.")
+
+
+def load_sample(sample_file=None, dataset=None, sample_shape=None, max_rows=10000):
+    import numpy
+
+    # Loading rows from a local sample file or from the sample input dataset of the model, or generating synthetic rows
+    if sample_file is not None:
+        if sample_file.endswith(".npy"):
+            sample = numpy.load(sample_file)
+        elif sample_file.endswith(".json"):
+            with open(sample_file) as f:
+                sample = numpy.asarray(json.load(f))
+        elif sample_file.endswith(".csv"):
+            with open(sample_file) as f:
+                first_line = f.readline()
+            try:
+                [float(value) for value in first_line.split(",")]
+                skip_header = 0
+            except ValueError:
+                skip_header = 1
+            sample = numpy.genfromtxt(sample_file, delimiter=",", skip_header=skip_header, max_rows=max_rows)
+        else:
+            raise AMLConfigurationException(f"Unsupported sample file '{sample_file}'. Please provide a .npy, .json or .csv file.")
+    elif dataset is not None:
+        if not hasattr(dataset, "to_pandas_dataframe"):
+            raise AMLConfigurationException("The sample input dataset must be a tabular dataset to be used in the inference benchmark.")
+        sample = dataset.take(max_rows).to_pandas_dataframe().values
+    elif sample_shape is not None:
+        sample = numpy.random.default_rng(0).random((min(max_rows, 1000), *sample_shape))
+    else:
+        raise AMLConfigurationException("The inference benchmark requires a sample file, a sample input dataset or a sample shape.")
+    if len(sample) < 1:
+        raise AMLConfigurationException("The sample of the inference benchmark is empty.")
+    return sample[:max_rows]
+
+
+def run_benchmark(config):
+    import numpy
+    import resource
+
+    # Runs in a separate process, so that the peak memory only contains the model and the framework
+    sample = numpy.load(config["sample_file"], allow_pickle=False)
+    batch_size = min(config["batch_size"], len(sample))
+    start = time.perf_counter()
+    predict = load_predict_function(
+        model_path=config["model_path"],
+        framework=config["framework"],
+        threads=config.get("threads", None)
+    )
+    load_seconds = time.perf_counter() - start
+    batches = [sample[i:i + batch_size] for i in range(0, len(sample) - batch_size + 1, batch_size)]
+    for i in range(config.get("warmup", 3)):
+        predict(batches[i % len(batches)])
+
+    latencies = []
+    cpu_start = time.process_time()
+    start = time.perf_counter()
+    for i in range(config["iterations"]):
+        batch_start = time.perf_counter()
+        predict(batches[i % len(batches)])
+        latencies.append(time.perf_counter() - batch_start)
+    duration = max(time.perf_counter() - start, 1e-9)
+    cpu_seconds = time.process_time() - cpu_start
+    return {
+        "latency_p50_ms": float(numpy.percentile(latencies, 50)) * 1000,
+        "latency_p99_ms": float(numpy.percentile(latencies, 99)) * 1000,
+        "throughput_rows_per_second": batch_size * config["iterations"] / duration,
+        "load_seconds": load_seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "cpu_cores_used": cpu_seconds / duration
+    }
+
+
+def measure_inference(model_path, framework, sample, batch_size=32, iterations=100, warmup=3, threads=None, timeout=600):
+    import numpy
+
+    # Handing the sample to the benchmark process as file, the process imports the same packages as the action
+    directory = tempfile.mkdtemp(prefix="aml-inference-")
+    try:
+        sample_file = os.path.join(directory, "sample.npy")
+        numpy.save(sample_file, numpy.asarray(sample))
+        config = {
+            "model_path": model_path,
+            "framework": framework,
+            "sample_file": sample_file,
+            "batch_size": batch_size,
+            "iterations": iterations,
+            "warmup": warmup,
+            "threads": threads
+        }
+        environment = dict(os.environ, PYTHONPATH=os.pathsep.join(path for path in sys.path if path))
+        if threads is not None:
+            environment.update({variable: str(threads) for variable in THREAD_VARIABLES})
+        process = subprocess.run(
+            [sys.executable, os.path.abspath(__file__)],
+            input=json.dumps(config).encode("utf-8"),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=environment,
+            timeout=timeout
+        )
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    if process.returncode != 0:
+        error = process.stderr.decode("utf-8", errors="replace").strip().splitlines()
+        print(f"::error::Inference benchmark of model '{model_path}' failed: {error[-1] if error else process.returncode}")
+        raise AMLConfigurationException(f"Inference benchmark of model '{model_path}' failed")
+    results = json.loads(process.stdout.decode("utf-8").strip().splitlines()[-1])
+    results["model_size_mb"] = get_path_size(model_path) / 1024 ** 2
+    return results
+
+
+def get_inference_properties(results):
+    # Model properties only support string values
+    return {f"{INFERENCE_PROPERTY_PREFIX}{name}": f"{value:.6g}" for name, value in results.items()}
+
+
+def check_inference_budgets(results, baseline_properties, budgets):
+    # Budgets are the factors by which a measurement of the new model may be worse than the one of the baseline
+    for name, budget in budgets.items():
+        try:
+            baseline_value = float(baseline_properties.get(f"{INFERENCE_PROPERTY_PREFIX}{name}", None))
+        except (TypeError, ValueError):
+            print(f"::debug::Baseline has no inference measurement '{name}'. Skipping the comparison.")
+            continue
+        value = results[name]
+        if name in HIGHER_IS_BETTER:
+            regression = baseline_value / value if value > 0 else float("inf")
+        else:
+            regression = value / baseline_value if baseline_value > 0 else (1.0 if value <= 0 else float("inf"))
+        print(f"::debug::Inference measurement '{name}': {value:.6g} (baseline {baseline_value:.6g}, regression factor {regression:.3f}, budget {budget})")
+        if regression > budget:
+            print(f"::error::New model exceeds the inference budget for '{name}': {value:.6g} compared to {baseline_value:.6g} of the baseline (factor {regression:.2f} > {budget})")
+            raise AMLModelPerformanceException(f"New model exceeds the inference budget for '{name}'")
+
+
+@contextmanager
+def prepare_benchmark(parameters, model_path, best_run=None, datasets=None, source_directory=None):
+    # Models of runs are downloaded, so that the benchmark loads the same files that are registered
+    directory = None
+    try:
+        if best_run is not None:
+            directory = tempfile.mkdtemp(prefix="aml-inference-model-")
+            print(f"::debug::Downloading model '{model_path}' of run '{best_run.id}' for the inference benchmark")
+            call_with_retries(
+                best_run.download_files,
+                operation="Downloading model",
+                prefix=model_path,
+                output_directory=directory,
+                append_prefix=True
+            )
+            model_path = os.path.join(directory, model_path)
+        sample_file = parameters.get("inference_sample_file", None)
+        if sample_file is not None and source_directory is not None:
+            sample_file = os.path.join(source_directory, sample_file)
+        sample = load_sample(
+            sample_file=sample_file,
+            dataset=(datasets or {}).get(parameters.get("sample_input_dataset", None), None),
+            sample_shape=parameters.get("inference_sample_shape", None)
+        )
+        yield model_path, sample
+    finally:
+        if directory is not None:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+@traced("benchmark_inference")
+def benchmark_inference(workspace, parameters, model_name, model_path, sample, production_models=None):
+    print(f"::debug::Benchmarking inference of model '{model_name}' with {len(sample)} sample rows")
+    results = measure_inference(
+        model_path=model_path,
+        framework=parameters.get("model_framework", None),
+        sample=sample,
+        batch_size=parameters.get("inference_batch_size", 32),
+        iterations=parameters.get("inference_iterations", 100)
+    )
+    print(f"::debug::Inference benchmark results: {json.dumps(results)}")
+
+    # Comparing the measurements with the latest baseline version
+    budgets = parameters.get("inference_budgets", {})
+    if len(budgets) > 0 and not parameters.get("force_registration", False):
+        baseline_filter = get_baseline_filter(parameters)
+        baseline_versions = parameters.get("baseline_versions", 1)
+        baseline_key = get_baseline_key(model_name, baseline_filter, baseline_versions)
+        if production_models is not None and baseline_key in production_models:
+            baseline_models = production_models[baseline_key]
+        else:
+            baseline_models = get_production_models(
+                workspace=workspace,
+                model_name=model_name,
+                count=baseline_versions,
+                baseline_filter=baseline_filter
+            )
+        if len(baseline_models) > 0:
+            check_inference_budgets(
+                results=results,
+                baseline_properties=baseline_models[0].properties or {},
+                budgets=budgets
+            )
+        else:
+            print("::debug::Found no baseline version. Skipping the comparison of the inference benchmark.")
+    return get_inference_properties(results)
+
+
+def round_up(value, step=0.1):
+    return max(math.ceil(round(value / step, 6)) * step, step)
+
+
+@traced("size_resources")
+def size_resources(parameters, model_path, sample, saturation=0.9):
+    # Measuring the model with every thread count, the smallest thread count that reaches most of the best throughput saturates the model
+    thread_counts = sorted(set(parameters.get("resource_sizing_threads", [1, 2, 4])))
+    headroom = parameters.get("resource_headroom", 0.25)
+    measurements = []
+    for threads in thread_counts:
+        results = measure_inference(
+            model_path=model_path,
+            framework=parameters.get("model_framework", None),
+            sample=sample,
+            batch_size=parameters.get("inference_batch_size", 32),
+            iterations=parameters.get("inference_iterations", 100),
+            threads=threads
+        )
+        print(f"::debug::Resource sizing with {threads} threads: {results['throughput_rows_per_second']:.1f} rows/s, {results['cpu_cores_used']:.2f} cores, {results['peak_rss_mb']:.1f} MB")
+        measurements.append(dict({"threads": threads}, **{name: round(results[name], 3) for name in ["throughput_rows_per_second", "latency_p99_ms", "cpu_cores_used", "peak_rss_mb"]}))
+    best_throughput = max(measurement["throughput_rows_per_second"] for measurement in measurements)
+    saturated = next(measurement for measurement in measurements if measurement["throughput_rows_per_second"] >= saturation * best_throughput)
+
+    # Adding headroom to the measured usage and rounding to the granularity of the resource configuration
+    cpu = round(round_up(saturated["cpu_cores_used"] * (1 + headroom)), 1)
+    memory_gb = round(round_up(max(measurement["peak_rss_mb"] for measurement in measurements) / 1024 * (1 + headroom)), 1)
+    print(f"::debug::Recommended resource configuration: {cpu} CPU cores and {memory_gb} GB memory ({saturated['threads']} threads saturate the model)")
+    properties = {
+        "resource_recommended_cpu_cores": str(cpu),
+        "resource_recommended_memory_gb": str(memory_gb),
+        "resource_saturation_threads": str(saturated["threads"]),
+        "resource_sizing_measurements": json.dumps(measurements)
+    }
+    return cpu, memory_gb, properties
+
+
+if __name__ == "__main__":
+    print(json.dumps(run_benchmark(json.load(sys.stdin))))
@@ -1,23 +1,125 @@
 import os
+import sys
 import json
+import shutil
+import tempfile
+import asyncio
+import functools
+
+from concurrent.futures import as_completed
 
-from azureml.core import Workspace, Experiment, Run, Model
-from azureml.core.authentication import ServicePrincipalAuthentication
-from azureml.core.resource_configuration import ResourceConfiguration
-from azureml.exceptions import AuthenticationException, ProjectSystemException, UserErrorException, ModelPathNotFoundException, WebserviceException
-from adal.adal_error import AdalError
-from msrest.exceptions import AuthenticationError
 from json import JSONDecodeError
-from utils import AMLConfigurationException, get_model_framework, get_dataset, get_best_run, compare_metrics, mask_parameter, validate_json, splitall
-from schemas import azure_credentials_schema, parameters_schema
+from utils import AMLConfigurationException, AMLModelPerformanceException, MODEL_HASH_PROPERTY, find_model_file, hash_model_path, get_model_framework, get_datasets, get_best_run, get_production_model, get_production_models, get_baseline_filter, get_baseline_key, compare_metrics, get_run_artifact_index, find_run_artifact, mask_parameter, validate_json, splitall
+from schemas import azure_credentials_schema, parameters_schema, target_workspaces_schema
+from upload import stage_model, register_staged_model
+from retries import call_with_retries, configure_retries, configure_session_pool, get_retry_statistics
+from archive import package_model
+from inference import prepare_benchmark, benchmark_inference, size_resources
+from staging import StagingCache, get_staged
+from manifest import get_manifest_key, get_manifest_model, save_manifest_entry
+from tracing import start_trace, trace_phase, traced, finish_trace
+from workspace_cache import get_cache_key, load_cached_workspace, save_workspace_cache, invalidate_workspace_cache
+from executors import ContextThreadPoolExecutor
+from service import AMLServiceException, RegistrationService, serve, send_request, wait_for_job
+from watch import PollInterval, get_checkpoint_key, watch_experiment
+
+
+CONFIG_FILE_NAME = "aml_arm_config.json"
 
 
 def main():
+    start_trace()
+
     # Loading input values
     print("::debug::Loading input values")
     experiment_name = os.environ.get("INPUT_EXPERIMENT_NAME", default=None)
     run_id = os.environ.get("INPUT_RUN_ID", default=None)
+    azure_credentials = load_azure_credentials()
+
+    # Loading parameters file
+    with trace_phase("load_parameters"):
+        model_specs, batch = load_parameters()
+    max_workers, execution_mode = load_settings()
+    cloud = get_cloud(azure_credentials)
+    job = {
+        "model_specs": model_specs,
+        "batch": batch,
+        "experiment_name": experiment_name,
+        "run_id": run_id,
+        "default_model_name": get_default_model_name(),
+        "max_workers": max_workers,
+        "execution_mode": execution_mode,
+        "manifest_file": os.environ.get("INPUT_MANIFEST_FILE", default="") or None
+    }
+
+    # Registering the model in several workspaces
+    targets = load_targets(
+        azure_credentials=azure_credentials
+    )
+    if targets is not None:
+        if experiment_name and run_id:
+            print("::error::Models from AML runs can only be registered in the workspace of the run. Please remove the input 'target_workspaces' or register the model from your GitHub workspace.")
+            raise AMLConfigurationException("Models from AML runs can only be registered in the workspace of the run.")
+        register_targets(
+            targets=targets,
+            job=job,
+            max_workers=max_workers
+        )
+        return
+
+    # Submitting the registration to a running registration service, before the AML SDK is imported
+    service_socket = os.environ.get("INPUT_SERVICE_SOCKET", default="")
+    if service_socket:
+        with trace_phase("service_job"):
+            job_status = submit_service_job(
+                socket_path=service_socket,
+                job=job,
+                workspace_key=get_cache_key(
+                    azure_credentials=azure_credentials,
+                    cloud=cloud,
+                    config_file_path=os.environ.get("GITHUB_WORKSPACE", default=".cloud/.azure"),
+                    config_file_name=CONFIG_FILE_NAME
+                )
+            )
+        if job_status is not None:
+            return
+
+    # Loading Workspace, importing the AML SDK only after all inputs were validated
+    ws, sp_auth, cache_file, cache_key = load_workspace(
+        azure_credentials=azure_credentials,
+        cloud=cloud,
+        max_workers=max_workers
+    )
+    from azureml.exceptions import AuthenticationException
+    from adal.adal_error import AdalError
+    try:
+        register(
+            workspace=ws,
+            **job
+        )
+    except (AuthenticationException, AdalError):
+        if cache_key is not None:
+            print("::debug::Invalidating cached AML Workspace after authentication error")
+            invalidate_workspace_cache(
+                cache_file=cache_file,
+                key=cache_key
+            )
+        raise
 
+    # Caching tokens and workspace details for subsequent runs
+    with trace_phase("save_workspace_cache"):
+        if cache_key is not None:
+            print("::debug::Caching AML Workspace")
+            save_workspace_cache(
+                cache_file=cache_file,
+                key=cache_key,
+                workspace=ws,
+                auth=sp_auth
+            )
+    print("::debug::Successfully completed Azure Machine Learning Register Model Action")
+
+
+def load_azure_credentials():
     # Loading azure credentials
     print("::debug::Loading azure credentials")
     azure_credentials = os.environ.get("INPUT_AZURE_CREDENTIALS", default="{}")
@@ -26,7 +128,12 @@ def main():
     except JSONDecodeError:
         print("::error::Please paste output of `az ad sp create-for-rbac --name <your-sp-name> --role contributor --scopes /subscriptions/<your-subscriptionId>/resourceGroups/<your-rg> --sdk-auth` as value of secret variable: AZURE_CREDENTIALS")
         raise AMLConfigurationException("Incorrect or poorly formed output from azure credentials saved in AZURE_CREDENTIALS secret. See setup in https://github.com/Azure/aml-workspace/blob/master/README.md")
+    return check_azure_credentials(
+        azure_credentials=azure_credentials
+    )
 
+
+def check_azure_credentials(azure_credentials):
     # Checking provided parameters
     print("::debug::Checking provided parameters")
     validate_json(
@@ -41,7 +148,10 @@ def main():
     mask_parameter(parameter=azure_credentials.get("clientId", ""))
     mask_parameter(parameter=azure_credentials.get("clientSecret", ""))
     mask_parameter(parameter=azure_credentials.get("subscriptionId", ""))
+    return azure_credentials
+
 
+def load_parameters():
     # Loading parameters file
     print("::debug::Loading parameters file")
     parameters_file = os.environ.get("INPUT_PARAMETERS_FILE", default="registermodel.json")
@@ -52,15 +162,108 @@ def main():
     except FileNotFoundError:
         print(f"::debug::Could not find parameter file in {parameters_file_path}. Please provide a parameter file in your repository if you do not want to use default settings (e.g. .cloud/.azure/registermodel.json).")
         parameters = {}
+    return validate_parameters(
+        parameters=parameters
+    )
 
+
+def get_default_model_name():
+    # Define default model name
+    repository_name = os.environ.get("GITHUB_REPOSITORY").split("/")[-1]
+    branch_name = os.environ.get("GITHUB_REF").split("/")[-1]
+    return f"{repository_name}-{branch_name}"
+
+
+def validate_parameters(parameters):
     # Checking provided parameters
     print("::debug::Checking provided parameters")
+    batch = isinstance(parameters, list)
+    model_specs = parameters if batch else [parameters]
+    if len(model_specs) < 1:
+        print("::error::The parameters file contains an empty list. Please provide at least one model specification.")
+        raise AMLConfigurationException("The parameters file contains an empty list. Please provide at least one model specification.")
+    for model_spec in model_specs:
+        validate_json(
+            data=model_spec,
+            schema=parameters_schema,
+            input_name="PARAMETERS_FILE"
+        )
+    return model_specs, batch
+
+
+def load_targets(azure_credentials):
+    # Loading target workspaces, every target may use its own credentials and cloud
+    target_workspaces = os.environ.get("INPUT_TARGET_WORKSPACES", default="")
+    if not target_workspaces:
+        return None
+    print("::debug::Loading target workspaces")
+    try:
+        target_workspaces = json.loads(target_workspaces)
+    except JSONDecodeError:
+        print("::error::Please provide a JSON list of target workspaces as value of the input 'target_workspaces'.")
+        raise AMLConfigurationException("Incorrect value for input 'target_workspaces'. Please provide a JSON list.")
     validate_json(
-        data=parameters,
-        schema=parameters_schema,
-        input_name="PARAMETERS_FILE"
+        data=target_workspaces,
+        schema=target_workspaces_schema,
+        input_name="TARGET_WORKSPACES"
+    )
+    target_names = [target_workspace["name"] for target_workspace in target_workspaces]
+    if len(set(target_names)) < len(target_names):
+        print("::error::Please provide a unique name for every target workspace.")
+        raise AMLConfigurationException("The names of the target workspaces are not unique.")
+    targets = []
+    for target_workspace in target_workspaces:
+        target_credentials = target_workspace.get("azure_credentials", None)
+        if target_credentials is not None:
+            target_credentials = check_azure_credentials(
+                azure_credentials=target_credentials
+            )
+        else:
+            target_credentials = azure_credentials
+        targets.append({
+            "name": target_workspace["name"],
+            "config_file": target_workspace.get("config_file", CONFIG_FILE_NAME),
+            "azure_credentials": target_credentials,
+            "cloud": get_cloud(target_credentials)
+        })
+    return targets
+
+
+def load_settings():
+    # Loading number of concurrent registrations
+    print("::debug::Loading number of concurrent registrations")
+    try:
+        max_workers = int(os.environ.get("INPUT_MAX_WORKERS", default="4"))
+    except ValueError:
+        max_workers = 0
+    if max_workers < 1:
+        print("::error::Please provide a positive integer as value of the input 'max_workers'.")
+        raise AMLConfigurationException("Incorrect value for input 'max_workers'. Please provide a positive integer.")
+
+    # Loading retry settings
+    print("::debug::Loading retry settings")
+    try:
+        max_retries = int(os.environ.get("INPUT_MAX_RETRIES", default="3"))
+        retry_deadline = float(os.environ.get("INPUT_RETRY_DEADLINE", default="120"))
+    except ValueError:
+        max_retries = retry_deadline = -1
+    if max_retries < 0 or retry_deadline < 0:
+        print("::error::Please provide a non-negative integer as value of the input 'max_retries' and a non-negative number of seconds as value of the input 'retry_deadline'.")
+        raise AMLConfigurationException("Incorrect value for input 'max_retries' or 'retry_deadline'. Please provide non-negative numbers.")
+    configure_retries(
+        max_retries=max_retries,
+        deadline=retry_deadline
     )
 
+    # Loading execution mode
+    execution_mode = os.environ.get("INPUT_EXECUTION_MODE", default="concurrent")
+    if execution_mode not in ["concurrent", "sequential"]:
+        print("::error::Please provide 'concurrent' or 'sequential' as value of the input 'execution_mode'.")
+        raise AMLConfigurationException("Incorrect value for input 'execution_mode'. Please provide 'concurrent' or 'sequential'.")
+    return max_workers, execution_mode
+
+
+def get_cloud(azure_credentials):
     # Define target cloud
     if azure_credentials.get("resourceManagerEndpointUrl", "").startswith("https://management.usgovcloudapi.net"):
         cloud = "AzureUSGovernment"
@@ -68,9 +271,18 @@ def main():
         cloud = "AzureChinaCloud"
     else:
         cloud = "AzureCloud"
+    return cloud
+
 
-    # Loading Workspace
+def load_workspace(azure_credentials, cloud, max_workers, config_file_name=CONFIG_FILE_NAME):
+    # Loading Workspace, importing the AML SDK only after all inputs were validated
     print("::debug::Loading AML Workspace")
+    with trace_phase("import_sdk"):
+        from azureml.core import Workspace
+        from azureml.core.authentication import ServicePrincipalAuthentication
+        from azureml.exceptions import AuthenticationException, ProjectSystemException
+        from adal.adal_error import AdalError
+        from msrest.exceptions import AuthenticationError
     sp_auth = ServicePrincipalAuthentication(
         tenant_id=azure_credentials.get("tenantId", ""),
         service_principal_id=azure_credentials.get("clientId", ""),
@@ -78,104 +290,782 @@ def main():
         cloud=cloud
     )
     config_file_path = os.environ.get("GITHUB_WORKSPACE", default=".cloud/.azure")
-    config_file_name = "aml_arm_config.json"
+    cache_directory = os.environ.get("INPUT_CACHE_DIRECTORY", default="")
+    cache_file = os.path.join(cache_directory, "aml-registermodel-cache.json") if cache_directory else None
+    cache_key = get_cache_key(
+        azure_credentials=azure_credentials,
+        cloud=cloud,
+        config_file_path=config_file_path,
+        config_file_name=config_file_name
+    ) if cache_file is not None else None
+    with trace_phase("load_workspace", cached=cache_key is not None):
+        ws = None
+        if cache_key is not None:
+            print("::debug::Loading AML Workspace from cache")
+            ws = load_cached_workspace(
+                cache_file=cache_file,
+                key=cache_key,
+                auth=sp_auth
+            )
+        if ws is None:
+            try:
+                ws = call_with_retries(
+                    Workspace.from_config,
+                    operation="Loading AML Workspace",
+                    path=config_file_path,
+                    _file_name=config_file_name,
+                    auth=sp_auth
+                )
+            except AuthenticationException as exception:
+                print(f"::error::Could not retrieve user token. Please paste output of `az ad sp create-for-rbac --name <your-sp-name> --role contributor --scopes /subscriptions/<your-subscriptionId>/resourceGroups/<your-rg> --sdk-auth` as value of secret variable: AZURE_CREDENTIALS: {exception}")
+                raise AuthenticationException
+            except AuthenticationError as exception:
+                print(f"::error::Microsoft REST Authentication Error: {exception}")
+                raise AuthenticationError
+            except AdalError as exception:
+                print(f"::error::Active Directory Authentication Library Error: {exception}")
+                raise AdalError
+            except ProjectSystemException as exception:
+                print(f"::error::Workspace authorization failed: {exception}")
+                raise ProjectSystemException
+
+    # Sharing a connection pool sized to the number of workers between the clients of the workspace
+    configure_session_pool(
+        workspace=ws,
+        max_workers=max_workers
+    )
+    return ws, sp_auth, cache_file, cache_key
+
+
+@traced("register_targets")
+def register_targets(targets, job, max_workers):
+    from azureml.exceptions import AuthenticationException
+    from adal.adal_error import AdalError
+
+    # Preparing the model once and registering it in all target workspaces concurrently
+    print(f"::debug::Registering models in {len(targets)} workspaces")
+    staging_cache = StagingCache()
+
+    def register_target(target):
+        with trace_phase("register_target", target=target["name"]):
+            ws, sp_auth, cache_file, cache_key = load_workspace(
+                azure_credentials=target["azure_credentials"],
+                cloud=target["cloud"],
+                max_workers=max_workers,
+                config_file_name=target["config_file"]
+            )
+            try:
+                models, failed_models = register(
+                    workspace=ws,
+                    staging_cache=staging_cache,
+                    create_outputs=False,
+                    **job
+                )
+            except (AuthenticationException, AdalError):
+                if cache_key is not None:
+                    print(f"::debug::Invalidating cached AML Workspace of target '{target['name']}' after authentication error")
+                    invalidate_workspace_cache(
+                        cache_file=cache_file,
+                        key=cache_key
+                    )
+                raise
+            if cache_key is not None:
+                save_workspace_cache(
+                    cache_file=cache_file,
+                    key=cache_key,
+                    workspace=ws,
+                    auth=sp_auth
+                )
+            return {"target": target["name"], "workspace": ws.name, "models": models, "failed_models": failed_models}
+
+    results = {}
+    failed_targets = []
     try:
-        ws = Workspace.from_config(
-            path=config_file_path,
-            _file_name=config_file_name,
-            auth=sp_auth
-        )
-    except AuthenticationException as exception:
-        print(f"::error::Could not retrieve user token. Please paste output of `az ad sp create-for-rbac --name <your-sp-name> --role contributor --scopes /subscriptions/<your-subscriptionId>/resourceGroups/<your-rg> --sdk-auth` as value of secret variable: AZURE_CREDENTIALS: {exception}")
-        raise AuthenticationException
-    except AuthenticationError as exception:
-        print(f"::error::Microsoft REST Authentication Error: {exception}")
-        raise AuthenticationError
-    except AdalError as exception:
-        print(f"::error::Active Directory Authentication Library Error: {exception}")
-        raise AdalError
-    except ProjectSystemException as exception:
-        print(f"::error::Workspace authorization failed: {exception}")
-        raise ProjectSystemException
+        with ContextThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = {executor.submit(register_target, target): target["name"] for target in targets}
+            for future in as_completed(futures):
+                target_name = futures[future]
+                try:
+                    results[target_name] = future.result()
+                except Exception as exception:
+                    print(f"::error::Model could not be registered in target workspace '{target_name}': {exception}")
+                    failed_targets.append({"target": target_name, "error": str(exception)})
+                else:
+                    if len(results[target_name]["failed_models"]) > 0:
+                        print(f"::error::{len(results[target_name]['failed_models'])} models could not be registered in target workspace '{target_name}'")
+                        failed_targets.append({"target": target_name, "error": f"{len(results[target_name]['failed_models'])} of {len(job['model_specs'])} models could not be registered"})
+    finally:
+        staging_cache.close()
 
-    # Define default model name
-    repository_name = os.environ.get("GITHUB_REPOSITORY").split("/")[-1]
-    branch_name = os.environ.get("GITHUB_REF").split("/")[-1]
-    default_model_name = f"{repository_name}-{branch_name}"
+    # Create outputs, the model outputs refer to the first target
+    print("::debug::Creating outputs")
+    target_names = [target["name"] for target in targets]
+    first_result = results.get(target_names[0], None)
+    if first_result is not None and not job["batch"] and len(first_result["models"]) > 0:
+        print(f"::set-output name=model_name::{first_result['models'][0]['model_name']}")
+        print(f"::set-output name=model_version::{first_result['models'][0]['model_version']}")
+        print(f"::set-output name=model_id::{first_result['models'][0]['model_id']}")
+    failed_targets.sort(key=lambda entry: target_names.index(entry["target"]))
+    print(f"::set-output name=targets::{json.dumps([results[target_name] for target_name in target_names if target_name in results])}")
+    print(f"::set-output name=failed_targets::{json.dumps(failed_targets)}")
+    print(f"::debug::Registered the models in {len(targets) - len(failed_targets)} of {len(targets)} target workspaces")
+    if len(failed_targets) > 0:
+        raise AMLConfigurationException(f"{len(failed_targets)} of {len(targets)} target workspaces failed. Please check the output for more details.")
+    return results
+
+
+def submit_service_job(socket_path, job, workspace_key):
+    # Falling back to the registration in this process, if the job could not be submitted to the service
+    print(f"::debug::Submitting registration to the registration service at '{socket_path}'")
+    job = dict(
+        job,
+        manifest_file=os.path.abspath(job["manifest_file"]) if job["manifest_file"] is not None else None,
+        source_directory=os.path.abspath(os.environ.get("GITHUB_WORKSPACE", default="."))
+    )
+    try:
+        job_id = send_request(
+            socket_path=socket_path,
+            request={"action": "submit", "job": job, "workspace_key": workspace_key},
+            timeout=30.0
+        )["job_id"]
+    except (OSError, ValueError, AMLServiceException) as exception:
+        print(f"::debug::Registration service is not available. Registering the model in this process: {exception}")
+        return None
+
+    # Replaying the output of the job, so that the outputs of the action are created as in a registration in this process
+    job_status = wait_for_job(
+        socket_path=socket_path,
+        job_id=job_id
+    )
+    for line in job_status["output"]:
+        sys.stdout.write(line)
+    if job_status["status"] == "failed":
+        print(f"::error::Registration job '{job_id}' failed: {job_status['error']}")
+        if job_status["error_type"] == AMLModelPerformanceException.__name__:
+            raise AMLModelPerformanceException(job_status["error"])
+        raise AMLConfigurationException(job_status["error"])
+    print(f"::debug::Registration job '{job_id}' succeeded")
+    return job_status
+
+
+def run_service_job(job, workspace):
+    # Jobs are validated again, because any process with access to the socket can submit them
+    model_specs, batch = validate_parameters(
+        parameters=job.get("model_specs", []) if job.get("batch", False) else (job.get("model_specs", None) or [{}])[0]
+    )
+    execution_mode = job.get("execution_mode", "concurrent")
+    if execution_mode not in ["concurrent", "sequential"]:
+        raise AMLConfigurationException("Incorrect value for input 'execution_mode'. Please provide 'concurrent' or 'sequential'.")
+    register(
+        workspace=workspace,
+        model_specs=model_specs,
+        batch=batch,
+        experiment_name=job.get("experiment_name", None),
+        run_id=job.get("run_id", None),
+        default_model_name=job["default_model_name"],
+        max_workers=max(int(job.get("max_workers", 4)), 1),
+        execution_mode=execution_mode,
+        manifest_file=job.get("manifest_file", None),
+        source_directory=job.get("source_directory", None)
+    )
+
+
+def run_service():
+    # Keeping an authenticated workspace and the imported AML SDK for all jobs of the registration service
+    start_trace(name="service")
+    azure_credentials = load_azure_credentials()
+    max_workers, _ = load_settings()
+    cloud = get_cloud(azure_credentials)
+    ws, _, _, _ = load_workspace(
+        azure_credentials=azure_credentials,
+        cloud=cloud,
+        max_workers=max_workers
+    )
+    try:
+        service_workers = int(os.environ.get("INPUT_SERVICE_WORKERS", default="2"))
+        service_queue_size = int(os.environ.get("INPUT_SERVICE_QUEUE_SIZE", default="16"))
+    except ValueError:
+        service_workers = service_queue_size = 0
+    if service_workers < 1 or service_queue_size < 1:
+        print("::error::Please provide positive integers as values of 'service_workers' and 'service_queue_size'.")
+        raise AMLConfigurationException("Incorrect value for 'service_workers' or 'service_queue_size'. Please provide positive integers.")
+    socket_path = os.environ.get("INPUT_SERVICE_SOCKET", default="") or "/tmp/aml-registermodel.sock"
+    service = RegistrationService(
+        handler=functools.partial(run_service_job, workspace=ws),
+        workspace_key=get_cache_key(
+            azure_credentials=azure_credentials,
+            cloud=cloud,
+            config_file_path=os.environ.get("GITHUB_WORKSPACE", default=".cloud/.azure"),
+            config_file_name=CONFIG_FILE_NAME
+        ),
+        max_workers=service_workers,
+        max_queue_size=service_queue_size
+    )
+    server = serve(
+        socket_path=socket_path,
+        service=service
+    )
+    print(f"::debug::Registration service is listening on '{socket_path}' with {service_workers} workers")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        service.shutdown()
+        os.unlink(socket_path)
+
+
+def register_watched_run(run, workspace, job):
+    # Failed models of a batch are retried with the next poll, the models that were registered are skipped by the manifest
+    models, failed_models = register(
+        workspace=workspace,
+        run_id=run.id,
+        create_outputs=False,
+        **job
+    )
+    if len(failed_models) > 0:
+        raise AMLConfigurationException(f"{len(failed_models)} of {len(job['model_specs'])} models could not be registered.")
+    return models
+
+
+def run_watch():
+    # Registering the models of every run of the experiment that completes while the watcher is running
+    azure_credentials = load_azure_credentials()
+    experiment_name = os.environ.get("INPUT_EXPERIMENT_NAME", default="")
+    checkpoint_file = os.environ.get("INPUT_WATCH_CHECKPOINT_FILE", default="")
+    if not experiment_name or not checkpoint_file:
+        print("::error::Please provide the inputs 'experiment_name' and 'watch_checkpoint_file' to watch an experiment.")
+        raise AMLConfigurationException("Missing input 'experiment_name' or 'watch_checkpoint_file'.")
+    try:
+        min_interval = float(os.environ.get("INPUT_WATCH_MIN_INTERVAL", default="30"))
+        max_interval = float(os.environ.get("INPUT_WATCH_MAX_INTERVAL", default="600"))
+        duration = os.environ.get("INPUT_WATCH_DURATION", default="")
+        duration = float(duration) if duration else None
+    except ValueError:
+        min_interval = max_interval = -1
+    if min_interval <= 0 or max_interval < min_interval or (duration is not None and duration < 0):
+        print("::error::Please provide positive numbers of seconds as values of 'watch_min_interval' and 'watch_max_interval' and a non-negative number of seconds as value of 'watch_duration'.")
+        raise AMLConfigurationException("Incorrect value for 'watch_min_interval', 'watch_max_interval' or 'watch_duration'.")
+    model_specs, batch = load_parameters()
+
+    # Using the pipeline step of the input for all models that do not define their own
+    pipeline_child_run_name = os.environ.get("INPUT_PIPELINE_CHILD_RUN_NAME", default="") or None
+    if pipeline_child_run_name is not None:
+        model_specs = [dict({"pipeline_child_run_name": pipeline_child_run_name}, **model_spec) for model_spec in model_specs]
+    max_workers, execution_mode = load_settings()
+    cloud = get_cloud(azure_credentials)
+    ws, _, _, _ = load_workspace(
+        azure_credentials=azure_credentials,
+        cloud=cloud,
+        max_workers=max_workers
+    )
+    experiment = load_experiment(
+        workspace=ws,
+        experiment_name=experiment_name
+    )
+
+    # Recording registrations in a manifest, so that a run is not registered again if the watcher stopped before updating the checkpoint
+    job = {
+        "model_specs": model_specs,
+        "batch": batch,
+        "experiment_name": experiment_name,
+        "default_model_name": get_default_model_name(),
+        "max_workers": max_workers,
+        "execution_mode": execution_mode,
+        "manifest_file": os.environ.get("INPUT_MANIFEST_FILE", default="") or f"{checkpoint_file}.manifest"
+    }
+    print(f"::debug::Watching experiment '{experiment_name}' with checkpoint file '{checkpoint_file}'")
+    watch_experiment(
+        experiment=experiment,
+        checkpoint_file=checkpoint_file,
+        key=get_checkpoint_key(
+            experiment=experiment,
+            pipeline_child_run_name=pipeline_child_run_name
+        ),
+        handler=functools.partial(register_watched_run, workspace=ws, job=job),
+        poll_interval=PollInterval(
+            minimum=min_interval,
+            maximum=max_interval
+        ),
+        duration=duration
+    )
+
+
+@traced("register")
+def register(workspace, model_specs, batch, experiment_name, run_id, default_model_name, max_workers, execution_mode="concurrent", manifest_file=None, source_directory=None, staging_cache=None, create_outputs=True):
     print(f"::debug::experiment_name: '{experiment_name}' and run_id: '{run_id}'")
     if not experiment_name or not run_id:
         # Registering model from local GitHub workspace
         print("::debug::Registering model from local GitHub workspace")
+        experiment_name = run_id = None
+    else:
+        # Registering model from AML run
+        print("::debug::Registering model from AML run")
+
+    # Loading runs, datasets, production models and run artifacts
+    print(f"::debug::Loading dependencies of the registration in {execution_mode} mode")
+    if execution_mode == "sequential":
+        best_runs, datasets, production_models, artifact_indexes = load_dependencies(
+            workspace=workspace,
+            model_specs=model_specs,
+            experiment_name=experiment_name,
+            run_id=run_id,
+            default_model_name=default_model_name,
+            max_workers=max_workers
+        )
+    else:
+        best_runs, datasets, production_models, artifact_indexes = asyncio.run(load_dependencies_async(
+            workspace=workspace,
+            model_specs=model_specs,
+            experiment_name=experiment_name,
+            run_id=run_id,
+            default_model_name=default_model_name,
+            max_workers=max_workers
+        ))
+
+    # Sharing metrics of baseline runs between all models of the invocation
+    metrics_cache = {}
+    if not batch:
+        model = register_model(
+            workspace=workspace,
+            parameters=model_specs[0],
+            default_model_name=default_model_name,
+            best_run=best_runs[model_specs[0].get("pipeline_child_run_name", "model_training")] if best_runs is not None else None,
+            datasets=datasets,
+            production_models=production_models,
+            artifact_indexes=artifact_indexes,
+            metrics_cache=metrics_cache,
+            manifest_file=manifest_file,
+            source_directory=source_directory,
+            staging_cache=staging_cache
+        )
+        models = [{"index": 0, "model_name": model.name, "model_version": model.version, "model_id": model.id}]
+        failed_models = []
+
+        # Create outputs
+        if create_outputs:
+            print("::debug::Creating outputs")
+            print(f"::set-output name=model_name::{model.name}")
+            print(f"::set-output name=model_version::{model.version}")
+            print(f"::set-output name=model_id::{model.id}")
+    else:
+        models, failed_models = register_models(
+            workspace=workspace,
+            model_specs=model_specs,
+            default_model_name=default_model_name,
+            best_runs=best_runs,
+            datasets=datasets,
+            production_models=production_models,
+            artifact_indexes=artifact_indexes,
+            max_workers=max_workers,
+            metrics_cache=metrics_cache,
+            manifest_file=manifest_file,
+            source_directory=source_directory,
+            staging_cache=staging_cache
+        )
+
+        # Create outputs
+        if create_outputs:
+            print("::debug::Creating outputs")
+            print(f"::set-output name=models::{json.dumps(models)}")
+            print(f"::set-output name=failed_models::{json.dumps(failed_models)}")
+            if len(failed_models) > 0:
+                raise AMLConfigurationException(f"{len(failed_models)} of {len(model_specs)} models could not be registered. Please check the output for more details.")
+    return models, failed_models
+
+
+def load_experiment(workspace, experiment_name):
+    from azureml.core import Experiment
+    from azureml.exceptions import UserErrorException
+
+    # Loading experiment
+    print("::debug::Loading experiment")
+    try:
+        experiment = call_with_retries(
+            Experiment,
+            operation="Loading experiment",
+            workspace=workspace,
+            name=experiment_name
+        )
+    except UserErrorException as exception:
+        print(f"::error::Loading experiment failed: {exception}")
+        raise AMLConfigurationException("Could not load experiment. Please your experiment name as input parameter.")
+    return experiment
+
+
+@traced("load_run")
+def load_run(workspace, experiment_name, run_id):
+    from azureml.core import Run
+
+    experiment = load_experiment(
+        workspace=workspace,
+        experiment_name=experiment_name
+    )
+
+    # Loading run by run id
+    print("::debug::Loading run by run id")
+    try:
+        run = call_with_retries(
+            Run,
+            operation="Loading run",
+            experiment=experiment,
+            run_id=run_id
+        )
+    except KeyError as exception:
+        print(f"::error::Loading run failed: {exception}")
+        raise AMLConfigurationException("Could not load run. Please add your run id as input parameter.")
+    return experiment, run
+
+
+def load_best_runs(experiment, run, model_specs):
+    # Loading best run once per pipeline step
+    print("::debug::Loading best run")
+    best_runs = {}
+    run_cache = {}
+    for model_spec in model_specs:
+        pipeline_child_run_name = model_spec.get("pipeline_child_run_name", "model_training")
+        if pipeline_child_run_name not in best_runs:
+            best_runs[pipeline_child_run_name] = get_best_run(
+                experiment=experiment,
+                run=run,
+                pipeline_child_run_name=pipeline_child_run_name,
+                run_cache=run_cache
+            )
+    return best_runs
+
+
+def get_dataset_names(model_specs):
+    dataset_names = []
+    for model_spec in model_specs:
+        dataset_names += model_spec.get("datasets", []) + [model_spec.get("sample_input_dataset", None), model_spec.get("sample_output_dataset", None)]
+    return dataset_names
+
+
+def get_baseline_queries(model_specs, default_model_name):
+    # Production models are only needed for the metric comparison, they are loaded once per model name, baseline filter and number of versions
+    baseline_queries = {}
+    for model_spec in model_specs:
+        model_name = model_spec.get("model_name", default_model_name)[:32]
+        baseline_filter = get_baseline_filter(model_spec)
+        baseline_versions = model_spec.get("baseline_versions", 1)
+        baseline_key = get_baseline_key(model_name, baseline_filter, baseline_versions)
+        if not model_spec.get("force_registration", False) and baseline_key not in baseline_queries:
+            baseline_queries[baseline_key] = (model_name, baseline_versions, baseline_filter)
+    return baseline_queries
+
+
+def load_dependencies(workspace, model_specs, experiment_name, run_id, default_model_name, max_workers):
+    best_runs = None
+    production_models = {}
+    artifact_indexes = {}
+    if run_id is not None:
+        experiment, run = load_run(
+            workspace=workspace,
+            experiment_name=experiment_name,
+            run_id=run_id
+        )
+        best_runs = load_best_runs(
+            experiment=experiment,
+            run=run,
+            model_specs=model_specs
+        )
+
+    # Loading datasets once for all models, one request at a time
+    print("::debug::Loading datasets")
+    datasets, _ = get_datasets(
+        workspace=workspace,
+        names=get_dataset_names(model_specs),
+        max_workers=1
+    )
+
+    if best_runs is not None:
+        # Loading production models once per model name and baseline filter
+        print("::debug::Loading production models")
+        for baseline_key, (model_name, count, baseline_filter) in get_baseline_queries(model_specs, default_model_name).items():
+            production_models[baseline_key] = get_production_models(
+                workspace=workspace,
+                model_name=model_name,
+                count=count,
+                baseline_filter=baseline_filter
+            )
+
+        # Indexing artifacts once per best run, so that models from the same run do not list the artifacts again
+        print("::debug::Indexing run artifacts")
+        for best_run in best_runs.values():
+            get_run_artifact_index(
+                run=best_run,
+                index_cache=artifact_indexes
+            )
+    return best_runs, datasets, production_models, artifact_indexes
+
+
+async def load_dependencies_async(workspace, model_specs, experiment_name, run_id, default_model_name, max_workers):
+    # Starting every request as soon as its inputs are available, with at most max_workers requests in flight
+    loop = asyncio.get_event_loop()
+    semaphore = asyncio.Semaphore(max_workers)
+    executor = ContextThreadPoolExecutor(max_workers=max_workers)
+
+    async def run_blocking(function, **kwargs):
+        async with semaphore:
+            return await loop.run_in_executor(executor, functools.partial(function, **kwargs))
+
+    async def load_runs_and_artifacts():
+        experiment, run = await run_blocking(
+            load_run,
+            workspace=workspace,
+            experiment_name=experiment_name,
+            run_id=run_id
+        )
+        best_runs = await run_blocking(
+            load_best_runs,
+            experiment=experiment,
+            run=run,
+            model_specs=model_specs
+        )
+        print("::debug::Indexing run artifacts")
+        artifact_indexes = {}
+        await asyncio.gather(*[
+            run_blocking(get_run_artifact_index, run=best_run, index_cache=artifact_indexes)
+            for best_run in {best_run.id: best_run for best_run in best_runs.values()}.values()
+        ])
+        return best_runs, artifact_indexes
+
+    async def load_datasets(names):
+        # Requesting every dataset in its own slot, so that the lookups count towards the requests in flight
+        results = await asyncio.gather(*[
+            run_blocking(get_datasets, workspace=workspace, names=[name], max_workers=1)
+            for name in dict.fromkeys(names) if name is not None
+        ])
+        datasets = {}
+        for name_datasets, _ in results:
+            datasets.update(name_datasets)
+        return datasets
+
+    async def load_production_models(baseline_key, model_name, count, baseline_filter):
+        production_models = await run_blocking(
+            get_production_models,
+            workspace=workspace,
+            model_name=model_name,
+            count=count,
+            baseline_filter=baseline_filter
+        )
+        return baseline_key, production_models
+
+    try:
+        print("::debug::Loading datasets")
+        datasets_task = load_datasets(
+            names=get_dataset_names(model_specs)
+        )
+        if run_id is None:
+            datasets = await datasets_task
+            return None, datasets, {}, {}
+
+        print("::debug::Loading production models")
+        production_models_tasks = [
+            load_production_models(baseline_key=baseline_key, model_name=model_name, count=count, baseline_filter=baseline_filter)
+            for baseline_key, (model_name, count, baseline_filter) in get_baseline_queries(model_specs, default_model_name).items()
+        ]
+        (best_runs, artifact_indexes), datasets, *production_models = await asyncio.gather(
+            load_runs_and_artifacts(),
+            datasets_task,
+            *production_models_tasks
+        )
+        return best_runs, datasets, dict(production_models), artifact_indexes
+    finally:
+        executor.shutdown(wait=True)
+
+
+@traced("register_models")
+def register_models(workspace, model_specs, default_model_name, best_runs, datasets, production_models, artifact_indexes, max_workers, metrics_cache=None, manifest_file=None, source_directory=None, staging_cache=None):
+    # Registering models concurrently
+    print(f"::debug::Registering {len(model_specs)} models with {max_workers} workers")
+    models = []
+    failed_models = []
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {}
+        for index, model_spec in enumerate(model_specs):
+            future = executor.submit(
+                register_model,
+                workspace=workspace,
+                parameters=model_spec,
+                default_model_name=default_model_name,
+                best_run=best_runs[model_spec.get("pipeline_child_run_name", "model_training")] if best_runs is not None else None,
+                datasets=datasets,
+                production_models=production_models,
+                artifact_indexes=artifact_indexes,
+                metrics_cache=metrics_cache,
+                manifest_file=manifest_file,
+                source_directory=source_directory,
+                staging_cache=staging_cache
+            )
+            futures[future] = index
+        for future in as_completed(futures):
+            index = futures[future]
+            model_name = model_specs[index].get("model_name", default_model_name)[:32]
+            try:
+                model = future.result()
+            except Exception as exception:
+                print(f"::error::Model '{model_name}' at position {index} of the parameters file could not be registered: {exception}")
+                failed_models.append({"index": index, "model_name": model_name, "error": str(exception)})
+            else:
+                models.append({"index": index, "model_name": model.name, "model_version": model.version, "model_id": model.id})
+
+    models.sort(key=lambda entry: entry["index"])
+    failed_models.sort(key=lambda entry: entry["index"])
+    print(f"::debug::Registered {len(models)} of {len(model_specs)} models")
+    return models, failed_models
+
+
+@traced("register_model")
+def register_model(workspace, parameters, default_model_name, best_run, datasets, production_models=None, artifact_indexes=None, metrics_cache=None, manifest_file=None, source_directory=None, staging_cache=None):
+    from azureml.core import Model
+    from azureml.core.resource_configuration import ResourceConfiguration
+    from azureml.exceptions import ModelPathNotFoundException, WebserviceException
+
+    model_name = parameters.get("model_name", default_model_name)[:32]
+    if best_run is None:
+        # Registering model from local GitHub workspace
         local_model = True
 
         # Defining model path
         print("::debug::Defining model path")
         model_file_name = parameters.get("model_file_name", "model.pkl")
+        directory = source_directory or os.environ.get("GITHUB_WORKSPACE", default=None)
         if len(splitall(model_file_name)) > 1:
-            model_path = model_file_name
+            # Paths are relative to the working directory of the action, which is the GitHub workspace
+            model_path = os.path.join(source_directory, model_file_name) if source_directory is not None else model_file_name
         else:
-            directory = config_file_path = os.environ.get("GITHUB_WORKSPACE", default=None)
-            model_paths = []
-            for root, dirs, files in os.walk(directory):
-                for filename in files:
-                    if filename == model_file_name:
-                        path = os.path.join(root, filename)
-                        model_paths.append(path)
-            model_path = model_paths[0]
+            index_file = parameters.get("model_search_index_file", None)
+            exclude_patterns = parameters.get("model_search_exclude", [".git"])
+            ignore_files = parameters.get("model_search_ignore_files", [".amlignore"])
+            model_path = get_staged(
+                staging_cache,
+                ("find_model_file", directory, model_file_name, tuple(exclude_patterns), tuple(ignore_files), index_file),
+                find_model_file,
+                directory=directory,
+                file_name=model_file_name,
+                exclude_patterns=exclude_patterns,
+                ignore_files=ignore_files,
+                index_file=os.path.join(directory, index_file) if index_file is not None else None
+            )
+
+        # Comparing content hash with latest registered version
+        print("::debug::Hashing model content")
+        model_hash = get_staged(
+            staging_cache,
+            ("hash_model_path", model_path),
+            hash_model_path,
+            model_path=model_path,
+            use_mmap=parameters.get("model_hash_mmap", False)
+        )
+        model_properties = dict(parameters.get("model_properties", {}), **{MODEL_HASH_PROPERTY: model_hash})
+        if manifest_file is not None:
+            manifest_key = get_manifest_key(
+                workspace=workspace,
+                run_id=None,
+                model_path=os.path.relpath(model_path, directory or "."),
+                parameters=parameters,
+                model_hash=model_hash
+            )
+            manifest_model = get_manifest_model(
+                workspace=workspace,
+                manifest_file=manifest_file,
+                key=manifest_key
+            )
+            if manifest_model is not None:
+                return manifest_model
+        if parameters.get("skip_unchanged_model", False):
+            latest_model = get_production_model(
+                workspace=workspace,
+                model_name=model_name
+            )
+            if latest_model is not None and (latest_model.properties or {}).get(MODEL_HASH_PROPERTY, None) == model_hash:
+                print(f"::debug::Model content is identical to version {latest_model.version} of model '{model_name}'. Skipping registration.")
+                return latest_model
     else:
         # Registering model from AML run
-        print("::debug::Registering model from AML run")
         local_model = False
+        model_properties = parameters.get("model_properties", None)
 
-        # Loading experiment
-        print("::debug::Loading experiment")
-        try:
-            experiment = Experiment(
-                workspace=ws,
-                name=experiment_name
+        # Skipping runs that were already registered with the same parameters
+        if manifest_file is not None:
+            manifest_key = get_manifest_key(
+                workspace=workspace,
+                run_id=best_run.id,
+                model_path=parameters.get("model_file_name", "model.pkl"),
+                parameters=parameters
             )
-        except UserErrorException as exception:
-            print(f"::error::Loading experiment failed: {exception}")
-            raise AMLConfigurationException("Could not load experiment. Please your experiment name as input parameter.")
-
-        # Loading run by run id
-        print("::debug::Loading run by run id")
-        try:
-            run = Run(
-                experiment=experiment,
-                run_id=run_id
+            manifest_model = get_manifest_model(
+                workspace=workspace,
+                manifest_file=manifest_file,
+                key=manifest_key
             )
-        except KeyError as exception:
-            print(f"::error::Loading run failed: {exception}")
-            raise AMLConfigurationException("Could not load run. Please add your run id as input parameter.")
-
-        # Loading best run
-        print("::debug::Loading best run")
-        best_run = get_best_run(
-            experiment=experiment,
-            run=run,
-            pipeline_child_run_name=parameters.get("pipeline_child_run_name", "model_training")
-        )
+            if manifest_model is not None:
+                return manifest_model
 
         # Comparing metrics of runs
         print("::debug::Comparing metrics of runs")
-        # Default model name
         if not parameters.get("force_registration", False):
-            compare_metrics(
-                workspace=ws,
+            sweep_run = None
+            if parameters.get("evaluate_sweep_children", False):
+                sweep_run = best_run.parent
+                if sweep_run is None or sweep_run.type != "hyperdrive":
+                    print("::debug::Run is not a child of a hyperparameter tuning run. Comparing only the provided run.")
+                    sweep_run = None
+            best_run = compare_metrics(
+                workspace=workspace,
                 run=best_run,
-                model_name=parameters.get("model_name", default_model_name)[:32],
+                model_name=model_name,
                 metrics_max=parameters.get("metrics_max", []),
-                metrics_min=parameters.get("metrics_min", [])
+                metrics_min=parameters.get("metrics_min", []),
+                production_models=production_models,
+                metrics_aggregation=parameters.get("metrics_aggregation", "last"),
+                baseline_versions=parameters.get("baseline_versions", 1),
+                metrics_tolerance=parameters.get("metrics_tolerance", None),
+                metrics_weights=parameters.get("metrics_weights", None),
+                sweep_run=sweep_run,
+                baseline_filter=get_baseline_filter(parameters),
+                metrics_cache=metrics_cache
             )
 
         # Defining model path
         print("::debug::Defining model path")
-        model_file_name = parameters.get("model_file_name", "model.pkl")
-        if len(splitall(model_file_name)) > 1:
-            model_path = model_file_name
-        else:
-            model_path = [file_name for file_name in best_run.get_file_names() if model_file_name in os.path.split(file_name)[-1]][0]
+        artifact_index = get_run_artifact_index(
+            run=best_run,
+            index_cache=artifact_indexes
+        )
+        model_path = find_run_artifact(
+            index=artifact_index,
+            file_name=parameters.get("model_file_name", "model.pkl")
+        )
+
+    # Benchmarking inference and measuring the resources of the new model before it is registered
+    recommended_resources = None
+    if parameters.get("inference_benchmark", False) or parameters.get("resource_auto_sizing", False):
+        with prepare_benchmark(
+            parameters=parameters,
+            model_path=model_path,
+            best_run=None if local_model else best_run,
+            datasets=datasets,
+            source_directory=source_directory or os.environ.get("GITHUB_WORKSPACE", default=None)
+        ) as (benchmark_model_path, sample):
+            model_properties = dict(model_properties or {})
+            if parameters.get("inference_benchmark", False):
+                model_properties.update(benchmark_inference(
+                    workspace=workspace,
+                    parameters=parameters,
+                    model_name=model_name,
+                    model_path=benchmark_model_path,
+                    sample=sample,
+                    production_models=production_models
+                ))
+            if parameters.get("resource_auto_sizing", False):
+                recommended_cpu, recommended_memory, sizing_properties = size_resources(
+                    parameters=parameters,
+                    model_path=benchmark_model_path,
+                    sample=sample
+                )
+                recommended_resources = (recommended_cpu, recommended_memory)
+                model_properties.update(sizing_properties)
 
     # Defining model framework
     print("::debug::Defining model framework")
@@ -185,81 +1075,163 @@ def main():
 
     # Defining datasets
     print("::debug::Defining datasets")
-    datasets = []
+    model_datasets = []
     for dataset_name in parameters.get("datasets", []):
-        dataset = get_dataset(
-            workspace=ws,
-            name=dataset_name
-        )
+        dataset = datasets.get(dataset_name, None)
         if dataset is not None:
-            datasets.append((f"{dataset_name}", dataset))
-    input_dataset = get_dataset(
-        workspace=ws,
-        name=parameters.get("sample_input_dataset", None)
-    )
-    output_dataset = get_dataset(
-        workspace=ws,
-        name=parameters.get("sample_output_dataset", None)
-    )
+            model_datasets.append((f"{dataset_name}", dataset))
+    input_dataset = datasets.get(parameters.get("sample_input_dataset", None), None)
+    output_dataset = datasets.get(parameters.get("sample_output_dataset", None), None)
 
     # Defining resource configuration
     print("::debug::Defining resource configuration")
     cpu = parameters.get("cpu_cores", None)
     memory = parameters.get("memory_gb", None)
+    if recommended_resources is not None:
+        # Values in the parameters file take precedence over the measured recommendation
+        cpu = cpu if cpu is not None else recommended_resources[0]
+        memory = memory if memory is not None else recommended_resources[1]
     resource_configuration = ResourceConfiguration(cpu=cpu, memory_in_gb=memory) if (cpu is not None and memory is not None) else None
 
-    if local_model:
-        try:
-            model = Model.register(
-                workspace=ws,
-                model_path=model_path,
-                model_name=parameters.get("model_name", default_model_name)[:32],
-                tags=parameters.get("model_tags", None),
-                properties=parameters.get("model_properties", None),
-                description=parameters.get("model_description", None),
-                datasets=datasets,
-                model_framework=model_framework,
-                model_framework_version=parameters.get("model_framework_version", None),
-                child_paths=[],
-                sample_input_dataset=input_dataset,
-                sample_output_dataset=output_dataset,
-                resource_configuration=resource_configuration
-            )
-        except TypeError as exception:
-            print(f"::error::Model could not be registered: {exception}")
-            raise AMLConfigurationException("Model could not be registered")
-        except WebserviceException as exception:
-            print(f"::error::Model could not be registered: {exception}")
-            raise AMLConfigurationException("Model could not be registered")
-    else:
-        try:
-            model = best_run.register_model(
-                model_name=parameters.get("model_name", default_model_name)[:32],
+    # Packaging model directory into a single compressed archive
+    package_directory = None
+    try:
+        if local_model and parameters.get("model_package_format", None) is not None and os.path.isdir(model_path):
+            # Packages of registrations in several workspaces are created once and removed after all registrations
+            package_key = ("package_model", model_path, parameters.get("model_package_format"), parameters.get("model_package_level", None))
+            if staging_cache is None:
+                # The AML SDK only registers paths inside the working directory
+                package_directory = tempfile.mkdtemp(prefix=".aml-registermodel-", dir=os.getcwd())
+            model_path, package_properties = get_staged(
+                staging_cache,
+                package_key,
+                package_model,
                 model_path=model_path,
-                tags=parameters.get("model_tags", None),
-                properties=parameters.get("model_properties", None),
-                model_framework=model_framework,
-                model_framework_version=parameters.get("model_framework_version", None),
-                description=parameters.get("model_description", None),
-                datasets=datasets,
-                sample_input_dataset=input_dataset,
-                sample_output_dataset=output_dataset,
-                resource_configuration=resource_configuration
+                output_directory=package_directory if staging_cache is None else staging_cache.get_directory(package_key),
+                compression=parameters.get("model_package_format"),
+                level=parameters.get("model_package_level", None),
+                max_workers=parameters.get("model_package_workers", 4)
             )
-        except ModelPathNotFoundException as exception:
-            print(f"::error::Model name not found in outputs folder. Please provide the correct model file name and make sure that the model was saved by the run: {exception}")
-            raise AMLConfigurationException("Model name not found in outputs folder. Please provide the correct model file name and make sure that the model was saved by the run.")
-        except WebserviceException as exception:
-            print(f"::error::Model could not be registered: {exception}")
-            raise AMLConfigurationException("Model could not be registered")
-
-    # Create outputs
-    print("::debug::Creating outputs")
-    print(f"::set-output name=model_name::{model.name}")
-    print(f"::set-output name=model_version::{model.version}")
-    print(f"::set-output name=model_id::{model.id}")
-    print("::debug::Successfully completed Azure Machine Learning Register Model Action")
+            model_properties.update(package_properties)
+
+        # Registering model, the upload of the model files is part of the registration request
+        upload_source = "run" if not local_model else ("staged" if parameters.get("staged_upload", False) else "local")
+        with trace_phase("upload", source=upload_source):
+            if local_model and parameters.get("staged_upload", False):
+                try:
+                    print("::debug::Uploading model in blocks")
+                    artifacts_path = stage_model(
+                        workspace=workspace,
+                        model_path=model_path,
+                        model_name=model_name,
+                        block_size=int(parameters.get("upload_block_size_mb", 8) * 1024 * 1024),
+                        max_workers=parameters.get("upload_max_workers", 8),
+                        max_retries=parameters.get("upload_max_retries", 3)
+                    )
+                    print(f"::debug::Registering uploaded model '{artifacts_path}'")
+                    model = call_with_retries(
+                        register_staged_model,
+                        operation="Registering model",
+                        idempotent=False,
+                        workspace=workspace,
+                        artifacts_path=artifacts_path,
+                        model_name=model_name,
+                        tags=parameters.get("model_tags", None),
+                        properties=model_properties,
+                        description=parameters.get("model_description", None),
+                        datasets=model_datasets,
+                        model_framework=model_framework,
+                        model_framework_version=parameters.get("model_framework_version", None),
+                        sample_input_dataset=input_dataset,
+                        sample_output_dataset=output_dataset,
+                        resource_configuration=resource_configuration
+                    )
+                except (FileNotFoundError, PermissionError) as exception:
+                    print(f"::error::Model path '{model_path}' could not be uploaded: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+                except WebserviceException as exception:
+                    print(f"::error::Model could not be registered: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+            elif local_model:
+                try:
+                    model = call_with_retries(
+                        Model.register,
+                        operation="Registering model",
+                        idempotent=False,
+                        workspace=workspace,
+                        model_path=model_path,
+                        model_name=model_name,
+                        tags=parameters.get("model_tags", None),
+                        properties=model_properties,
+                        description=parameters.get("model_description", None),
+                        datasets=model_datasets,
+                        model_framework=model_framework,
+                        model_framework_version=parameters.get("model_framework_version", None),
+                        child_paths=[],
+                        sample_input_dataset=input_dataset,
+                        sample_output_dataset=output_dataset,
+                        resource_configuration=resource_configuration
+                    )
+                except TypeError as exception:
+                    print(f"::error::Model could not be registered: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+                except (FileNotFoundError, PermissionError) as exception:
+                    print(f"::error::Model path '{model_path}' could not be uploaded: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+                except WebserviceException as exception:
+                    print(f"::error::Model could not be registered: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+            else:
+                try:
+                    model = call_with_retries(
+                        best_run.register_model,
+                        operation="Registering model",
+                        idempotent=False,
+                        model_name=model_name,
+                        model_path=model_path,
+                        tags=parameters.get("model_tags", None),
+                        properties=model_properties,
+                        model_framework=model_framework,
+                        model_framework_version=parameters.get("model_framework_version", None),
+                        description=parameters.get("model_description", None),
+                        datasets=model_datasets,
+                        sample_input_dataset=input_dataset,
+                        sample_output_dataset=output_dataset,
+                        resource_configuration=resource_configuration
+                    )
+                except ModelPathNotFoundException as exception:
+                    print(f"::error::Model name not found in outputs folder. Please provide the correct model file name and make sure that the model was saved by the run: {exception}")
+                    raise AMLConfigurationException("Model name not found in outputs folder. Please provide the correct model file name and make sure that the model was saved by the run.")
+                except WebserviceException as exception:
+                    print(f"::error::Model could not be registered: {exception}")
+                    raise AMLConfigurationException("Model could not be registered")
+    finally:
+        if package_directory is not None:
+            shutil.rmtree(package_directory, ignore_errors=True)
+
+    # Recording registration in manifest
+    if manifest_file is not None:
+        save_manifest_entry(
+            manifest_file=manifest_file,
+            key=manifest_key,
+            model=model
+        )
+    return model
 
 
-if __name__ == "__main__":
-    main()
+if __name__ == "__main__" and sys.argv[1:2] == ["serve"]:
+    run_service()
+elif __name__ == "__main__" and sys.argv[1:2] == ["watch"]:
+    run_watch()
+elif __name__ == "__main__":
+    status = "error"
+    try:
+        main()
+        status = "ok"
+    finally:
+        finish_trace(
+            trace_file=os.environ.get("INPUT_TRACE_FILE", default=""),
+            otlp_endpoint=os.environ.get("INPUT_OTLP_ENDPOINT", default=""),
+            status=status
+        )
+        print(f"::set-output name=retries::{json.dumps(get_retry_statistics())}")
@@ -0,0 +1,64 @@
+import json
+import time
+import hashlib
+
+from workspace_cache import locked_cache
+from retries import call_with_retries
+
+
+def get_manifest_key(workspace, run_id, model_path, parameters, model_hash=None):
+    # Identifying a registration by the workspace, the source of the model and all parameters that influence the registered version
+    key_parts = [
+        getattr(workspace, "subscription_id", ""),
+        getattr(workspace, "resource_group", ""),
+        getattr(workspace, "name", ""),
+        run_id or "",
+        model_path,
+        model_hash or "",
+        json.dumps(parameters, sort_keys=True)
+    ]
+    return hashlib.sha256("|".join(str(key_part) for key_part in key_parts).encode("utf-8")).hexdigest()
+
+
+def get_manifest_model(workspace, manifest_file, key):
+    from azureml.core import Model
+    from azureml.exceptions import WebserviceException
+
+    with locked_cache(manifest_file) as manifest:
+        entry = manifest.get(key, None)
+    if entry is None:
+        return None
+
+    # Checking that the recorded version was not deleted in the meantime
+    try:
+        model = call_with_retries(
+            Model,
+            operation="Loading registered model",
+            workspace=workspace,
+            name=entry["model_name"],
+            version=entry["model_version"]
+        )
+    except WebserviceException as exception:
+        print(f"::debug::Version {entry['model_version']} of model '{entry['model_name']}' from the manifest does not exist anymore: {exception}")
+        remove_manifest_entry(
+            manifest_file=manifest_file,
+            key=key
+        )
+        return None
+    print(f"::debug::Model was already registered as version {model.version} of model '{model.name}'. Skipping registration.")
+    return model
+
+
+def save_manifest_entry(manifest_file, key, model):
+    with locked_cache(manifest_file) as manifest:
+        manifest[key] = {
+            "model_name": model.name,
+            "model_version": model.version,
+            "model_id": model.id,
+            "registered_on": int(time.time())
+        }
+
+
+def remove_manifest_entry(manifest_file, key):
+    with locked_cache(manifest_file) as manifest:
+        manifest.pop(key, None)
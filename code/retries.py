@@ -0,0 +1,129 @@
+import re
+import time
+import random
+import threading
+
+
+TRANSIENT_STATUS_CODES = [408, 429, 500, 502, 503, 504]
+# Status codes for which a request that is not idempotent, e.g. a model registration, was certainly not processed
+REJECTED_STATUS_CODES = [429, 503]
+# Connection errors are retried by the adapter of the shared session of the SDK, which the pooled session replaces
+SDK_CONNECTION_RETRIES = 3
+
+_lock = threading.Lock()
+_settings = {"max_retries": 3, "deadline": 120.0, "base_delay": 0.5, "max_delay": 30.0}
+_statistics = {"calls": 0, "retries": 0, "backoff_seconds": 0.0}
+
+
+def configure_retries(max_retries=None, deadline=None, base_delay=None, max_delay=None):
+    with _lock:
+        for key, value in [("max_retries", max_retries), ("deadline", deadline), ("base_delay", base_delay), ("max_delay", max_delay)]:
+            if value is not None:
+                _settings[key] = value
+        _statistics.update({"calls": 0, "retries": 0, "backoff_seconds": 0.0})
+
+
+def get_retry_statistics():
+    with _lock:
+        return dict(_statistics, backoff_seconds=round(_statistics["backoff_seconds"], 3))
+
+
+def record_retry(backoff_seconds):
+    with _lock:
+        _statistics["retries"] += 1
+        _statistics["backoff_seconds"] += backoff_seconds
+
+
+def create_session(max_workers):
+    import requests
+    from urllib3.util.retry import Retry
+
+    # Sizing the connection pool to the number of workers, so that connections are reused across concurrent requests
+    # Throttled responses are retried by call_with_retries, so that the adapter only retries failed connections
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections=max_workers,
+        pool_maxsize=max_workers,
+        max_retries=Retry(total=SDK_CONNECTION_RETRIES, read=False, respect_retry_after_header=False)
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def configure_session_pool(workspace, max_workers):
+    # Only clients that use the shared session of the service context, e.g. the artifacts client, benefit from the pool
+    service_context = getattr(workspace, "service_context", None)
+    if service_context is None or getattr(service_context, "_session", None) is not None:
+        return
+    service_context._session = create_session(max_workers=max_workers)
+
+
+def get_response(exception):
+    # The SDK wraps the HTTP response in different places depending on the client
+    for candidate in [exception, getattr(exception, "inner_exception", None), getattr(exception, "__cause__", None)]:
+        response = getattr(candidate, "response", None)
+        if response is not None and hasattr(response, "status_code"):
+            return response
+    return None
+
+
+def get_status_code(exception):
+    response = get_response(exception)
+    if response is not None:
+        return int(response.status_code)
+    try:
+        return int(getattr(exception, "status_code", None))
+    except (TypeError, ValueError):
+        pass
+    # Model management errors only contain the status code in the message
+    match = re.search(r"Response Code: (\d{3})", str(exception))
+    return int(match.group(1)) if match else None
+
+
+def get_retry_after(exception=None, response=None):
+    response = response if response is not None else get_response(exception)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return max(float(headers.get("Retry-After", None)), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def is_transient(exception, idempotent=True):
+    import requests
+
+    if isinstance(exception, (requests.ConnectionError, requests.Timeout)):
+        return idempotent or isinstance(exception, requests.ConnectTimeout)
+    return get_status_code(exception) in (TRANSIENT_STATUS_CODES if idempotent else REJECTED_STATUS_CODES)
+
+
+def get_backoff(attempt, retry_after=None):
+    # Full jitter spreads retries of concurrent workers, a Retry-After header of the service is a lower bound
+    delay = random.uniform(0, min(_settings["max_delay"], _settings["base_delay"] * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+
+def call_with_retries(function, *args, operation=None, idempotent=True, max_retries=None, deadline=None, **kwargs):
+    # Retrying transient errors until the number of retries or the deadline of the call is exhausted
+    operation = operation if operation is not None else getattr(function, "__name__", "call")
+    max_retries = max_retries if max_retries is not None else _settings["max_retries"]
+    deadline = deadline if deadline is not None else _settings["deadline"]
+    with _lock:
+        _statistics["calls"] += 1
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            return function(*args, **kwargs)
+        except Exception as exception:
+            if attempt >= max_retries or not is_transient(exception, idempotent=idempotent):
+                raise
+            delay = get_backoff(attempt=attempt, retry_after=get_retry_after(exception=exception))
+            if time.monotonic() - start + delay > deadline:
+                print(f"::warning::{operation} failed and cannot be retried within the deadline of {deadline} seconds: {exception}")
+                raise
+            print(f"::debug::{operation} failed with a transient error. Retrying in {delay:.2f} seconds: {exception}")
+            record_retry(backoff_seconds=delay)
+            time.sleep(delay)
+            attempt += 1
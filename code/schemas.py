@@ -25,6 +25,34 @@
     }
 }
 
+target_workspaces_schema = {
+    "$id": "http://azure-ml.com/schemas/target_workspaces.json",
+    "$schema": "http://json-schema.org/schema",
+    "title": "target_workspaces",
+    "description": "JSON specification for the workspaces in which the model is registered",
+    "type": "array",
+    "minItems": 1,
+    "items": {
+        "type": "object",
+        "required": ["name"],
+        "properties": {
+            "name": {
+                "type": "string",
+                "description": "The name of the target that is used in the outputs."
+            },
+            "config_file": {
+                "type": "string",
+                "description": "The name of the workspace configuration file of the target in the GitHub workspace."
+            },
+            "azure_credentials": {
+                "type": "object",
+                "description": "The azure credentials of the target, if they differ from the azure credentials of the action."
+            }
+        },
+        "additionalProperties": False
+    }
+}
+
 parameters_schema = {
     "$id": "http://azure-ml.com/schemas/registermodel.json",
     "$schema": "http://json-schema.org/schema",
@@ -97,9 +125,163 @@
             "type": "array",
             "description": "List of metrics names that must be minimized. The action compares the metrics of the provided run with the linked run of the latest model with the same name that is registered in the model registry."
         },
+        "metrics_aggregation": {
+            "type": "string",
+            "description": "Aggregation that is used to reduce metrics logged as series (e.g. per epoch) to a single value before comparing them.",
+            "enum": ["last", "min", "max", "mean"]
+        },
+        "baseline_versions": {
+            "type": "integer",
+            "description": "Number of latest versions of the registered model that the metrics are compared with.",
+            "minimum": 1
+        },
+        "baseline_tags": {
+            "type": "object",
+            "description": "Dictionary of tags that the registered versions must have to be used as baseline. A null value only requires the tag to be set.",
+            "additionalProperties": {"type": ["string", "null"]}
+        },
+        "baseline_properties": {
+            "type": "object",
+            "description": "Dictionary of properties that the registered versions must have to be used as baseline. A null value only requires the property to be set.",
+            "additionalProperties": {"type": ["string", "null"]}
+        },
+        "baseline_min_version": {
+            "type": "integer",
+            "description": "Lowest version of the registered model that is used as baseline.",
+            "minimum": 1
+        },
+        "baseline_max_version": {
+            "type": "integer",
+            "description": "Highest version of the registered model that is used as baseline.",
+            "minimum": 1
+        },
+        "metrics_tolerance": {
+            "type": "object",
+            "description": "Dictionary of metric names and absolute tolerances by which the new model may perform worse than the production model.",
+            "additionalProperties": {"type": "number", "minimum": 0.0}
+        },
+        "metrics_weights": {
+            "type": "object",
+            "description": "Dictionary of metric names and weights that are used to rank the candidate runs.",
+            "additionalProperties": {"type": "number"}
+        },
+        "evaluate_sweep_children": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether all completed children of a hyperparameter tuning run are compared and the best passing one is registered."
+        },
+        "inference_benchmark": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether the inference latency, throughput, load time, peak memory and size of the model are measured before it is registered."
+        },
+        "inference_sample_file": {
+            "type": "string",
+            "description": "Path to a .npy, .json or .csv file with sample rows for the inference benchmark, relative to the GitHub workspace."
+        },
+        "inference_sample_shape": {
+            "type": "array",
+            "description": "Shape of a single input row, which is used to generate synthetic sample rows if no sample file or sample input dataset is provided.",
+            "items": {"type": "integer", "minimum": 1},
+            "minItems": 1
+        },
+        "inference_batch_size": {
+            "type": "integer",
+            "description": "Number of rows per prediction in the inference benchmark.",
+            "minimum": 1
+        },
+        "inference_iterations": {
+            "type": "integer",
+            "description": "Number of timed predictions in the inference benchmark.",
+            "minimum": 1
+        },
+        "inference_budgets": {
+            "type": "object",
+            "description": "Dictionary of inference measurements and factors by which the new model may be worse than the baseline version.",
+            "properties": {
+                "latency_p50_ms": {"type": "number", "minimum": 1.0},
+                "latency_p99_ms": {"type": "number", "minimum": 1.0},
+                "throughput_rows_per_second": {"type": "number", "minimum": 1.0},
+                "load_seconds": {"type": "number", "minimum": 1.0},
+                "peak_rss_mb": {"type": "number", "minimum": 1.0},
+                "model_size_mb": {"type": "number", "minimum": 1.0}
+            },
+            "additionalProperties": False
+        },
+        "resource_auto_sizing": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether the resource configuration of the model is derived from measurements of the memory and CPU usage of the model."
+        },
+        "resource_sizing_threads": {
+            "type": "array",
+            "description": "List of thread counts with which the model is measured for the resource sizing.",
+            "items": {"type": "integer", "minimum": 1},
+            "minItems": 1
+        },
+        "resource_headroom": {
+            "type": "number",
+            "description": "Fraction that is added to the measured memory and CPU usage of the model in the recommended resource configuration.",
+            "minimum": 0.0
+        },
         "force_registration": {
             "type": "boolean",
             "description": "Boolean value that determines whether or not to force the registration of the model regardless of the provided metrics."
+        },
+        "skip_unchanged_model": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether the registration of a model from the GitHub workspace is skipped if its content hash matches the latest registered version."
+        },
+        "model_hash_mmap": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether model files are memory-mapped while computing the content hash."
+        },
+        "staged_upload": {
+            "type": "boolean",
+            "description": "Boolean value that determines whether a model from the GitHub workspace is uploaded in parallel blocks before it is registered."
+        },
+        "upload_block_size_mb": {
+            "type": "number",
+            "description": "Size of the blocks (in MB) in which large model files are uploaded.",
+            "exclusiveMinimum": 0.0,
+            "maximum": 4000.0
+        },
+        "upload_max_workers": {
+            "type": "integer",
+            "description": "Maximum number of files and blocks that are uploaded concurrently.",
+            "minimum": 1
+        },
+        "upload_max_retries": {
+            "type": "integer",
+            "description": "Maximum number of retries of a single file or block upload.",
+            "minimum": 0
+        },
+        "model_package_format": {
+            "type": "string",
+            "description": "Compression of the archive into which a model directory from the GitHub workspace is packaged before it is registered.",
+            "enum": ["gzip", "zstd"]
+        },
+        "model_package_level": {
+            "type": "integer",
+            "description": "Compression level of the model archive.",
+            "minimum": 1,
+            "maximum": 22
+        },
+        "model_package_workers": {
+            "type": "integer",
+            "description": "Number of threads that compress the model archive.",
+            "minimum": 1
+        },
+        "model_search_exclude": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "List of directory names or glob patterns that are skipped when searching the model file in the GitHub workspace."
+        },
+        "model_search_ignore_files": {
+            "type": "array",
+            "items": {"type": "string"},
+            "description": "List of ignore files in the root of the GitHub workspace whose entries are skipped when searching the model file."
+        },
+        "model_search_index_file": {
+            "type": "string",
+            "description": "Path to a file in the GitHub workspace that lists all file paths of the repository (e.g. output of `git ls-files`) and is used instead of scanning the file system."
         }
     }
 }
@@ -0,0 +1,215 @@
+import os
+import sys
+import json
+import time
+import uuid
+import queue
+import socket
+import threading
+import traceback
+import contextvars
+import socketserver
+
+from utils import AMLConfigurationException
+from tracing import start_trace
+
+
+JOB_STATES = ["queued", "running", "succeeded", "failed"]
+FINISHED_STATES = ["succeeded", "failed"]
+
+job_output = contextvars.ContextVar("job_output", default=None)
+
+
+class AMLServiceException(Exception):
+    pass
+
+
+class ThreadOutput():
+    # Writing the output of a job, including the output of the executors it started, to the log of the job and all other output to the log of the service
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, data):
+        lines = job_output.get()
+        if lines is None:
+            return self.stream.write(data)
+        lines.append(data)
+        return len(data)
+
+    def flush(self):
+        self.stream.flush()
+
+    def capture(self, lines):
+        return job_output.set(lines)
+
+    def release(self, token):
+        job_output.reset(token)
+
+
+class RegistrationService():
+    # Running registration jobs with a bounded number of workers, jobs are rejected when the queue is full
+    def __init__(self, handler, workspace_key, max_workers=2, max_queue_size=16, max_finished_jobs=256):
+        self.handler = handler
+        self.workspace_key = workspace_key
+        self.max_finished_jobs = max_finished_jobs
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.jobs = {}
+        self.running = 0
+        self.output = sys.stdout if isinstance(sys.stdout, ThreadOutput) else ThreadOutput(sys.stdout)
+        sys.stdout = self.output
+        self.workers = [threading.Thread(target=self.work, name=f"job-worker-{i}", daemon=True) for i in range(max_workers)]
+        for worker in self.workers:
+            worker.start()
+
+    def submit(self, job, workspace_key=None):
+        if workspace_key is None or workspace_key != self.workspace_key:
+            raise AMLServiceException("The service is connected to a different workspace or uses different credentials")
+        job_id = uuid.uuid4().hex
+        with self.lock:
+            self.jobs[job_id] = {"job_id": job_id, "status": "queued", "submitted_on": time.time(), "output": [], "error": None, "error_type": None}
+        try:
+            self.queue.put_nowait((job_id, job))
+        except queue.Full:
+            with self.lock:
+                del self.jobs[job_id]
+            raise AMLServiceException(f"The job queue is full with {self.queue.maxsize} jobs")
+        print(f"::debug::Queued job '{job_id}' ({self.queue.qsize()} jobs in queue)")
+        return job_id
+
+    def get_status(self, job_id):
+        with self.lock:
+            if job_id not in self.jobs:
+                raise AMLServiceException(f"Job '{job_id}' does not exist")
+            return dict(self.jobs[job_id], output=list(self.jobs[job_id]["output"]))
+
+    def wait(self, job_id, timeout=None):
+        with self.lock:
+            self.finished.wait_for(lambda: self.jobs.get(job_id, {"status": "failed"})["status"] in FINISHED_STATES, timeout=timeout)
+        return self.get_status(job_id)
+
+    def get_statistics(self):
+        with self.lock:
+            states = [job["status"] for job in self.jobs.values()]
+        return {status: states.count(status) for status in JOB_STATES}
+
+    def shutdown(self):
+        # Letting the workers finish the queued jobs before restoring the output of the process
+        for worker in self.workers:
+            self.queue.put((None, None))
+        for worker in self.workers:
+            worker.join()
+        if sys.stdout is self.output:
+            sys.stdout = self.output.stream
+
+    def work(self):
+        while True:
+            job_id, job = self.queue.get()
+            if job_id is None:
+                self.queue.task_done()
+                return
+            with self.lock:
+                self.jobs[job_id]["status"] = "running"
+                self.running += 1
+                output = self.jobs[job_id]["output"]
+            print(f"::debug::Running job '{job_id}'")
+            status, error, error_type = "succeeded", None, None
+            token = self.output.capture(output)
+            try:
+                self.handler(job)
+            except Exception as exception:
+                status, error, error_type = "failed", str(exception), type(exception).__name__
+                print(f"::debug::{traceback.format_exc()}")
+            finally:
+                self.output.release(token)
+            print(f"::debug::Job '{job_id}' {status}")
+            with self.lock:
+                self.jobs[job_id].update(status=status, error=error, error_type=error_type, finished_on=time.time())
+                self.running -= 1
+                self.remove_finished_jobs()
+                idle = self.running == 0 and self.queue.empty()
+                self.finished.notify_all()
+            if idle:
+                # Dropping the spans of finished jobs, so that the trace of the service does not grow without bounds
+                start_trace(name="service")
+            self.queue.task_done()
+
+    def remove_finished_jobs(self):
+        finished_jobs = sorted(
+            [job for job in self.jobs.values() if job["status"] in FINISHED_STATES],
+            key=lambda job: job["finished_on"]
+        )
+        for job in finished_jobs[:max(len(finished_jobs) - self.max_finished_jobs, 0)]:
+            del self.jobs[job["job_id"]]
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    # Every request and response is a single line of JSON
+    def handle(self):
+        service = self.server.service
+        try:
+            request = json.loads(self.rfile.readline())
+            action = request.get("action", None)
+            if action == "ping":
+                response = {"statistics": service.get_statistics()}
+            elif action == "submit":
+                response = {"job_id": service.submit(job=request.get("job", {}), workspace_key=request.get("workspace_key", None))}
+            elif action == "status":
+                response = {"job": service.get_status(job_id=request.get("job_id", None))}
+            elif action == "wait":
+                response = {"job": service.wait(job_id=request.get("job_id", None), timeout=request.get("timeout", None))}
+            else:
+                raise AMLServiceException(f"Unknown action '{action}'")
+        except (AMLServiceException, ValueError, AttributeError) as exception:
+            response = {"error": str(exception)}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(socket_path, service):
+    # Replacing the socket of a previous service that did not shut down cleanly
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+
+    # Creating the socket with access for the owner only, so that no other user can submit jobs before its permissions are set
+    umask = os.umask(0o177)
+    try:
+        server = UnixServer(socket_path, RequestHandler)
+    finally:
+        os.umask(umask)
+    server.service = service
+    return server
+
+
+def send_request(socket_path, request, timeout=None):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        with client.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            response = json.loads(stream.readline())
+    if "error" in response:
+        raise AMLServiceException(response["error"])
+    return response
+
+
+def wait_for_job(socket_path, job_id, poll_timeout=30.0):
+    # Waiting in intervals, so that a service that stopped is noticed by a timeout of the connection
+    while True:
+        try:
+            job_status = send_request(
+                socket_path=socket_path,
+                request={"action": "wait", "job_id": job_id, "timeout": poll_timeout},
+                timeout=poll_timeout + 10.0
+            )["job"]
+        except (OSError, ValueError, AMLServiceException) as exception:
+            print(f"::error::Lost the connection to the registration service at '{socket_path}' while waiting for job '{job_id}': {exception}")
+            raise AMLConfigurationException(f"The registration service stopped before job '{job_id}' finished. Please check the log of the service.")
+        if job_status["status"] in FINISHED_STATES:
+            return job_status
@@ -0,0 +1,37 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+
+
+class StagingCache():
+    # Sharing the results of expensive preparation steps, e.g. hashing or packaging a model, between the registrations in several workspaces
+    def __init__(self):
+        # The AML SDK only registers paths inside the working directory
+        self.directory = tempfile.mkdtemp(prefix=".aml-staging-", dir=os.getcwd())
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key, function, **kwargs):
+        # Running the function once per key, registrations that need the same result wait for the first one
+        with self.lock:
+            entry = self.entries.setdefault(key, {"lock": threading.Lock()})
+        with entry["lock"]:
+            if "value" not in entry:
+                entry["value"] = function(**kwargs)
+        return entry["value"]
+
+    def get_directory(self, key):
+        directory = os.path.join(self.directory, hashlib.sha256(repr(key).encode("utf-8")).hexdigest()[:16])
+        os.makedirs(directory, exist_ok=True)
+        return directory
+
+    def close(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def get_staged(staging_cache, key, function, **kwargs):
+    if staging_cache is None:
+        return function(**kwargs)
+    return staging_cache.get(key, function, **kwargs)
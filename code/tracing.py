@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import threading
+
+from functools import wraps
+from contextlib import contextmanager
+
+
+SERVICE_NAME = "aml-registermodel"
+
+_lock = threading.Lock()
+_local = threading.local()
+_trace = {"trace_id": os.urandom(16).hex(), "root_span": None, "spans": []}
+
+
+def start_trace(name="action"):
+    # Resetting the recorded spans and opening a root span, so that every invocation of the action has its own trace
+    root_span = {
+        "name": name,
+        "span_id": os.urandom(8).hex(),
+        "parent_id": None,
+        "thread": threading.current_thread().name,
+        "start_time": time.time(),
+        "attributes": {},
+        "status": "ok",
+        "perf_start": time.perf_counter()
+    }
+    with _lock:
+        _trace["trace_id"] = os.urandom(16).hex()
+        _trace["root_span"] = root_span
+        _trace["spans"] = []
+    _local.stack = []
+
+
+def end_trace(status="ok"):
+    with _lock:
+        root_span = _trace["root_span"]
+        if root_span is None or "duration" in root_span:
+            return
+        root_span["duration"] = time.perf_counter() - root_span.pop("perf_start")
+        root_span["status"] = status
+        _trace["spans"].append(root_span)
+
+
+@contextmanager
+def trace_phase(name, **attributes):
+    # Spans opened in worker threads without an active span are attached to the root span
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    span = {
+        "name": name,
+        "span_id": os.urandom(8).hex(),
+        "parent_id": stack[-1]["span_id"] if len(stack) > 0 else (_trace["root_span"] or {}).get("span_id", None),
+        "thread": threading.current_thread().name,
+        "start_time": time.time(),
+        "attributes": attributes,
+        "status": "ok"
+    }
+    start = time.perf_counter()
+    stack.append(span)
+    try:
+        yield span
+    except BaseException as exception:
+        span["status"] = "error"
+        span["attributes"]["error"] = type(exception).__name__
+        raise
+    finally:
+        stack.pop()
+        span["duration"] = time.perf_counter() - start
+        with _lock:
+            _trace["spans"].append(span)
+
+
+def traced(name):
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with trace_phase(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def get_phase_durations():
+    # Summing durations of spans with the same name, e.g. helpers that are called once per model
+    durations = {}
+    with _lock:
+        spans = sorted(_trace["spans"], key=lambda span: span["start_time"])
+    for span in spans:
+        durations[span["name"]] = round(durations.get(span["name"], 0.0) + span["duration"], 6)
+    return durations
+
+
+def get_trace():
+    with _lock:
+        spans = sorted(_trace["spans"], key=lambda span: span["start_time"])
+        return {"trace_id": _trace["trace_id"], "spans": [dict(span) for span in spans]}
+
+
+def write_trace(trace_file):
+    os.makedirs(os.path.dirname(os.path.abspath(trace_file)), exist_ok=True)
+    with open(trace_file, "w") as f:
+        json.dump(get_trace(), f, indent=2)
+
+
+def get_otlp_attribute(key, value):
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    elif isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    elif isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def export_trace(otlp_endpoint, timeout=5):
+    # Sending spans in the OTLP/HTTP JSON encoding, so that any OpenTelemetry collector can receive them without additional packages
+    import urllib.request
+
+    trace = get_trace()
+    spans = []
+    for span in trace["spans"]:
+        otlp_span = {
+            "traceId": trace["trace_id"],
+            "spanId": span["span_id"],
+            "name": span["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(int(span["start_time"] * 1e9)),
+            "endTimeUnixNano": str(int((span["start_time"] + span["duration"]) * 1e9)),
+            "attributes": [get_otlp_attribute(key, value) for key, value in dict(span["attributes"], thread=span["thread"]).items()],
+            "status": {"code": 1 if span["status"] == "ok" else 2}
+        }
+        if span["parent_id"] is not None:
+            otlp_span["parentSpanId"] = span["parent_id"]
+        spans.append(otlp_span)
+    payload = {
+        "resourceSpans": [{
+            "resource": {"attributes": [get_otlp_attribute("service.name", SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": SERVICE_NAME}, "spans": spans}]
+        }]
+    }
+    request = urllib.request.Request(
+        url=f"{otlp_endpoint.rstrip('/')}/v1/traces",
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return response.status
+
+
+def finish_trace(trace_file=None, otlp_endpoint=None, status="ok"):
+    # Reporting the trace must never fail the action
+    end_trace(status=status)
+    durations = get_phase_durations()
+    print(f"::debug::Phase durations: {json.dumps(durations)}")
+    print(f"::set-output name=phase_durations::{json.dumps(durations)}")
+    if trace_file:
+        try:
+            write_trace(trace_file=trace_file)
+            print(f"::set-output name=trace_file::{trace_file}")
+        except OSError as exception:
+            print(f"::warning::Could not write trace file '{trace_file}': {exception}")
+    if otlp_endpoint:
+        try:
+            export_trace(otlp_endpoint=otlp_endpoint)
+        except Exception as exception:
+            print(f"::warning::Could not export trace to '{otlp_endpoint}': {exception}")
+    return durations
@@ -0,0 +1,153 @@
+import os
+import time
+import uuid
+import base64
+import hashlib
+
+from datetime import datetime
+from urllib.parse import urlencode
+from executors import ContextThreadPoolExecutor
+from utils import AMLConfigurationException, splitall
+from tracing import traced
+from retries import create_session, get_backoff, get_retry_after, record_retry
+
+
+BLOB_SERVICE_VERSION = "2019-12-12"
+ARTIFACT_BATCH_SIZE = 50
+
+
+def get_blob_operation_url(blob_url, **query):
+    separator = "&" if "?" in blob_url else "?"
+    return f"{blob_url}{separator}{urlencode(query)}"
+
+
+def get_block_id(index):
+    # Block IDs of a blob must all have the same length
+    return base64.b64encode(f"{index:08d}".encode("utf-8")).decode("utf-8")
+
+
+def put_with_retries(session, url, data, headers, max_retries):
+    import requests
+
+    for attempt in range(max_retries + 1):
+        response = None
+        try:
+            response = session.put(url, data=data, headers=headers, timeout=300)
+            if response.status_code < 300:
+                return attempt
+            error = f"HTTP {response.status_code}"
+            retriable = response.status_code in [408, 429] or response.status_code >= 500
+        except requests.RequestException as exception:
+            error = type(exception).__name__
+            retriable = True
+        if not retriable or attempt >= max_retries:
+            break
+        delay = get_backoff(attempt=attempt, retry_after=get_retry_after(response=response) if response is not None else None)
+        record_retry(backoff_seconds=delay)
+        time.sleep(delay)
+    # Removing the SAS token from the URL before reporting the error
+    print(f"::error::Upload to '{url.split('?')[0]}' failed after {attempt + 1} attempts: {error}")
+    raise AMLConfigurationException(f"Upload to '{url.split('?')[0]}' failed: {error}")
+
+
+@traced("upload_files_to_blobs")
+def upload_files_to_blobs(file_urls, block_size=8 * 1024 * 1024, max_workers=8, max_retries=3, session=None):
+    session = session if session is not None else create_session(max_workers=max_workers)
+
+    # Splitting files larger than the block size into blocks that are uploaded independently
+    parts = []
+    block_lists = []
+    total_size = 0
+    for file_path, blob_url in file_urls:
+        file_size = os.path.getsize(file_path)
+        total_size += file_size
+        if file_size <= block_size:
+            parts.append((file_path, blob_url, None, 0, file_size))
+        else:
+            block_ids = []
+            for index, offset in enumerate(range(0, file_size, block_size)):
+                block_ids.append(get_block_id(index))
+                parts.append((file_path, blob_url, block_ids[-1], offset, min(block_size, file_size - offset)))
+            block_lists.append((blob_url, block_ids))
+
+    def upload_part(part):
+        file_path, blob_url, block_id, offset, length = part
+        with open(file_path, "rb") as f:
+            f.seek(offset)
+            data = f.read(length)
+        headers = {
+            "x-ms-version": BLOB_SERVICE_VERSION,
+            "Content-MD5": base64.b64encode(hashlib.md5(data).digest()).decode("utf-8")
+        }
+        if block_id is None:
+            headers["x-ms-blob-type"] = "BlockBlob"
+            url = blob_url
+        else:
+            url = get_blob_operation_url(blob_url, comp="block", blockid=block_id)
+        return put_with_retries(session=session, url=url, data=data, headers=headers, max_retries=max_retries)
+
+    def commit_block_list(block_list):
+        blob_url, block_ids = block_list
+        data = "<?xml version=\"1.0\" encoding=\"utf-8\"?><BlockList>{}</BlockList>".format("".join(f"<Latest>{block_id}</Latest>" for block_id in block_ids))
+        headers = {"x-ms-version": BLOB_SERVICE_VERSION, "Content-Type": "application/xml"}
+        return put_with_retries(session=session, url=get_blob_operation_url(blob_url, comp="blocklist"), data=data.encode("utf-8"), headers=headers, max_retries=max_retries)
+
+    print(f"::debug::Uploading {len(file_urls)} files in {len(parts)} parts with {max_workers} workers")
+    start = time.time()
+    with ContextThreadPoolExecutor(max_workers=max_workers) as executor:
+        retries = sum(executor.map(upload_part, parts))
+        retries += sum(executor.map(commit_block_list, block_lists))
+    duration = max(time.time() - start, 1e-6)
+    print(f"::debug::Uploaded {total_size / 1024 ** 2:.1f} MB in {duration:.1f} s ({total_size / 1024 ** 2 / duration:.1f} MB/s, {retries} retries)")
+    return {"bytes": total_size, "seconds": duration, "retries": retries}
+
+
+@traced("stage_model")
+def stage_model(workspace, model_path, model_name, block_size=8 * 1024 * 1024, max_workers=8, max_retries=3):
+    from azureml.core import Model
+    from azureml._restclient.artifacts_client import ArtifactsClient
+    from azureml._model_management._util import model_name_validation
+
+    # Validating the model name and path like Model.register, before any artifact is created
+    model_name_validation(model_name)
+    Model._validate_model_path(model_path, None)
+    file_names, artifact_names = Model._collect_model_artifact_paths(model_path, None)
+    if len(file_names) < 1:
+        raise AMLConfigurationException(f"Model path '{model_path}' does not contain any files")
+
+    # Creating empty artifacts in the same location that Model.register uses
+    origin = "LocalUpload"
+    container = f"{datetime.now().strftime('%y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    artifact_names = ["/".join(splitall(artifact_name)) for artifact_name in artifact_names]
+    artifacts_client = ArtifactsClient(workspace.service_context)
+    file_urls = []
+    for i in range(0, len(artifact_names), ARTIFACT_BATCH_SIZE):
+        batch_names = artifact_names[i:i + ARTIFACT_BATCH_SIZE]
+        content_information = artifacts_client.create_empty_artifacts(origin, container, batch_names)
+        for file_name, artifact_name in zip(file_names[i:i + ARTIFACT_BATCH_SIZE], batch_names):
+            file_urls.append((file_name, content_information.artifact_content_information[artifact_name].content_uri))
+
+    # Uploading files and blocks concurrently
+    upload_files_to_blobs(
+        file_urls=file_urls,
+        block_size=block_size,
+        max_workers=max_workers,
+        max_retries=max_retries
+    )
+    return f"{origin}/{container}/{os.path.basename(os.path.abspath(model_path))}"
+
+
+@traced("register_staged_model")
+def register_staged_model(workspace, artifacts_path, model_name, **kwargs):
+    from azureml.core import Model
+    from azureml._restclient.assets_client import AssetsClient
+
+    # Registering the uploaded artifacts as model asset
+    asset = AssetsClient(workspace.service_context).create_asset(model_name, [{"prefix": artifacts_path}], None)
+    return Model._register_with_asset(
+        workspace,
+        model_name,
+        asset.id,
+        unpack=False,
+        **kwargs
+    )
@@ -1,10 +1,20 @@
 import os
+import json
+import mmap
+import bisect
+import fnmatch
+import hashlib
+import itertools
 import jsonschema
 
-from azureml.core import Model, Dataset
-from azureml.train.hyperdrive import HyperDriveRun
-from azureml.pipeline.core import PipelineRun
-from azureml.exceptions import WebserviceException
+from executors import ContextThreadPoolExecutor
+from tracing import traced
+from retries import call_with_retries
+
+
+MODEL_HASH_PROPERTY = "model_sha256"
+
+_validators = {}
 
 
 class AMLConfigurationException(Exception):
@@ -15,57 +25,141 @@ class AMLModelPerformanceException(Exception):
     pass
 
 
-def get_best_run(experiment, run, pipeline_child_run_name=None):
+def get_cached_run(experiment, run_id, run_cache=None):
+    # Reusing run objects that were already loaded in this invocation
+    from azureml.core import Run
+
+    if run_cache is not None and run_id in run_cache:
+        return run_cache[run_id]
+    run = call_with_retries(
+        Run,
+        experiment=experiment,
+        run_id=run_id,
+        operation="Loading run"
+    )
+    if run_cache is not None:
+        run_cache[run_id] = run
+    return run
+
+
+def get_best_child_run(experiment, run, run_cache=None):
+    # Loading the best child from the metric table that HyperDrive maintains in the parent run
+    metric_table = call_with_retries(run.get_metrics, name="best_child_by_primary_metric", operation="Loading best child run").get("best_child_by_primary_metric", None)
+    if metric_table:
+        run_id = aggregate_metric(metric_table.get("run_id", None))
+        is_final = aggregate_metric(metric_table.get("final", None))
+        if run_id and (is_final or run.status not in ["Completed", "Failed", "Canceled"]):
+            return get_cached_run(experiment=experiment, run_id=run_id, run_cache=run_cache)
+
+    # Falling back to comparing the metrics of all children
+    print("::debug::Best child run not stored in hyperparameter tuning run. Comparing metrics of all child runs.")
+    from azureml.train.hyperdrive import HyperDriveRun
+
+    run = HyperDriveRun(
+        experiment=experiment,
+        run_id=run.id
+    )
+    return call_with_retries(run.get_best_run_by_primary_metric, operation="Loading best child run")
+
+
+@traced("get_best_run")
+def get_best_run(experiment, run, pipeline_child_run_name=None, run_cache=None):
     # Handle pipeline run
     print("::debug::Handling pipeline run")
     if run.type == "azureml.PipelineRun":
-        # Loading pipeline run
-        run = PipelineRun(
-            experiment=experiment,
-            run_id=run.id
-        )
-
-        # Loading pipeline step by name
-        run = run.find_step_run(name=pipeline_child_run_name)
-        if len(run) < 1:
-            print(f"::error::Found no step in the pipeline with the name '{pipeline_child_run_name}'. Please provide the name of the step in your pipeline that produced the model file with the 'pipeline_child_run_name' parameter.")
-            raise AMLConfigurationException(f"Foundno step in the pipeline with the name '{pipeline_child_run_name}'. Please provide the name of the step in your pipeline that produced the model file with the 'pipeline_child_run_name' parameter.")
-        elif len(run) > 1:
+        # Loading pipeline steps in a single pass over the lazily paginated children and reusing them for other step names
+        step_runs = run_cache.get(("steps", run.id), None) if run_cache is not None else None
+        if step_runs is None:
+            step_runs = {}
+            for child_run in call_with_retries(lambda: list(run.get_children()), operation="Loading pipeline steps"):
+                step_runs.setdefault(child_run._run_dto.get("name", None), []).append(child_run)
+            if run_cache is not None:
+                run_cache[("steps", run.id)] = step_runs
+        matching_runs = step_runs.get(pipeline_child_run_name, [])
+        if len(matching_runs) > 1:
             print(f"::error::Found more than one step in the pipeline with the name '{pipeline_child_run_name}'. All step names should be unique in the pipeline.")
             raise AMLConfigurationException(f"Found more than one step in the pipeline with the name '{pipeline_child_run_name}'. All step names should be unique in the pipeline.")
-        else:
-            run = run[0]
+        if len(matching_runs) < 1:
+            print(f"::error::Found no step in the pipeline with the name '{pipeline_child_run_name}'. Please provide the name of the step in your pipeline that produced the model file with the 'pipeline_child_run_name' parameter.")
+            raise AMLConfigurationException(f"Found no step in the pipeline with the name '{pipeline_child_run_name}'. Please provide the name of the step in your pipeline that produced the model file with the 'pipeline_child_run_name' parameter.")
+        run = matching_runs[0]
 
-        # Checking if run has childs and therefore is a hyperparameter run
-        if len(list(run.get_children())) > 0:
-            run = list(run.get_children())[0]
+        # Checking if run has childs and therefore is a hyperparameter run, only loading the first page of children
+        child_run = call_with_retries(lambda: next(iter(run.get_children()), None), operation="Loading child runs")
+        if child_run is not None:
+            run = child_run
+        if run_cache is not None:
+            run_cache[run.id] = run
 
     # Handle hyperdrive run
     print("::debug::Handling hyperdrive run")
     if run.type == "hyperdrive":
-        run = HyperDriveRun(
+        best_run = get_best_child_run(
             experiment=experiment,
-            run_id=run.id
+            run=run,
+            run_cache=run_cache
         )
-        best_run = run.get_best_run_by_primary_metric()
     else:
         best_run = run
     return best_run
 
 
 def get_dataset(workspace, name):
-    try:
-        dataset = Dataset.get_by_name(
-            workspace=workspace,
-            name=name,
-            version="latest"
-        )
-    except Exception:
-        dataset = None
-    return dataset
+    datasets, _ = get_datasets(
+        workspace=workspace,
+        names=[name]
+    )
+    return datasets.get(name, None)
+
+
+@traced("get_datasets")
+def get_datasets(workspace, names, max_workers=8):
+    # Results, including failures, are memoized per call, so that every name is only requested once
+    results = {}
+    pending_names = []
+    for name in names:
+        if name is not None and name not in pending_names:
+            pending_names.append(name)
+
+    from azureml.core import Dataset
+
+    def load_dataset(name):
+        try:
+            dataset = call_with_retries(
+                Dataset.get_by_name,
+                workspace=workspace,
+                name=name,
+                version="latest",
+                operation=f"Loading dataset '{name}'"
+            )
+        except Exception as exception:
+            return None, exception
+        return dataset, None
+
+    if len(pending_names) > 0:
+        print(f"::debug::Loading {len(pending_names)} datasets")
+        with ContextThreadPoolExecutor(max_workers=min(max_workers, len(pending_names))) as executor:
+            for name, result in zip(pending_names, executor.map(load_dataset, pending_names)):
+                results[name] = result
+
+    # Collecting datasets and failures
+    datasets = {}
+    failures = {}
+    for name in names:
+        if name is None:
+            continue
+        dataset, exception = results[name]
+        if exception is None:
+            datasets[name] = dataset
+        elif name not in failures:
+            print(f"::warning::Could not load dataset '{name}'. The dataset will not be assigned to the model: {exception}")
+            failures[name] = exception
+    return datasets, failures
 
 
 def get_model_framework(name):
+    from azureml.core import Model
+
     if name is not None and name.lower() == "scikitlearn":
         model_framework = Model.Framework.SCIKITLEARN
     elif name is not None and name.lower() == "onnx":
@@ -79,59 +173,303 @@ def get_model_framework(name):
     return model_framework
 
 
-def compare_metrics(workspace, run, model_name, metrics_max, metrics_min):
+@traced("get_production_model")
+def get_production_model(workspace, model_name):
+    from azureml.core import Model
+    from azureml.exceptions import WebserviceException
+
     # Loading production model
     print("::debug::Loading production model")
     try:
-        production_model = Model(
+        production_model = call_with_retries(
+            Model,
+            workspace=workspace,
+            name=model_name,
+            operation="Loading production model"
+        )
+    except WebserviceException as exception:
+        print(f"::debug::Model with same name not found. Assuming that it is the first model that is registered: {exception}")
+        production_model = None
+    return production_model
+
+
+def get_baseline_filter(parameters):
+    # Collecting the settings that select the baseline versions of a model, an empty filter selects the latest versions
+    baseline_filter = {}
+    for key, parameter in [("tags", "baseline_tags"), ("properties", "baseline_properties"), ("min_version", "baseline_min_version"), ("max_version", "baseline_max_version")]:
+        if parameters.get(parameter, None) is not None:
+            baseline_filter[key] = parameters[parameter]
+    return baseline_filter
+
+
+def get_baseline_key(model_name, baseline_filter=None, count=1):
+    # Models without a filter are keyed by name, so that baselines of the same selection and number of versions are loaded once per invocation
+    if not baseline_filter and count <= 1:
+        return model_name
+    return (model_name, count, json.dumps(baseline_filter or {}, sort_keys=True))
+
+
+def get_filter_query(values):
+    # The model management service expects a list of keys or key value pairs
+    return [key if value is None else [key, str(value)] for key, value in sorted(values.items())] or None
+
+
+def get_baseline_run(workspace, baseline_model):
+    # Models that were listed without expansion only reference their run
+    if getattr(baseline_model, "run", None) is not None:
+        return baseline_model.run
+    run_id = getattr(baseline_model, "run_id", None)
+    experiment_name = getattr(baseline_model, "experiment_name", None)
+    if not run_id or not experiment_name:
+        return None
+    from azureml.core import Experiment, Run
+
+    experiment = Experiment(workspace=workspace, name=experiment_name)
+    baseline_model.run = call_with_retries(
+        Run,
+        experiment=experiment,
+        run_id=run_id,
+        operation="Loading run of production model"
+    )
+    return baseline_model.run
+
+
+@traced("get_production_models")
+def get_production_models(workspace, model_name, count=1, baseline_filter=None):
+    # Loading the latest versions of the production model
+    baseline_filter = baseline_filter or {}
+    if count <= 1 and not baseline_filter:
+        production_model = get_production_model(
+            workspace=workspace,
+            model_name=model_name
+        )
+        return [production_model] if production_model is not None else []
+    from azureml.core import Model
+    from azureml.exceptions import WebserviceException
+
+    # Filtering by tags and properties on the service, without loading the runs and datasets of every listed version
+    print(f"::debug::Loading latest {count} versions of production model with filter {json.dumps(baseline_filter, sort_keys=True)}")
+    try:
+        production_models = call_with_retries(
+            Model.list,
             workspace=workspace,
-            name=model_name
+            name=model_name,
+            tags=get_filter_query(baseline_filter.get("tags", {})),
+            properties=get_filter_query(baseline_filter.get("properties", {})),
+            expand=False,
+            operation="Loading production models"
         )
     except WebserviceException as exception:
         print(f"::debug::Model with same name not found. Assuming that it is the first model that is registered: {exception}")
-        return
+        production_models = []
+
+    # The service does not filter by version, so that the version range is applied to the filtered list
+    min_version = baseline_filter.get("min_version", 1)
+    max_version = baseline_filter.get("max_version", None)
+    production_models = [
+        production_model for production_model in production_models
+        if production_model.version >= min_version and (max_version is None or production_model.version <= max_version)
+    ]
+    production_models = sorted(production_models, key=lambda production_model: production_model.version, reverse=True)[:count]
+    if baseline_filter and len(production_models) < 1:
+        print(f"::warning::Found no version of model '{model_name}' that matches the baseline filter. Registering the model without a metric comparison.")
+    print(f"::debug::Selected versions {[production_model.version for production_model in production_models]} of model '{model_name}' as baseline")
+
+    # Loading only the runs of the selected versions
+    for production_model in production_models:
+        get_baseline_run(
+            workspace=workspace,
+            baseline_model=production_model
+        )
+    return production_models
+
 
-    # Loading run of production model
-    print("::debug::Loading run of production model")
-    production_model_run = production_model.run
-    if production_model_run is None:
+def aggregate_metric(value, aggregation="last"):
+    # Reducing metrics that were logged as series to a single value
+    if not isinstance(value, list):
+        return value
+    if len(value) < 1:
+        return None
+    if aggregation == "min":
+        return min(value)
+    elif aggregation == "max":
+        return max(value)
+    elif aggregation == "mean":
+        return sum(value) / len(value)
+    else:
+        return value[-1]
+
+
+def get_run_metrics(run, names, aggregation="last", max_workers=8, metrics_cache=None):
+    # Loading only the requested metrics, one request per metric name
+    names = list(dict.fromkeys(names))
+    if len(names) < 1:
+        return {}
+    if metrics_cache is not None:
+        # Reusing metrics of runs that were already loaded in the same invocation, e.g. of a shared baseline
+        cached_metrics = {name: metrics_cache[(run.id, name, aggregation)] for name in names if (run.id, name, aggregation) in metrics_cache}
+        missing_names = [name for name in names if name not in cached_metrics]
+        if len(missing_names) > 0:
+            loaded_metrics = get_run_metrics(
+                run=run,
+                names=missing_names,
+                aggregation=aggregation,
+                max_workers=max_workers
+            )
+            for name, value in loaded_metrics.items():
+                metrics_cache[(run.id, name, aggregation)] = value
+            cached_metrics.update(loaded_metrics)
+        return {name: cached_metrics[name] for name in names}
+
+    def load_metric(name):
+        return call_with_retries(run.get_metrics, name=name, operation=f"Loading metric '{name}'").get(name, None)
+
+    with ContextThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+        values = list(executor.map(load_metric, names))
+    return {name: aggregate_metric(value=value, aggregation=aggregation) for name, value in zip(names, values)}
+
+
+def get_sweep_metrics(sweep_run, names, aggregation="last", max_workers=8):
+    # Loading the requested metrics of all completed children with one recursive request per metric name
+    names = list(dict.fromkeys(names))
+    completed_run_ids = call_with_retries(lambda: set(child.id for child in sweep_run.get_children(status="Completed", _rehydrate_runs=False)), operation="Loading child runs")
+    if len(names) < 1:
+        return {run_id: {} for run_id in completed_run_ids}
+
+    def load_metric(name):
+        return call_with_retries(sweep_run.get_metrics, name=name, recursive=True, operation=f"Loading metric '{name}'")
+
+    sweep_metrics = {run_id: {} for run_id in completed_run_ids}
+    with ContextThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+        for name, values in zip(names, executor.map(load_metric, names)):
+            for run_id, run_metrics in values.items():
+                if run_id in sweep_metrics:
+                    sweep_metrics[run_id][name] = aggregate_metric(value=run_metrics.get(name, None), aggregation=aggregation)
+    return sweep_metrics
+
+
+@traced("compare_metrics")
+def compare_metrics(workspace, run, model_name, metrics_max, metrics_min, production_models=None, metrics_aggregation="last", baseline_versions=1, metrics_tolerance=None, metrics_weights=None, sweep_run=None, baseline_filter=None, metrics_cache=None):
+    from evaluation import evaluate_candidates
+
+    # Loading production models, reusing lookups of other models in the same invocation
+    baseline_key = get_baseline_key(model_name, baseline_filter, baseline_versions)
+    if production_models is not None and baseline_key in production_models:
+        baseline_models = production_models[baseline_key]
+    else:
+        baseline_models = get_production_models(
+            workspace=workspace,
+            model_name=model_name,
+            count=baseline_versions,
+            baseline_filter=baseline_filter
+        )
+        if production_models is not None:
+            production_models[baseline_key] = baseline_models
+    if len(baseline_models) < 1:
+        return run
+
+    # Loading runs of production models
+    print("::debug::Loading runs of production models")
+    baseline_runs = [get_baseline_run(workspace=workspace, baseline_model=baseline_model) for baseline_model in baseline_models]
+    baseline_runs = [baseline_run for baseline_run in baseline_runs if baseline_run is not None]
+    if len(baseline_runs) < 1:
         print("::debug::Previous model was not registered from run object")
-        return
+        return run
+    metric_names = list(metrics_max) + list(metrics_min)
+    if len(metric_names) < 1:
+        return run
 
-    # Loading metrics of runs
-    production_model_metrics = production_model_run.get_metrics()
-    run_metrics = run.get_metrics()
+    # Loading metrics of runs concurrently
+    print("::debug::Loading metrics of runs")
+    with ContextThreadPoolExecutor(max_workers=min(8, len(baseline_runs) + 1)) as executor:
+        baseline_futures = [executor.submit(get_run_metrics, run=baseline_run, names=metric_names, aggregation=metrics_aggregation, metrics_cache=metrics_cache) for baseline_run in baseline_runs]
+        if sweep_run is not None:
+            candidate_future = executor.submit(get_sweep_metrics, sweep_run=sweep_run, names=metric_names, aggregation=metrics_aggregation)
+        else:
+            candidate_future = executor.submit(lambda: {run.id: get_run_metrics(run=run, names=metric_names, aggregation=metrics_aggregation)})
+    baseline_metrics = [future.result() for future in baseline_futures]
+    candidate_metrics = candidate_future.result()
+    if len(candidate_metrics) < 1:
+        print("::error::Found no completed child run in the hyperparameter tuning run")
+        raise AMLConfigurationException("Found no completed child run in the hyperparameter tuning run")
+    if sweep_run is None:
+        for metric_name in metric_names:
+            if candidate_metrics[run.id].get(metric_name, None) is None:
+                print(f"::error::Metric comparison failed for metric name '{metric_name}': Metric was not logged by the run")
+                raise AMLConfigurationException(f"Metric comparison failed for metric name '{metric_name}'")
 
-    # Comparing metrics to maximize
-    print("::debug::Comparing metrics to maximize")
-    for metric_max in metrics_max:
-        try:
-            if run_metrics.get(metric_max) < production_model_metrics.get(metric_max):
-                print(f"::error::New model does not perform better than production model for metric '{metric_max}'")
-                raise AMLModelPerformanceException(f"New model does not perform better than production model for metric '{metric_max}'")
-        except TypeError as exception:
-            print(f"::error::Metric comparison failed for metric name '{metric_max}': {exception}")
-            raise AMLConfigurationException(f"::error::Metric comparison failed for metric name '{metric_max}'")
-
-    # Comparing metrics to minimize
-    print("::debug::Comparing metrics to minimize")
-    for metric_min in metrics_min:
-        try:
-            if run_metrics.get(metric_min) < production_model_metrics.get(metric_min):
-                print(f"::error::New model does not perform better than production model for metric '{metric_min}'")
-                raise AMLModelPerformanceException(f"New model does not perform better than production model for metric '{metric_min}'")
-        except TypeError as exception:
-            print(f"::error::Metric comparison failed for metric name '{metric_min}': {exception}")
-            raise AMLConfigurationException(f"::error::Metric comparison failed for metric name '{metric_min}'")
+    # Comparing metrics of all candidates with the production models
+    print(f"::debug::Comparing metrics of {len(candidate_metrics)} candidate runs with {len(baseline_metrics)} production models")
+    ranking, passed = evaluate_candidates(
+        candidate_metrics=candidate_metrics,
+        baseline_metrics=baseline_metrics,
+        metrics_max=metrics_max,
+        metrics_min=metrics_min,
+        metrics_tolerance=metrics_tolerance,
+        metrics_weights=metrics_weights
+    )
+    for entry in ranking[:10]:
+        print(f"::debug::Run '{entry['run_id']}': passed={entry['passed']}, score={entry['score']:.6f}, failed metrics={entry['failed_metrics']}")
+    if not passed:
+        metric_name = ranking[0]["failed_metrics"][0]
+        print(f"::error::New model does not perform better than production model for metric '{metric_name}'")
+        raise AMLModelPerformanceException(f"New model does not perform better than production model for metric '{metric_name}'")
+
+    # Selecting best candidate
+    selected_run_id = ranking[0]["run_id"]
+    if selected_run_id == run.id:
+        return run
+    from azureml.core import Run
+
+    print(f"::debug::Selected run '{selected_run_id}' of the hyperparameter tuning run")
+    return call_with_retries(
+        Run,
+        experiment=sweep_run.experiment,
+        run_id=selected_run_id,
+        operation="Loading run"
+    )
 
 
 def mask_parameter(parameter):
     print(f"::add-mask::{parameter}")
 
 
-def validate_json(data, schema, input_name):
+def get_validator(schema):
+    # Compiling validators once per schema object, the schema is kept in the cache so that its id cannot be reused
+    cached = _validators.get(id(schema), None)
+    if cached is not None and cached[0] is schema:
+        return cached[1], cached[2]
     validator = jsonschema.Draft7Validator(schema)
-    errors = list(validator.iter_errors(data))
+    try:
+        import fastjsonschema
+        fast_validate = fastjsonschema.compile(schema)
+    except ImportError:
+        fast_validate = None
+    except Exception as exception:
+        print(f"::debug::Could not compile schema with fastjsonschema. Using jsonschema instead: {exception}")
+        fast_validate = None
+    _validators[id(schema)] = (schema, validator, fast_validate)
+    return validator, fast_validate
+
+
+def is_valid_fast(fast_validate, data):
+    try:
+        fast_validate(data)
+    except Exception:
+        return False
+    return True
+
+
+@traced("validate_json")
+def validate_json(data, schema, input_name, fail_fast=False):
+    validator, fast_validate = get_validator(schema)
+
+    # Checking valid objects with the compiled validator first, errors are always reported by jsonschema
+    if fast_validate is not None and is_valid_fast(fast_validate=fast_validate, data=data):
+        errors = []
+    else:
+        errors = validator.iter_errors(data)
+        errors = list(itertools.islice(errors, 1) if fail_fast else errors)
     if len(errors) > 0:
         for error in errors:
             print(f"::error::JSON validation error: {error}")
@@ -140,6 +478,161 @@ def validate_json(data, schema, input_name):
         print(f"::debug::JSON validation passed for '{input_name}'. Provided object does match schema.")
 
 
+def read_ignore_file_entries(directory, ignore_files):
+    entries = []
+    for ignore_file in ignore_files:
+        try:
+            with open(os.path.join(directory, ignore_file)) as f:
+                lines = f.read().splitlines()
+        except (FileNotFoundError, IsADirectoryError, PermissionError):
+            continue
+        for line in lines:
+            line = line.strip()
+            # Negations cannot be honoured when pruning directories and are therefore skipped
+            if not line or line.startswith("#") or line.startswith("!"):
+                continue
+            entries.append(line.strip("/"))
+    return entries
+
+
+@traced("find_model_file")
+def find_model_file(directory, file_name, exclude_patterns=(".git",), ignore_files=(".amlignore",), index_file=None):
+    # If several files match, the shallowest one wins and ties are broken by comparing the relative paths component by component
+    patterns = list(exclude_patterns) + read_ignore_file_entries(directory=directory, ignore_files=ignore_files)
+
+    def is_excluded(relative_path):
+        name = os.path.basename(relative_path)
+        return any(fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern) for pattern in patterns)
+
+    # Searching prebuilt path index (one path relative to the directory per line, e.g. output of `git ls-files`)
+    if index_file is not None:
+        print(f"::debug::Searching model file '{file_name}' in path index '{index_file}'")
+        try:
+            with open(index_file) as f:
+                candidates = [splitall(os.path.normpath(line.strip())) for line in f if line.strip()]
+        except FileNotFoundError:
+            print(f"::warning::Could not find path index '{index_file}'. Falling back to scanning the file system.")
+            candidates = []
+        candidates = [
+            parts for parts in candidates
+            if parts[-1] == file_name and not any(is_excluded(os.path.join(*parts[:i + 1])) for i in range(len(parts) - 1))
+        ]
+        if len(candidates) > 0:
+            model_path = os.path.join(directory, *min(candidates, key=lambda parts: (len(parts), parts)))
+            if os.path.isfile(model_path):
+                return model_path
+            print(f"::warning::Path index '{index_file}' is outdated. Falling back to scanning the file system.")
+
+    # Scanning file system breadth first with entries in sorted order, so that the first match is the selected one
+    print(f"::debug::Searching model file '{file_name}' in '{directory}'")
+    level = [""]
+    while level:
+        next_level = []
+        for relative_directory in level:
+            try:
+                with os.scandir(os.path.join(directory, relative_directory)) as iterator:
+                    entries = sorted(iterator, key=lambda entry: entry.name)
+            except (FileNotFoundError, NotADirectoryError, PermissionError):
+                continue
+            for entry in entries:
+                relative_path = os.path.join(relative_directory, entry.name)
+                if entry.is_dir(follow_symlinks=False):
+                    if not is_excluded(relative_path):
+                        next_level.append(relative_path)
+                elif entry.name == file_name and entry.is_file():
+                    return entry.path
+        level = next_level
+
+    print(f"::error::Could not find a model file with the name '{file_name}' in '{directory}'. Please provide the correct 'model_file_name' and make sure that the file is not placed in an excluded directory.")
+    raise AMLConfigurationException(f"Could not find a model file with the name '{file_name}' in '{directory}'. Please provide the correct 'model_file_name' and make sure that the file is not placed in an excluded directory.")
+
+
+@traced("get_run_artifact_index")
+def get_run_artifact_index(run, index_cache=None):
+    # Listing the artifacts of a run once and indexing them by file name, directory name and sorted path
+    if index_cache is not None and run.id in index_cache:
+        return index_cache[run.id]
+    print(f"::debug::Indexing artifacts of run '{run.id}'")
+    paths = sorted(call_with_retries(run.get_file_names, operation="Listing run artifacts"))
+    file_names = {}
+    directory_names = {}
+    for path in paths:
+        parts = path.split("/")
+        file_names.setdefault(parts[-1], []).append(path)
+        for i in range(len(parts) - 1):
+            directory_names.setdefault(parts[i], set()).add("/".join(parts[:i + 1]))
+    index = {"paths": paths, "file_names": file_names, "directory_names": directory_names}
+    if index_cache is not None:
+        index_cache[run.id] = index
+    return index
+
+
+def artifact_path_exists(index, path):
+    # Checking for a file or a directory prefix with a binary search in the sorted paths
+    path = "/".join(splitall(os.path.normpath(path)))
+    position = bisect.bisect_left(index["paths"], path)
+    if position < len(index["paths"]) and index["paths"][position] == path:
+        return True
+    position = bisect.bisect_left(index["paths"], f"{path}/")
+    return position < len(index["paths"]) and index["paths"][position].startswith(f"{path}/")
+
+
+def find_run_artifact(index, file_name):
+    # If several artifacts match, the shallowest one wins and ties are broken by comparing the paths
+    def select(candidates):
+        return min(candidates, key=lambda path: (path.count("/"), path))
+
+    # Searching exact file names, file name patterns and directory names
+    if len(splitall(file_name)) > 1:
+        if artifact_path_exists(index=index, path=file_name):
+            return file_name
+    elif file_name in index["file_names"]:
+        return select(index["file_names"][file_name])
+    elif any(character in file_name for character in "*?["):
+        candidates = [path for name in fnmatch.filter(index["file_names"].keys(), file_name) for path in index["file_names"][name]]
+        if len(candidates) > 0:
+            return select(candidates)
+    elif file_name in index["directory_names"]:
+        return select(index["directory_names"][file_name])
+    else:
+        # Falling back to substring matches of file names for compatibility with earlier versions
+        candidates = [path for name, paths in index["file_names"].items() if file_name in name for path in paths]
+        if len(candidates) > 0:
+            model_path = select(candidates)
+            print(f"::warning::Found no artifact with the exact name '{file_name}'. Using '{model_path}' instead. Please provide the exact file name with the 'model_file_name' parameter.")
+            return model_path
+
+    print(f"::error::Could not find an artifact with the name '{file_name}' in the run. Please provide the correct 'model_file_name' and make sure that the model was saved as output of the run.")
+    raise AMLConfigurationException(f"Could not find an artifact with the name '{file_name}' in the run. Please provide the correct 'model_file_name' and make sure that the model was saved as output of the run.")
+
+
+@traced("hash_model_path")
+def hash_model_path(model_path, chunk_size=8 * 1024 * 1024, use_mmap=False):
+    # Hashing relative path, size and content of every file in sorted order, so that the hash does not depend on the location of the model
+    if os.path.isdir(model_path):
+        relative_paths = []
+        for root, dirs, files in os.walk(model_path):
+            for file_name in files:
+                relative_paths.append(os.path.relpath(os.path.join(root, file_name), model_path))
+        file_paths = [(os.path.join(model_path, relative_path), "/".join(splitall(relative_path))) for relative_path in sorted(relative_paths, key=splitall)]
+    else:
+        file_paths = [(model_path, os.path.basename(model_path))]
+
+    sha256 = hashlib.sha256()
+    for file_path, relative_path in file_paths:
+        file_size = os.path.getsize(file_path)
+        sha256.update(relative_path.encode("utf-8") + b"\0" + file_size.to_bytes(8, "big"))
+        with open(file_path, "rb") as f:
+            if use_mmap and file_size > 0:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                    for offset in range(0, file_size, chunk_size):
+                        sha256.update(mapped_file[offset:offset + chunk_size])
+            else:
+                for chunk in iter(lambda: f.read(chunk_size), b""):
+                    sha256.update(chunk)
+    return sha256.hexdigest()
+
+
 def splitall(path):
     allparts = []
     while 1:
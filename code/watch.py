@@ -0,0 +1,146 @@
+import time
+
+from utils import AMLModelPerformanceException
+from tracing import start_trace
+from workspace_cache import locked_cache
+
+
+FINISHED_RUN_STATES = ["Completed", "Failed", "Canceled"]
+
+
+class PollInterval():
+    # Polling often while runs complete and backing off while the experiment is idle
+    def __init__(self, minimum=30.0, maximum=600.0, factor=2.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.seconds = minimum
+
+    def update(self, new_runs, pending_runs):
+        if new_runs > 0:
+            self.seconds = self.minimum
+        else:
+            # Runs in progress complete eventually, so that the interval grows less while the experiment has any
+            limit = self.maximum if pending_runs == 0 else max(self.minimum, self.maximum / 4)
+            self.seconds = min(self.seconds * self.factor, limit)
+        return self.seconds
+
+
+def get_checkpoint_key(experiment, pipeline_child_run_name=None):
+    workspace = experiment.workspace
+    key_parts = [
+        getattr(workspace, "subscription_id", ""),
+        getattr(workspace, "resource_group", ""),
+        getattr(workspace, "name", ""),
+        experiment.name,
+        pipeline_child_run_name or ""
+    ]
+    return "/".join(str(key_part) for key_part in key_parts)
+
+
+def get_run_created_on(run):
+    from dateutil.parser import isoparse
+
+    created_utc = run._run_dto.get("created_utc", None)
+    if isinstance(created_utc, str):
+        created_utc = isoparse(created_utc)
+    return created_utc.timestamp()
+
+
+def is_processed(state, max_attempts):
+    return state is not None and (state["status"] != "failed" or state.get("attempts", 0) >= max_attempts)
+
+
+def process_run(run, handler, attempts=0):
+    print(f"::debug::Registering the models of run '{run.id}'")
+    try:
+        models = handler(run)
+    except AMLModelPerformanceException as exception:
+        print(f"::debug::Models of run '{run.id}' were not registered: {exception}")
+        return {"status": "rejected", "error": str(exception)}
+    except Exception as exception:
+        print(f"::error::Models of run '{run.id}' could not be registered: {exception}")
+        return {"status": "failed", "error": str(exception), "attempts": attempts + 1}
+    print(f"::debug::Registered {len(models)} models of run '{run.id}'")
+    return {"status": "registered", "models": models}
+
+
+def poll_experiment(experiment, checkpoint_file, key, handler, max_attempts=3):
+    with locked_cache(checkpoint_file) as checkpoint:
+        entry = checkpoint.get(key, None)
+    first_poll = entry is None
+    created_after = entry["created_after"] if entry is not None else None
+    states = dict(entry["runs"]) if entry is not None else {}
+
+    # Listing the runs from the newest to the oldest, until the first run that was created before the checkpoint
+    finished_runs = []
+    pending = []
+    newest = created_after
+    for run in experiment.get_runs(include_children=False):
+        created_on = get_run_created_on(run)
+        if created_after is not None and created_on < created_after:
+            break
+        newest = created_on if newest is None else max(newest, created_on)
+        if is_processed(states.get(run.id, None), max_attempts):
+            continue
+        if run.status in FINISHED_RUN_STATES:
+            finished_runs.append((run, created_on))
+        else:
+            pending.append(created_on)
+
+    # Recording every run as soon as it was processed, so that a restarted watcher does not register it again
+    new_runs = 0
+    for run, created_on in reversed(finished_runs):
+        if first_poll:
+            state = {"status": "skipped", "error": "Run completed before the watcher started"}
+        elif run.status != "Completed":
+            state = {"status": "skipped", "error": f"Run {run.status.lower()}"}
+        else:
+            state = process_run(
+                run=run,
+                handler=handler,
+                attempts=states.get(run.id, {}).get("attempts", 0)
+            )
+            new_runs += 1
+        states[run.id] = dict(state, created_on=created_on)
+        with locked_cache(checkpoint_file) as checkpoint:
+            checkpoint.setdefault(key, {"created_after": created_after, "runs": {}})["runs"][run.id] = states[run.id]
+
+    # Moving the checkpoint to the oldest run that is still in progress or is retried, and forgetting the runs before it
+    pending += [state["created_on"] for state in states.values() if not is_processed(state, max_attempts)]
+    created_after = min(pending) if len(pending) > 0 else newest
+    with locked_cache(checkpoint_file) as checkpoint:
+        checkpoint[key] = {
+            "created_after": created_after,
+            "runs": {run_id: state for run_id, state in states.items() if created_after is None or state["created_on"] >= created_after}
+        }
+    print(f"::debug::Processed {len(finished_runs)} finished runs of experiment '{experiment.name}', {len(pending)} runs are in progress or retried")
+    return new_runs, len(pending)
+
+
+def watch_experiment(experiment, checkpoint_file, key, handler, poll_interval, duration=None, max_attempts=3, sleep=time.sleep):
+    # Polling until the duration has passed, a duration of 0 polls once
+    started_on = time.time()
+    while True:
+        start_trace(name="watch")
+        try:
+            new_runs, pending_runs = poll_experiment(
+                experiment=experiment,
+                checkpoint_file=checkpoint_file,
+                key=key,
+                handler=handler,
+                max_attempts=max_attempts
+            )
+        except Exception as exception:
+            if duration == 0:
+                raise
+            print(f"::warning::Polling experiment '{experiment.name}' failed: {exception}")
+            new_runs, pending_runs = 0, 0
+        seconds = poll_interval.update(
+            new_runs=new_runs,
+            pending_runs=pending_runs
+        )
+        if duration is not None and time.time() + seconds - started_on > duration:
+            return
+        print(f"::debug::Polling experiment '{experiment.name}' again in {seconds:.0f} seconds")
+        sleep(seconds)
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import base64
+import hashlib
+
+from contextlib import contextmanager
+
+
+TOKEN_FIELDS = ["_cached_arm_token", "_cached_graph_token", "_cached_azureml_client_token"]
+TOKEN_EXPIRY_MARGIN = 5 * 60
+
+
+@contextmanager
+def locked_cache(cache_file):
+    # Holding an exclusive lock on a separate lock file, so that concurrent jobs on the same runner do not overwrite each other
+    import fcntl
+
+    os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+    with open(f"{cache_file}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            try:
+                with open(cache_file) as f:
+                    cache = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                cache = {}
+            entries = json.dumps(cache, sort_keys=True)
+            yield cache
+            if json.dumps(cache, sort_keys=True) != entries:
+                temporary_file = f"{cache_file}.{os.getpid()}.tmp"
+                with open(os.open(temporary_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+                    json.dump(cache, f)
+                os.replace(temporary_file, cache_file)
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def get_token_expiry(token):
+    # Reading the expiry time from the payload of the JWT without verifying it
+    try:
+        payload = token.split(".")[1]
+        payload += "=" * (-len(payload) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(payload)).get("exp", 0))
+    except (AttributeError, IndexError, TypeError, ValueError):
+        return 0
+
+
+def get_cache_key(azure_credentials, cloud, config_file_path, config_file_name):
+    # Identifying the workspace by the content of the workspace configuration file
+    workspace_config = None
+    for directory in [".azureml", "aml_config", ""]:
+        try:
+            with open(os.path.join(config_file_path, directory, config_file_name)) as f:
+                workspace_config = json.load(f)
+            break
+        except (FileNotFoundError, NotADirectoryError, json.JSONDecodeError):
+            continue
+    if not isinstance(workspace_config, dict):
+        return None
+    key_parts = [
+        azure_credentials.get("tenantId", ""),
+        azure_credentials.get("clientId", ""),
+        hashlib.sha256(azure_credentials.get("clientSecret", "").encode("utf-8")).hexdigest(),
+        cloud,
+        workspace_config.get("subscription_id", ""),
+        workspace_config.get("resource_group", ""),
+        workspace_config.get("workspace_name", "")
+    ]
+    return hashlib.sha256("|".join(key_parts).encode("utf-8")).hexdigest()
+
+
+def load_cached_workspace(cache_file, key, auth):
+    from azureml.core import Workspace
+
+    with locked_cache(cache_file) as cache:
+        entry = cache.get(key, None)
+        if entry is None:
+            return None
+        if entry.get("expires_on", 0) <= time.time():
+            print("::debug::Cached workspace entry expired")
+            del cache[key]
+            return None
+
+    # Restoring tokens and workspace without calling the service
+    for field, token in entry.get("tokens", {}).items():
+        if field in TOKEN_FIELDS:
+            setattr(auth, field, token)
+    details = entry["workspace"]
+    workspace = Workspace(
+        subscription_id=details["subscription_id"],
+        resource_group=details["resource_group"],
+        workspace_name=details["workspace_name"],
+        auth=auth,
+        _location=details["location"],
+        _disable_service_check=True,
+        _workspace_id=details["workspace_id"]
+    )
+    workspace._discovery_url_internal = details["discovery_url"]
+    return workspace
+
+
+def save_workspace_cache(cache_file, key, workspace, auth):
+    tokens = {}
+    for field in TOKEN_FIELDS:
+        token = getattr(auth, field, None)
+        if token:
+            tokens[field] = token
+    if len(tokens) < 1:
+        return
+    expires_on = min(get_token_expiry(token) for token in tokens.values()) - TOKEN_EXPIRY_MARGIN
+    if expires_on <= time.time():
+        return
+    with locked_cache(cache_file) as cache:
+        # Dropping expired entries of other workspaces
+        for other_key in [other_key for other_key, entry in cache.items() if entry.get("expires_on", 0) <= time.time()]:
+            del cache[other_key]
+        cache[key] = {
+            "expires_on": expires_on,
+            "tokens": tokens,
+            "workspace": {
+                "subscription_id": workspace.subscription_id,
+                "resource_group": workspace.resource_group,
+                "workspace_name": workspace.name,
+                "location": workspace.location,
+                "workspace_id": workspace._workspace_id,
+                "discovery_url": workspace.discovery_url
+            }
+        }
+
+
+def invalidate_workspace_cache(cache_file, key):
+    with locked_cache(cache_file) as cache:
+        cache.pop(key, None)
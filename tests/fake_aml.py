@@ -0,0 +1,246 @@
+import time
+import datetime
+import threading
+import azureml.core
+import azureml.core.authentication
+
+from types import SimpleNamespace
+from collections import Counter
+from azureml.exceptions import WebserviceException
+
+# Keeping the path validation of the AML SDK for the fake local registrations
+validate_model_path = azureml.core.Model._validate_model_path
+
+
+class FakeBackend():
+    # In-process stand-in for the AML services with configurable latency per request
+    def __init__(self, latency=0.0, page_size=50, name="workspace"):
+        self.latency = latency
+        self.page_size = page_size
+        self.calls = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+        self.runs = {}
+        self.models = []
+        self.datasets = {}
+        self.workspace = SimpleNamespace(name=name, subscription_id="subscription", resource_group="resource-group")
+        self.experiment = FakeExperiment(backend=self, name="experiment", workspace=self.workspace)
+        self.created_on = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+
+    def call(self, name):
+        with self.lock:
+            self.calls[name] += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        if self.latency > 0:
+            time.sleep(self.latency)
+        with self.lock:
+            self.in_flight -= 1
+
+    def add_run(self, run_id, **kwargs):
+        # Every run is created one minute after the previous run
+        self.created_on += datetime.timedelta(minutes=1)
+        run = FakeRun(backend=self, run_id=run_id, created_utc=self.created_on.isoformat().replace("+00:00", "Z"), **kwargs)
+        self.runs[run_id] = run
+        if run.parent is not None:
+            run.parent.children.append(run)
+        return run
+
+    def get_run(self, experiment=None, run_id=None):
+        self.call("get_run")
+        return self.runs[run_id]
+
+    def create_sweep_run(self, run_id, parent=None, children=10, metrics_per_run=5, file_count=10, primary_metric="metric_0"):
+        # Children log increasing metric values, so that the last child is the best run
+        sweep_run = self.add_run(run_id, run_type="hyperdrive", parent=parent)
+        for i in range(children):
+            self.add_run(
+                f"{run_id}_{i}",
+                parent=sweep_run,
+                metrics={f"metric_{j}": (i + 1) / children for j in range(metrics_per_run)},
+                file_names=[f"outputs/checkpoints/step_{k}.pt" for k in range(file_count)] + ["outputs/model.pkl", "outputs/model.pkl.bak"]
+            )
+        if children > 0:
+            sweep_run.metrics["best_child_by_primary_metric"] = {
+                "run_id": [f"{run_id}_{children - 1}"],
+                "metric_value": [1.0],
+                "final": [True]
+            }
+        return sweep_run
+
+    def create_pipeline_run(self, run_id, step_names=("model_training",), children=10, metrics_per_run=5, file_count=10):
+        # Every step contains a hyperparameter tuning run
+        pipeline_run = self.add_run(run_id, run_type="azureml.PipelineRun")
+        for step_name in step_names:
+            step_run = self.add_run(f"{run_id}_{step_name}", name=step_name, parent=pipeline_run)
+            self.create_sweep_run(
+                f"{run_id}_{step_name}_hd",
+                parent=step_run,
+                children=children,
+                metrics_per_run=metrics_per_run,
+                file_count=file_count
+            )
+        return pipeline_run
+
+    def create_datasets(self, count):
+        names = [f"dataset_{i}" for i in range(count)]
+        for name in names:
+            self.datasets[name] = SimpleNamespace(name=name, version=1)
+        return names
+
+    def get_dataset(self, workspace, name, version="latest"):
+        self.call("get_dataset")
+        if name not in self.datasets:
+            raise Exception(f"Dataset '{name}' not found")
+        return self.datasets[name]
+
+    def register_model(self, model_name, model_path, run=None, properties=None, **kwargs):
+        self.call("register_model")
+        with self.lock:
+            version = len([model for model in self.models if model.name == model_name]) + 1
+            model = FakeModel.create(name=model_name, version=version, properties=properties, run=run, model_path=model_path, **kwargs)
+            self.models.append(model)
+        return model
+
+    def install(self, monkeypatch):
+        return install_backends(monkeypatch, {None: self})[None]
+
+
+def install_backends(monkeypatch, backends):
+    # Workspaces are loaded by the name of their configuration file, a single backend is used for every configuration file
+    by_workspace = {id(backend.workspace): backend for backend in backends.values()}
+
+    def get_backend(workspace):
+        return by_workspace[id(workspace)]
+
+    def from_config(path, _file_name, auth):
+        return backends[_file_name if len(backends) > 1 else None].workspace
+
+    class Model(FakeModel):
+        def __init__(self, workspace=None, name=None, version=None):
+            backend = get_backend(workspace)
+            backend.call("get_model")
+            versions = [model for model in backend.models if model.name == name and version in [None, model.version]]
+            if len(versions) < 1:
+                raise WebserviceException(f"Model '{name}' not found")
+            self.__dict__.update(versions[-1].__dict__)
+
+        @staticmethod
+        def list(workspace, name=None, tags=None, properties=None, expand=True, **kwargs):
+            # Tags and properties are filtered by the service, unexpanded models only reference their run
+            backend = get_backend(workspace)
+            backend.call("list_models")
+            models = [
+                model for model in backend.models
+                if name in [None, model.name] and matches(model.tags, tags) and matches(model.properties, properties)
+            ]
+            return models if expand else [model.copy(run=None) for model in models]
+
+        @staticmethod
+        def register(workspace, model_path, model_name, **kwargs):
+            validate_model_path(model_path)
+            return get_backend(workspace).register_model(model_name=model_name, model_path=model_path, **kwargs)
+
+    monkeypatch.setattr(azureml.core.authentication, "ServicePrincipalAuthentication", lambda **kwargs: None)
+    monkeypatch.setattr(azureml.core, "Workspace", SimpleNamespace(from_config=from_config))
+    monkeypatch.setattr(azureml.core, "Experiment", lambda workspace, name: get_backend(workspace).experiment)
+    monkeypatch.setattr(azureml.core, "Run", lambda experiment=None, run_id=None: get_backend(experiment.workspace).get_run(experiment=experiment, run_id=run_id))
+    monkeypatch.setattr(azureml.core, "Model", Model)
+    monkeypatch.setattr(azureml.core, "Dataset", SimpleNamespace(get_by_name=lambda workspace, name, version="latest": get_backend(workspace).get_dataset(workspace=workspace, name=name, version=version)))
+    return backends
+
+
+def matches(values, query):
+    for entry in query or []:
+        key, value = entry if isinstance(entry, list) else (entry, None)
+        if key not in (values or {}) or value not in [None, values[key]]:
+            return False
+    return True
+
+
+class FakeModel():
+    class Framework():
+        SCIKITLEARN = "ScikitLearn"
+        ONNX = "Onnx"
+        TENSORFLOW = "TensorFlow"
+        TFKERAS = "TfKeras"
+        CUSTOM = "Custom"
+
+    @classmethod
+    def create(cls, name, version, properties=None, run=None, model_path=None, **kwargs):
+        model = cls.__new__(cls)
+        model.name = name
+        model.version = version
+        model.id = f"{name}:{version}"
+        model.properties = properties
+        model.run = run
+        model.model_path = model_path
+        model.tags = kwargs.get("tags", None)
+        model.run_id = run.id if run is not None else None
+        model.experiment_name = run.experiment.name if run is not None else None
+        return model
+
+    def copy(self, **kwargs):
+        model = self.__class__.__new__(self.__class__)
+        model.__dict__.update(self.__dict__, **kwargs)
+        return model
+
+
+class FakeExperiment():
+    def __init__(self, backend, name, workspace):
+        self.backend = backend
+        self.name = name
+        self.workspace = workspace
+
+    def get_runs(self, type=None, tags=None, properties=None, include_children=False):
+        # Runs are returned lazily from the newest to the oldest, one request per page
+        runs = [run for run in self.backend.runs.values() if include_children or run.parent is None]
+        runs.sort(key=lambda run: run._run_dto["created_utc"], reverse=True)
+        for i in range(0, len(runs), self.backend.page_size):
+            self.backend.call("get_runs")
+            for run in runs[i:i + self.backend.page_size]:
+                yield run
+
+
+class FakeRun():
+    def __init__(self, backend, run_id, run_type="azureml.scriptrun", name=None, parent=None, metrics=None, file_names=None, status="Completed", created_utc=None):
+        self.backend = backend
+        self.id = run_id
+        self.type = run_type
+        self.status = status
+        self.parent = parent
+        self.experiment = backend.experiment
+        self.metrics = metrics if metrics is not None else {}
+        self.file_names = file_names if file_names is not None else []
+        self.children = []
+        self._run_dto = {"name": name, "parent_run_id": parent.id if parent is not None else None, "created_utc": created_utc}
+
+    def get_children(self, recursive=False, tags=None, properties=None, type=None, status=None, _rehydrate_runs=True):
+        # Children are returned lazily, one request per page
+        children = [child for child in self.children if type in [None, child.type] and status in [None, child.status]]
+        for i in range(0, len(children), self.backend.page_size):
+            self.backend.call("get_children")
+            for child in children[i:i + self.backend.page_size]:
+                yield child
+
+    def get_metrics(self, name=None, recursive=False, run_type=None, populate=False):
+        self.backend.call("get_metrics")
+        runs = [self] + (self.get_descendants() if recursive else [])
+        metrics = {run.id: {key: value for key, value in run.metrics.items() if name in [None, key]} for run in runs}
+        return metrics if recursive else metrics[self.id]
+
+    def get_descendants(self):
+        descendants = []
+        for child in self.children:
+            descendants += [child] + child.get_descendants()
+        return descendants
+
+    def get_file_names(self):
+        self.backend.call("get_file_names")
+        return list(self.file_names)
+
+    def register_model(self, model_name, model_path, **kwargs):
+        if model_path not in self.file_names and not any(file_name.startswith(f"{model_path}/") for file_name in self.file_names):
+            raise WebserviceException(f"Model path '{model_path}' not found in run '{self.id}'")
+        return self.backend.register_model(model_name=model_name, model_path=model_path, run=self, **kwargs)
@@ -0,0 +1,83 @@
+import os
+import io
+import sys
+import gzip
+import tarfile
+import pytest
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from archive import ParallelGzipWriter, package_model
+from utils import AMLConfigurationException
+
+
+def create_model_directory(tmp_path):
+    model_directory = tmp_path / "model"
+    (model_directory / "assets").mkdir(parents=True)
+    (model_directory / "weights.bin").write_bytes(os.urandom(100000) + b"\0" * 100000)
+    (model_directory / "assets" / "vocabulary.txt").write_text("token\n" * 10000)
+    (model_directory / "config.json").write_text("{}")
+    return model_directory
+
+
+def read_archive(archive_file):
+    with tarfile.open(fileobj=archive_file, mode="r|") as tar:
+        return {member.name: tar.extractfile(member).read() for member in tar if member.isfile()}
+
+
+def test_parallel_gzip_writer_members():
+    """
+    Unit test to check that chunks compressed in parallel form a valid gzip file
+    """
+    data = os.urandom(50000) + b"model" * 20000
+    output = io.BytesIO()
+    writer = ParallelGzipWriter(output, level=1, max_workers=3, chunk_size=1000)
+    for i in range(0, len(data), 777):
+        writer.write(data[i:i + 777])
+    writer.close()
+    assert gzip.decompress(output.getvalue()) == data
+
+
+def test_package_model_gzip(tmp_path):
+    """
+    Unit test to check that a model directory is packaged into a gzip compressed tar archive with metadata
+    """
+    model_directory = create_model_directory(tmp_path)
+    (tmp_path / "output").mkdir()
+    archive_path, package_properties = package_model(
+        model_path=str(model_directory),
+        output_directory=str(tmp_path / "output")
+    )
+    assert archive_path == str(tmp_path / "output" / "model.tar.gz")
+    with gzip.open(archive_path) as f:
+        files = read_archive(f)
+    assert files["model/weights.bin"] == (model_directory / "weights.bin").read_bytes()
+    assert files["model/assets/vocabulary.txt"] == (model_directory / "assets" / "vocabulary.txt").read_bytes()
+    assert package_properties["package_format"] == "tar.gz"
+    assert package_properties["package_files"] == "3"
+    assert package_properties["package_source_bytes"] == str(200000 + 60000 + 2)
+    assert package_properties["package_bytes"] == str(os.path.getsize(archive_path))
+    assert all(isinstance(value, str) for value in package_properties.values())
+    with pytest.raises(AMLConfigurationException):
+        assert package_model(model_path=str(model_directory), output_directory=str(tmp_path / "output"), level=19)
+
+
+def test_package_model_zstd(tmp_path):
+    """
+    Unit test to check that a model directory is packaged into a zstd compressed tar archive
+    """
+    zstandard = pytest.importorskip("zstandard")
+    model_directory = create_model_directory(tmp_path)
+    archive_path, package_properties = package_model(
+        model_path=str(model_directory),
+        output_directory=str(tmp_path),
+        compression="zstd",
+        level=10,
+        max_workers=2
+    )
+    with open(archive_path, "rb") as f:
+        files = read_archive(zstandard.ZstdDecompressor().stream_reader(f))
+    assert files["model/config.json"] == b"{}"
+    assert package_properties["package_format"] == "tar.zst"
+    assert package_properties["package_compression_level"] == "10"
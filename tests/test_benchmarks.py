@@ -0,0 +1,264 @@
+import os
+import sys
+import pytest
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+pytest.importorskip("pytest_benchmark")
+
+import json
+
+import shutil
+import tempfile
+import threading
+import jsonschema
+
+from main import main
+from schemas import parameters_schema
+from utils import validate_json, find_model_file, get_best_run, get_datasets, compare_metrics, get_baseline_key, get_run_artifact_index, find_run_artifact
+from evaluation import evaluate_candidates
+from fake_aml import FakeBackend
+from test_upload import BlobStorageServer, BlobStorageHandler
+from archive import package_model
+from upload import upload_files_to_blobs
+
+
+def walk_model_file(directory, file_name):
+    # Previous implementation of the model file search in main()
+    model_paths = []
+    for root, dirs, files in os.walk(directory):
+        for filename in files:
+            if filename == file_name:
+                model_paths.append(os.path.join(root, filename))
+    return model_paths[0]
+
+
+@pytest.fixture(scope="module")
+def repository(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("repository")
+    for name in [".git", "node_modules", "data"]:
+        for i in range(50):
+            subdirectory = directory / name / f"dir{i}"
+            subdirectory.mkdir(parents=True)
+            for j in range(40):
+                (subdirectory / f"file{j}.txt").write_text("")
+    (directory / "outputs").mkdir()
+    (directory / "outputs" / "model.pkl").write_text("model")
+    (directory / ".amlignore").write_text("node_modules/\ndata/\n")
+    return str(directory)
+
+
+def test_benchmark_walk_model_file(benchmark, repository):
+    """
+    Benchmark of the previous os.walk based model file search
+    """
+    model_path = benchmark(walk_model_file, repository, "model.pkl")
+    assert os.path.basename(model_path) == "model.pkl"
+
+
+def test_benchmark_find_model_file(benchmark, repository):
+    """
+    Benchmark of the model file search with excluded directories
+    """
+    model_path = benchmark(find_model_file, repository, "model.pkl")
+    assert model_path == os.path.join(repository, "outputs", "model.pkl")
+
+
+def test_benchmark_evaluate_candidates(benchmark):
+    """
+    Benchmark of the evaluation of thousands of candidate runs against several production models
+    """
+    metrics_max = [f"max_metric_{i}" for i in range(10)]
+    metrics_min = [f"min_metric_{i}" for i in range(10)]
+    candidate_metrics = {
+        f"run-{i}": {name: (i % 97) / 97.0 for name in metrics_max + metrics_min}
+        for i in range(5000)
+    }
+    baseline_metrics = [{name: 0.5 for name in metrics_max + metrics_min} for i in range(5)]
+    ranking, passed = benchmark(evaluate_candidates, candidate_metrics, baseline_metrics, metrics_max, metrics_min)
+    assert len(ranking) == 5000
+
+
+def validate_json_uncached(data, schema, input_name):
+    # Previous implementation of validate_json, that created a validator per call
+    validator = jsonschema.Draft7Validator(schema)
+    errors = list(validator.iter_errors(data))
+    if len(errors) > 0:
+        raise Exception(f"JSON validation error for '{input_name}'")
+
+
+@pytest.fixture(scope="module")
+def model_specs():
+    return [
+        {
+            "model_name": f"model-{i}",
+            "model_file_name": "model.pkl",
+            "model_framework": "scikitlearn",
+            "model_tags": {"index": str(i)},
+            "metrics_max": ["accuracy"],
+            "metrics_min": ["loss"],
+            "datasets": [f"dataset_{i}"],
+            "cpu_cores": 1,
+            "memory_gb": 2
+        }
+        for i in range(500)
+    ]
+
+
+@pytest.mark.parametrize("implementation", ["uncached", "cached"])
+def test_benchmark_validate_json(benchmark, model_specs, implementation, capsys):
+    """
+    Benchmark of the validation of a large list of model specifications
+    """
+    validate = validate_json_uncached if implementation == "uncached" else validate_json
+
+    def validate_all():
+        for model_spec in model_specs:
+            validate(data=model_spec, schema=parameters_schema, input_name="PARAMETERS_FILE")
+
+    benchmark(validate_all)
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    # Latency per request of the fake AML backend in seconds, e.g. AML_BENCHMARK_LATENCY=0.05 to simulate remote calls
+    return FakeBackend(latency=float(os.environ.get("AML_BENCHMARK_LATENCY", "0"))).install(monkeypatch)
+
+
+def test_benchmark_get_best_run(benchmark, backend):
+    """
+    Benchmark of the resolution of the best run of a pipeline with several hyperparameter tuning steps
+    """
+    pipeline_run = backend.create_pipeline_run("pipeline", step_names=[f"step_{i}" for i in range(20)] + ["model_training"], children=500)
+
+    def resolve():
+        run_cache = {}
+        return [get_best_run(experiment=backend.experiment, run=pipeline_run, pipeline_child_run_name=name, run_cache=run_cache) for name in ["step_0", "model_training"]]
+
+    best_runs = benchmark(resolve)
+    assert [best_run.id for best_run in best_runs] == ["pipeline_step_0_hd_499", "pipeline_model_training_hd_499"]
+
+
+def test_benchmark_compare_metrics_sweep(benchmark, backend):
+    """
+    Benchmark of the comparison of all children of a hyperparameter tuning run against several production models
+    """
+    sweep_run = backend.create_sweep_run("hd", children=1000, metrics_per_run=20)
+    baseline_runs = [backend.add_run(f"baseline_{i}", metrics={f"metric_{j}": 0.5 for j in range(20)}) for i in range(3)]
+    production_models = {get_baseline_key("model", count=3): [backend.register_model(model_name="model", model_path="outputs/model.pkl", run=run) for run in baseline_runs]}
+    best_run = benchmark(
+        compare_metrics,
+        workspace=backend.workspace,
+        run=backend.runs["hd_0"],
+        model_name="model",
+        metrics_max=[f"metric_{j}" for j in range(10)],
+        metrics_min=[],
+        production_models=production_models,
+        baseline_versions=3,
+        sweep_run=sweep_run
+    )
+    assert best_run.id == "hd_999"
+
+
+def test_benchmark_get_datasets(benchmark, backend):
+    """
+    Benchmark of the concurrent resolution of datasets
+    """
+    names = backend.create_datasets(50)
+    datasets, failures = benchmark(get_datasets, workspace=backend.workspace, names=names + ["missing"], max_workers=8)
+    assert len(datasets) == 50
+    assert list(failures.keys()) == ["missing"]
+
+
+def test_benchmark_find_run_artifact(benchmark):
+    """
+    Benchmark of the model file lookup in a run with tens of thousands of checkpoint files
+    """
+    backend = FakeBackend()
+    run = backend.add_run("run", file_names=[f"outputs/checkpoints/step_{i}/model.ckpt" for i in range(20000)] + ["outputs/model.pkl"])
+
+    def lookup():
+        index = get_run_artifact_index(run=run)
+        return [find_run_artifact(index=index, file_name=file_name) for file_name in ["model.pkl", "*.pkl", "checkpoints"]]
+
+    assert benchmark(lookup) == ["outputs/model.pkl", "outputs/model.pkl", "outputs/checkpoints"]
+
+
+@pytest.mark.parametrize("execution_mode", ["sequential", "concurrent"])
+def test_benchmark_main_batch_registration(benchmark, backend, tmp_path, monkeypatch, execution_mode):
+    """
+    Benchmark of the registration of a batch of models from a pipeline run end to end in both execution modes
+    """
+    backend.create_pipeline_run("pipeline", step_names=[f"step_{i}" for i in range(5)], children=200, file_count=1000)
+    backend.create_datasets(10)
+    parameters = [
+        {"model_name": f"model-{i}", "pipeline_child_run_name": f"step_{i % 5}", "metrics_max": ["metric_0"], "datasets": [f"dataset_{i % 10}"]}
+        for i in range(20)
+    ]
+    (tmp_path / ".cloud" / ".azure").mkdir(parents=True)
+    (tmp_path / ".cloud" / ".azure" / "parameters.json").write_text(json.dumps(parameters))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("INPUT_AZURE_CREDENTIALS", '{"clientId": "test", "clientSecret": "test", "subscriptionId": "test", "tenantId": "test"}')
+    monkeypatch.setenv("INPUT_PARAMETERS_FILE", "parameters.json")
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+    monkeypatch.setenv("INPUT_MAX_WORKERS", "8")
+    monkeypatch.setenv("INPUT_EXECUTION_MODE", execution_mode)
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(tmp_path))
+    monkeypatch.setenv("GITHUB_REPOSITORY", "owner/repository")
+    monkeypatch.setenv("GITHUB_REF", "refs/heads/master")
+
+    benchmark.pedantic(main, rounds=5, iterations=1)
+    assert len(backend.models) > 0 and len(backend.models) % 20 == 0
+    assert sorted(set(model.run.id for model in backend.models)) == [f"pipeline_step_{i}_hd_199" for i in range(5)]
+
+
+@pytest.fixture(scope="module")
+def model_directory(tmp_path_factory):
+    # Directory model with many small files and compressible weights
+    directory = tmp_path_factory.mktemp("model")
+    for i in range(500):
+        (directory / f"shard_{i}.json").write_text("{\"token\": %d}\n" % i * 50)
+    (directory / "weights.bin").write_bytes(os.urandom(2 * 1024 * 1024) + b"\0" * 6 * 1024 * 1024)
+    return directory
+
+
+@pytest.fixture(scope="module")
+def blob_storage_server():
+    server = BlobStorageServer(("127.0.0.1", 0), BlobStorageHandler)
+    server.lock = threading.Lock()
+    server.blobs = {}
+    server.blocks = {}
+    server.requests = 0
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+def test_benchmark_upload_packaged_model(benchmark, model_directory, blob_storage_server, compression):
+    """
+    Benchmark of the upload of a directory model file by file and as packaged archive, including the packaging
+    """
+    if compression == "zstd":
+        pytest.importorskip("zstandard")
+    url = f"http://127.0.0.1:{blob_storage_server.server_address[1]}/container"
+
+    def upload():
+        output_directory = tempfile.mkdtemp()
+        try:
+            if compression is None:
+                file_paths = sorted(str(path) for path in model_directory.iterdir())
+            else:
+                archive_path, _ = package_model(model_path=str(model_directory), output_directory=output_directory, compression=compression)
+                file_paths = [archive_path]
+            return upload_files_to_blobs(file_urls=[(file_path, f"{url}/{os.path.basename(file_path)}") for file_path in file_paths], max_workers=8)
+        finally:
+            shutil.rmtree(output_directory)
+
+    statistics = benchmark.pedantic(upload, rounds=3, iterations=1)
+    assert statistics["bytes"] > 0
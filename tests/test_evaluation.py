@@ -0,0 +1,80 @@
+import os
+import sys
+import pytest
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from evaluation import evaluate_candidates
+from utils import AMLConfigurationException
+
+
+def test_evaluate_candidates_ranking():
+    """
+    Unit test to check the ranking and decision of the evaluate_candidates function
+    """
+    ranking, passed = evaluate_candidates(
+        candidate_metrics={
+            "run-1": {"accuracy": 0.90, "loss": 0.30},
+            "run-2": {"accuracy": 0.95, "loss": 0.20},
+            "run-3": {"accuracy": 0.99, "loss": 0.50},
+            "run-4": {"loss": 0.10}
+        },
+        baseline_metrics=[
+            {"accuracy": 0.85, "loss": 0.40},
+            {"accuracy": 0.90, "loss": 0.35}
+        ],
+        metrics_max=["accuracy"],
+        metrics_min=["loss"]
+    )
+    assert passed
+    assert [entry["run_id"] for entry in ranking] == ["run-2", "run-1", "run-4", "run-3"]
+    assert [entry["passed"] for entry in ranking] == [True, True, False, False]
+    assert ranking[2]["failed_metrics"] == ["accuracy"]
+    assert ranking[3]["failed_metrics"] == ["loss"]
+
+
+def test_evaluate_candidates_tolerance_and_weights():
+    """
+    Unit test to check the evaluate_candidates function with tolerances and weights
+    """
+    ranking, passed = evaluate_candidates(
+        candidate_metrics={
+            "run-1": {"accuracy": 0.89, "loss": 0.10},
+            "run-2": {"accuracy": 0.95, "loss": 0.30}
+        },
+        baseline_metrics=[{"accuracy": 0.90, "loss": 0.30}],
+        metrics_max=["accuracy"],
+        metrics_min=["loss"],
+        metrics_tolerance={"accuracy": 0.02},
+        metrics_weights={"accuracy": 10.0, "loss": 0.0}
+    )
+    assert passed
+    assert [entry["run_id"] for entry in ranking] == ["run-2", "run-1"]
+
+
+def test_evaluate_candidates_no_candidate_passes():
+    """
+    Unit test to check the evaluate_candidates function if no candidate passes
+    """
+    ranking, passed = evaluate_candidates(
+        candidate_metrics={"run-1": {"accuracy": 0.80}},
+        baseline_metrics=[{"accuracy": 0.90}],
+        metrics_max=["accuracy"],
+        metrics_min=[]
+    )
+    assert not passed
+    assert ranking[0]["failed_metrics"] == ["accuracy"]
+
+
+def test_evaluate_candidates_invalid_metric():
+    """
+    Unit test to check the evaluate_candidates function with non numeric metrics
+    """
+    with pytest.raises(AMLConfigurationException):
+        assert evaluate_candidates(
+            candidate_metrics={"run-1": {"accuracy": {"table": [1, 2]}}},
+            baseline_metrics=[{"accuracy": 0.90}],
+            metrics_max=["accuracy"],
+            metrics_min=[]
+        )
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import pickle
+import pytest
+import numpy
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from utils import AMLConfigurationException, AMLModelPerformanceException
+from inference import check_inference_budgets, get_inference_properties, load_sample, measure_inference, size_resources
+
+
+LINEAR_MODEL = """
+import numpy
+
+
+class LinearModel():
+    def __init__(self, weights):
+        self.weights = numpy.asarray(weights)
+
+    def predict(self, rows):
+        return rows @ self.weights
+"""
+
+
+@pytest.fixture
+def linear_model(tmp_path, monkeypatch):
+    # The benchmark process imports the class of the pickled model from the same paths as the tests
+    (tmp_path / "linear_model.py").write_text(LINEAR_MODEL)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from linear_model import LinearModel
+
+    model_path = tmp_path / "model.pkl"
+    with open(model_path, "wb") as f:
+        pickle.dump(LinearModel(weights=[1.0, 2.0, 3.0]), f)
+    return str(model_path)
+
+
+def test_measure_inference(linear_model):
+    """
+    Unit test to check that the inference benchmark measures latency, throughput, load time, memory and size of a model in a separate process
+    """
+    results = measure_inference(
+        model_path=linear_model,
+        framework="scikitlearn",
+        sample=numpy.ones((100, 3)),
+        batch_size=10,
+        iterations=20
+    )
+    assert 0 < results["latency_p50_ms"] <= results["latency_p99_ms"]
+    assert results["throughput_rows_per_second"] > 0
+    assert results["load_seconds"] > 0
+    assert results["peak_rss_mb"] > 1
+    assert results["model_size_mb"] == os.path.getsize(linear_model) / 1024 ** 2
+    assert set(get_inference_properties(results)) == set(f"inference_{name}" for name in results)
+
+    with pytest.raises(AMLConfigurationException):
+        assert measure_inference(model_path=linear_model, framework="custom", sample=numpy.ones((10, 3)))
+
+
+def test_load_sample(tmp_path):
+    """
+    Unit test to check that sample rows are loaded from .npy, .json and .csv files with and without header
+    """
+    numpy.save(tmp_path / "sample.npy", numpy.ones((5, 3)))
+    (tmp_path / "sample.json").write_text(json.dumps([[1, 2, 3]] * 5))
+    (tmp_path / "sample.csv").write_text("a,b,c\n" + "1,2,3\n" * 5)
+    (tmp_path / "no_header.csv").write_text("1,2,3\n" * 5)
+    for file_name in ["sample.npy", "sample.json", "sample.csv", "no_header.csv"]:
+        assert load_sample(sample_file=str(tmp_path / file_name)).shape == (5, 3)
+    assert load_sample(sample_shape=[3]).shape == (1000, 3)
+    with pytest.raises(AMLConfigurationException):
+        assert load_sample()
+
+
+def test_check_inference_budgets():
+    """
+    Unit test to check that regressions of the inference measurements beyond their budgets fail the registration
+    """
+    baseline_properties = {"inference_latency_p99_ms": "10", "inference_throughput_rows_per_second": "1000"}
+    results = {"latency_p99_ms": 14.0, "throughput_rows_per_second": 800.0, "model_size_mb": 40.0}
+    check_inference_budgets(results=results, baseline_properties=baseline_properties, budgets={"latency_p99_ms": 1.5, "throughput_rows_per_second": 1.3, "model_size_mb": 1.0})
+    with pytest.raises(AMLModelPerformanceException):
+        assert check_inference_budgets(results=results, baseline_properties=baseline_properties, budgets={"latency_p99_ms": 1.2})
+    with pytest.raises(AMLModelPerformanceException):
+        assert check_inference_budgets(results=results, baseline_properties=baseline_properties, budgets={"throughput_rows_per_second": 1.1})
+
+
+def test_size_resources(linear_model):
+    """
+    Unit test to check that the recommended resource configuration is derived from measurements with every thread count
+    """
+    cpu, memory_gb, properties = size_resources(
+        parameters={"model_framework": "scikitlearn", "resource_sizing_threads": [2, 1], "resource_headroom": 0.5, "inference_iterations": 10},
+        model_path=linear_model,
+        sample=load_sample(sample_shape=[3])
+    )
+    measurements = json.loads(properties["resource_sizing_measurements"])
+    assert [measurement["threads"] for measurement in measurements] == [1, 2]
+    assert cpu >= 0.1
+    assert memory_gb >= max(measurement["peak_rss_mb"] for measurement in measurements) / 1024 * 1.5
+    assert properties["resource_recommended_cpu_cores"] == str(cpu)
+    assert properties["resource_recommended_memory_gb"] == str(memory_gb)
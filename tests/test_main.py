@@ -1,12 +1,29 @@
 import os
 import sys
 import pytest
+import asyncio
+import tempfile
+import functools
+import threading
+import subprocess
+import json
+import numpy
+import pickle
+import azureml.core
+import azureml.core.authentication
 
 myPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(myPath, "..", "code"))
 
-from main import main
-from utils import AMLConfigurationException
+import main as main_module
+from main import main, run_service_job, run_watch
+from service import RegistrationService, serve
+from workspace_cache import get_cache_key
+from fake_aml import FakeBackend, install_backends
+from utils import AMLConfigurationException, AMLModelPerformanceException
+from test_inference import LINEAR_MODEL
+from azureml.core import Model as AMLModel
+from azureml.exceptions import WebserviceException
 
 
 def test_main_no_input():
@@ -33,3 +50,528 @@ def test_main_invalid_parameters_file():
     os.environ["INPUT_PARAMETERS_FILE"] = "wrongfile.json"
     with pytest.raises(AMLConfigurationException):
         assert main()
+
+
+class FakeModel():
+    registered = []
+
+    class Framework():
+        SCIKITLEARN = "ScikitLearn"
+        ONNX = "Onnx"
+        TENSORFLOW = "TensorFlow"
+        TFKERAS = "TfKeras"
+        CUSTOM = "Custom"
+
+    def __init__(self, workspace=None, name=None, version=None, properties=None):
+        if version is None:
+            # Loading latest version
+            versions = [model for model in FakeModel.registered if model.name == name]
+            if len(versions) < 1:
+                raise WebserviceException(f"Model '{name}' not found")
+            version = versions[-1].version
+            properties = versions[-1].properties
+        self.name = name
+        self.version = version
+        self.properties = properties
+        self.id = f"{name}:{version}"
+
+    @classmethod
+    def register(cls, workspace, model_path, model_name, properties=None, **kwargs):
+        # Validating the model path like the AML SDK, which only accepts paths inside the working directory
+        AMLModel._validate_model_path(model_path)
+        version = len([model for model in cls.registered if model.name == model_name]) + 1
+        model = cls(name=model_name, version=version, properties=properties)
+        model.model_path = model_path
+        model.resource_configuration = kwargs.get("resource_configuration", None)
+        cls.registered.append(model)
+        return model
+
+
+class FakeWorkspace():
+    @staticmethod
+    def from_config(path, _file_name, auth):
+        return FakeWorkspace()
+
+
+def setup_local_registration(tmp_path, monkeypatch, parameters):
+    (tmp_path / ".cloud" / ".azure").mkdir(parents=True, exist_ok=True)
+    (tmp_path / ".cloud" / ".azure" / "parameters.json").write_text(json.dumps(parameters))
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("INPUT_AZURE_CREDENTIALS", '{"clientId": "test", "clientSecret": "test", "subscriptionId": "test", "tenantId": "test"}')
+    monkeypatch.setenv("INPUT_PARAMETERS_FILE", "parameters.json")
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(tmp_path))
+    monkeypatch.setenv("GITHUB_REPOSITORY", "owner/repository")
+    monkeypatch.setenv("GITHUB_REF", "refs/heads/master")
+    monkeypatch.delenv("INPUT_EXPERIMENT_NAME", raising=False)
+    monkeypatch.delenv("INPUT_RUN_ID", raising=False)
+    monkeypatch.setattr(azureml.core.authentication, "ServicePrincipalAuthentication", lambda **kwargs: None)
+    monkeypatch.setattr(azureml.core, "Workspace", FakeWorkspace)
+    monkeypatch.setattr(azureml.core, "Model", FakeModel)
+    monkeypatch.setattr(FakeModel, "registered", [])
+
+
+def test_main_batch_registration(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check the main function with a list of models in the parameters file
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters=[
+        {"model_name": "model-a", "model_file_name": "model-a.pkl"},
+        {"model_name": "model-b", "model_file_name": "model-b.pkl"},
+        {"model_name": "model-c", "model_file_name": "model-c.pkl"}
+    ])
+    monkeypatch.setenv("INPUT_MAX_WORKERS", "2")
+    (tmp_path / "outputs").mkdir()
+    (tmp_path / "outputs" / "model-a.pkl").write_text("model")
+    (tmp_path / "outputs" / "model-c.pkl").write_text("model")
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    output = capsys.readouterr().out
+    assert '::set-output name=models::[{"index": 0, "model_name": "model-a", "model_version": 1, "model_id": "model-a:1"}, {"index": 2, "model_name": "model-c", "model_version": 1, "model_id": "model-c:1"}]' in output
+    assert '::set-output name=failed_models::[{"index": 1, "model_name": "model-b"' in output
+    assert sorted(model.model_path for model in FakeModel.registered) == [str(tmp_path / "outputs" / "model-a.pkl"), str(tmp_path / "outputs" / "model-c.pkl")]
+
+
+def test_main_skip_unchanged_model(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that the main function skips the registration of unchanged local models
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "model.pkl",
+        "model_properties": {"key": "value"},
+        "skip_unchanged_model": True
+    })
+    (tmp_path / "model.pkl").write_text("model")
+
+    main()
+    main()
+    assert len(FakeModel.registered) == 1
+    assert FakeModel.registered[0].properties["key"] == "value"
+    assert "model_sha256" in FakeModel.registered[0].properties
+    assert "::set-output name=model_version::1" in capsys.readouterr().out
+
+    (tmp_path / "model.pkl").write_text("changed model")
+    main()
+    assert len(FakeModel.registered) == 2
+    assert "::set-output name=model_version::2" in capsys.readouterr().out
+
+
+def test_main_run_registration(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check the main function end to end for a pipeline run with a hyperparameter tuning step against the fake AML backend
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "model.pkl",
+        "metrics_max": ["metric_0"],
+        "datasets": ["dataset_0", "dataset_1"]
+    })
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", step_names=["model_preparation", "model_training"], children=120)
+    backend.create_datasets(2)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+
+    main()
+    output = capsys.readouterr().out
+    assert "::set-output name=model_version::1" in output
+    assert len(backend.models) == 1
+    assert backend.models[0].run.id == "pipeline_model_training_hd_119"
+    assert backend.models[0].model_path == "outputs/model.pkl"
+    assert backend.calls["get_file_names"] == 1
+    assert backend.calls["get_dataset"] == 2
+
+
+def test_main_baseline_filter(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that models are compared with the versions selected by tags and version range and that baseline metrics are loaded once
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters=[
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_tags": {"stage": "production"}},
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_tags": {"stage": "production"}},
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_max_version": 1},
+        {"model_name": "model", "metrics_max": ["metric_0"]}
+    ])
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", children=2)
+    for version, (metric, tags) in enumerate([(0.2, None), (0.8, {"stage": "production"}), (2.0, {"stage": "staging"})]):
+        baseline_run = backend.add_run(f"baseline_{version}", metrics={"metric_0": metric})
+        backend.register_model(model_name="model", model_path="outputs/model.pkl", run=baseline_run, tags=tags)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+    monkeypatch.setenv("INPUT_MAX_WORKERS", "1")
+    requested_runs = []
+    get_metrics = backend.runs["baseline_1"].get_metrics
+    backend.runs["baseline_1"].get_metrics = lambda **kwargs: requested_runs.append(kwargs) or get_metrics(**kwargs)
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    output = capsys.readouterr().out
+    assert '::set-output name=failed_models::[{"index": 3, "model_name": "model"' in output
+    assert [model.version for model in backend.models] == [1, 2, 3, 4, 5, 6]
+    assert len(requested_runs) == 1
+    assert backend.calls["list_models"] == 2
+
+
+def test_main_baseline_versions(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that models with the same name are compared with the number of baseline versions of their own model specification
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters=[
+        {"model_name": "model", "metrics_max": ["metric_0"]},
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_versions": 3}
+    ])
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", children=2)
+    for version, metric in enumerate([5.0, 0.1, 0.1]):
+        baseline_run = backend.add_run(f"baseline_{version}", metrics={"metric_0": metric})
+        backend.register_model(model_name="model", model_path="outputs/model.pkl", run=baseline_run)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    output = capsys.readouterr().out
+    assert '::set-output name=models::[{"index": 0, "model_name": "model", "model_version": 4, "model_id": "model:4"}]' in output
+    assert '::set-output name=failed_models::[{"index": 1, "model_name": "model", "error": "New model does not perform better than production model for metric \'metric_0\'"}]' in output
+
+
+def test_main_baseline_filter_versions(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that models with the same name and baseline filter are compared with the number of baseline versions of their own model specification
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters=[
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_tags": {"stage": "production"}},
+        {"model_name": "model", "metrics_max": ["metric_0"], "baseline_tags": {"stage": "production"}, "baseline_versions": 3}
+    ])
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", children=2)
+    for version, metric in enumerate([5.0, 0.1, 0.1]):
+        baseline_run = backend.add_run(f"baseline_{version}", metrics={"metric_0": metric})
+        backend.register_model(model_name="model", model_path="outputs/model.pkl", run=baseline_run, tags={"stage": "production"})
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    output = capsys.readouterr().out
+    assert '::set-output name=models::[{"index": 0, "model_name": "model", "model_version": 4, "model_id": "model:4"}]' in output
+    assert '::set-output name=failed_models::[{"index": 1, "model_name": "model"' in output
+    assert backend.calls["list_models"] == 2
+
+
+def test_main_execution_modes(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that the concurrent and sequential execution modes create the same outputs with the same requests
+    """
+    parameters = [
+        {"model_name": f"model-{i % 2}", "pipeline_child_run_name": f"step_{i % 3}", "metrics_max": ["metric_0"], "baseline_versions": 2, "datasets": [f"dataset_{i}"]}
+        for i in range(4)
+    ]
+    outputs = {}
+    calls = {}
+    for execution_mode in ["sequential", "concurrent"]:
+        setup_local_registration(tmp_path, monkeypatch, parameters=parameters)
+        backend = FakeBackend(latency=0.001).install(monkeypatch)
+        backend.create_pipeline_run("pipeline", step_names=["step_0", "step_1", "step_2"], children=5)
+        backend.create_datasets(3)
+        monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+        monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+        monkeypatch.setenv("INPUT_EXECUTION_MODE", execution_mode)
+        capsys.readouterr()
+
+        # Models with the same name are registered by concurrent workers, so that their versions depend on the order of the workers
+        main()
+        output = capsys.readouterr().out.splitlines()
+        models = json.loads(next(line for line in output if line.startswith("::set-output name=models::"))[len("::set-output name=models::"):])
+        outputs[execution_mode] = [(model["index"], model["model_name"]) for model in models] + sorted(line for line in output if line.startswith("::warning::"))
+        calls[execution_mode] = dict(backend.calls)
+    assert outputs["sequential"] == outputs["concurrent"]
+    assert calls["sequential"] == calls["concurrent"]
+
+    monkeypatch.setenv("INPUT_EXECUTION_MODE", "parallel")
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+
+
+def test_load_dependencies_requests_in_flight(monkeypatch):
+    """
+    Unit test to check that the concurrent loading keeps at most max_workers requests in flight and that the sequential loading sends one request at a time
+    """
+    parameters = [{"model_name": f"model-{i}", "metrics_max": ["metric_0"], "datasets": [f"dataset_{j}" for j in range(8)]} for i in range(2)]
+    kwargs = {"model_specs": parameters, "experiment_name": "experiment", "run_id": "pipeline", "default_model_name": "model", "max_workers": 2}
+    for load, max_in_flight in [(lambda **kwargs: asyncio.run(main_module.load_dependencies_async(**kwargs)), 2), (main_module.load_dependencies, 1)]:
+        backend = FakeBackend(latency=0.01).install(monkeypatch)
+        backend.create_pipeline_run("pipeline", children=3)
+        backend.create_datasets(8)
+        _, datasets, _, _ = load(workspace=backend.workspace, **kwargs)
+        assert len(datasets) == 8
+        assert backend.calls["get_dataset"] == 8
+        assert backend.max_in_flight == max_in_flight
+
+
+def test_main_manifest(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that the main function skips registrations that are recorded in the manifest and still exist
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "model.pkl"
+    })
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", children=3)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+    monkeypatch.setenv("INPUT_MANIFEST_FILE", str(tmp_path / "manifest" / "manifest.json"))
+
+    main()
+    main()
+    assert len(backend.models) == 1
+    assert backend.calls["register_model"] == 1
+    assert capsys.readouterr().out.count("::set-output name=model_version::1") == 2
+
+    # Registering again after the recorded version was deleted
+    backend.models.clear()
+    main()
+    assert backend.calls["register_model"] == 2
+
+    # Registering again after the parameters changed
+    (tmp_path / ".cloud" / ".azure" / "parameters.json").write_text(json.dumps({"model_name": "model", "model_file_name": "model.pkl", "model_tags": {"key": "value"}}))
+    main()
+    assert backend.calls["register_model"] == 3
+    assert "::set-output name=model_version::2" in capsys.readouterr().out
+
+
+def test_main_package_model(tmp_path, monkeypatch):
+    """
+    Unit test to check that the main function registers a packaged model directory and removes the archive afterwards
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "outputs/model",
+        "model_package_format": "gzip"
+    })
+    (tmp_path / "outputs" / "model").mkdir(parents=True)
+    (tmp_path / "outputs" / "model" / "weights.bin").write_bytes(b"weights" * 1000)
+
+    main()
+    assert len(FakeModel.registered) == 1
+    assert os.path.basename(FakeModel.registered[0].model_path) == "model.tar.gz"
+    assert os.path.commonpath([FakeModel.registered[0].model_path, str(tmp_path)]) == str(tmp_path)
+    assert not os.path.exists(FakeModel.registered[0].model_path)
+    assert sorted(os.listdir(tmp_path)) == [".cloud", "outputs"]
+    assert FakeModel.registered[0].properties["package_format"] == "tar.gz"
+    assert "model_sha256" in FakeModel.registered[0].properties
+
+
+def test_main_model_path_outside_working_directory(tmp_path, tmp_path_factory, monkeypatch, capsys):
+    """
+    Unit test to check that a model path that the AML SDK rejects fails the registration with a configuration error
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={"model_name": "model", "model_file_name": "model.pkl"})
+    outside_directory = tmp_path_factory.mktemp("outside")
+    (outside_directory / "model.pkl").write_text("model")
+    monkeypatch.setenv("GITHUB_WORKSPACE", str(outside_directory))
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    assert "::error::Model path" in capsys.readouterr().out
+
+
+def test_main_target_workspaces(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that a model is packaged once, registered in all target workspaces and that failed targets are reported
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "outputs/model",
+        "model_package_format": "gzip"
+    })
+    (tmp_path / "outputs" / "model").mkdir(parents=True)
+    (tmp_path / "outputs" / "model" / "weights.bin").write_bytes(b"weights" * 1000)
+    backends = install_backends(monkeypatch, {f"{name}.json": FakeBackend(name=name) for name in ["dev", "staging", "prod"]})
+    monkeypatch.setattr(backends["prod.json"], "register_model", lambda **kwargs: (_ for _ in ()).throw(WebserviceException("Quota exceeded")))
+    monkeypatch.setenv("INPUT_TARGET_WORKSPACES", json.dumps([{"name": name, "config_file": f"{name}.json"} for name in ["dev", "staging", "prod"]]))
+    package_calls = []
+    package_model = main_module.package_model
+    monkeypatch.setattr(main_module, "package_model", lambda **kwargs: package_calls.append(kwargs) or package_model(**kwargs))
+
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+    output = capsys.readouterr().out
+    assert len(package_calls) == 1
+    assert os.path.commonpath([package_calls[0]["output_directory"], str(tmp_path)]) == str(tmp_path)
+    assert not os.path.exists(os.path.dirname(package_calls[0]["output_directory"]))
+    assert [len(backends[f"{name}.json"].models) for name in ["dev", "staging", "prod"]] == [1, 1, 0]
+    assert backends["dev.json"].models[0].properties["package_sha256"] == backends["staging.json"].models[0].properties["package_sha256"]
+    assert "::set-output name=model_version::1" in output
+    targets = json.loads(output.split("::set-output name=targets::")[1].splitlines()[0])
+    assert [(target["target"], target["workspace"], target["models"][0]["model_id"]) for target in targets] == [("dev", "dev", "model:1"), ("staging", "staging", "model:1")]
+    failed_targets = json.loads(output.split("::set-output name=failed_targets::")[1].splitlines()[0])
+    assert [target["target"] for target in failed_targets] == ["prod"]
+
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "run")
+    with pytest.raises(AMLConfigurationException):
+        assert main()
+
+
+def test_main_inference_benchmark(tmp_path, monkeypatch):
+    """
+    Unit test to check that the inference measurements are recorded as model properties and that regressions beyond the budgets fail the registration
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={
+        "model_name": "model",
+        "model_file_name": "model.pkl",
+        "model_framework": "scikitlearn",
+        "inference_benchmark": True,
+        "inference_sample_file": "sample.npy",
+        "inference_iterations": 10,
+        "inference_budgets": {"latency_p50_ms": 2.0, "model_size_mb": 1.0}
+    })
+    (tmp_path / "linear_model.py").write_text(LINEAR_MODEL)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from linear_model import LinearModel
+
+    with open(tmp_path / "model.pkl", "wb") as f:
+        pickle.dump(LinearModel(weights=[1.0, 2.0]), f)
+    numpy.save(tmp_path / "sample.npy", numpy.ones((64, 2)))
+
+    main()
+    assert len(FakeModel.registered) == 1
+    properties = FakeModel.registered[0].properties
+    assert float(properties["inference_latency_p99_ms"]) > 0
+    assert float(properties["inference_model_size_mb"]) > 0
+
+    FakeModel.registered[0].properties = dict(properties, inference_latency_p50_ms="0.000001")
+    with pytest.raises(AMLModelPerformanceException):
+        assert main()
+    assert len(FakeModel.registered) == 1
+
+
+def test_main_resource_auto_sizing(tmp_path, monkeypatch):
+    """
+    Unit test to check that a model is registered with the measured resource configuration unless the parameters file defines it
+    """
+    parameters = {
+        "model_name": "model",
+        "model_file_name": "model.pkl",
+        "model_framework": "scikitlearn",
+        "inference_sample_shape": [2],
+        "inference_iterations": 10,
+        "resource_auto_sizing": True,
+        "resource_sizing_threads": [1, 2]
+    }
+    setup_local_registration(tmp_path, monkeypatch, parameters=parameters)
+    (tmp_path / "linear_model.py").write_text(LINEAR_MODEL)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    from linear_model import LinearModel
+
+    with open(tmp_path / "model.pkl", "wb") as f:
+        pickle.dump(LinearModel(weights=[1.0, 2.0]), f)
+
+    main()
+    model = FakeModel.registered[0]
+    assert model.resource_configuration.cpu == float(model.properties["resource_recommended_cpu_cores"])
+    assert model.resource_configuration.memory_in_gb == float(model.properties["resource_recommended_memory_gb"])
+    assert len(json.loads(model.properties["resource_sizing_measurements"])) == 2
+
+    setup_local_registration(tmp_path, monkeypatch, parameters=dict(parameters, memory_gb=4.0))
+    main()
+    assert FakeModel.registered[0].resource_configuration.memory_in_gb == 4.0
+
+
+def test_main_service(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that the main function submits the registration to a running service and registers in-process without a service
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={"model_name": "model", "metrics_max": ["metric_0"]})
+    (tmp_path / "aml_arm_config.json").write_text(json.dumps({"subscription_id": "subscription", "resource_group": "resource-group", "workspace_name": "workspace"}))
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline", children=3)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_RUN_ID", "pipeline")
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="aml-"), "service.sock")
+    monkeypatch.setenv("INPUT_SERVICE_SOCKET", socket_path)
+    workspace_key = get_cache_key(
+        azure_credentials=json.loads(os.environ["INPUT_AZURE_CREDENTIALS"]),
+        cloud="AzureCloud",
+        config_file_path=str(tmp_path),
+        config_file_name="aml_arm_config.json"
+    )
+    service = RegistrationService(handler=functools.partial(run_service_job, workspace=backend.workspace), workspace_key=workspace_key)
+    server = serve(socket_path=socket_path, service=service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    workspace = azureml.core.Workspace
+    monkeypatch.setattr(azureml.core, "Workspace", None)
+    try:
+        main()
+    finally:
+        server.shutdown()
+        server.server_close()
+        service.shutdown()
+        os.unlink(socket_path)
+    output = capsys.readouterr().out
+    assert "::debug::Registration job" in output
+    assert "::set-output name=model_version::1" in output
+    assert backend.models[0].run.id == "pipeline_model_training_hd_2"
+
+    monkeypatch.setattr(azureml.core, "Workspace", workspace)
+    main()
+    output = capsys.readouterr().out
+    assert "Registration service is not available" in output
+    assert "::set-output name=model_version::2" in output
+
+
+def test_main_watch(tmp_path, monkeypatch, capsys):
+    """
+    Unit test to check that the watch mode registers the best model of every pipeline run that completed since the checkpoint once
+    """
+    setup_local_registration(tmp_path, monkeypatch, parameters={"model_name": "model", "metrics_max": ["metric_0"]})
+    backend = FakeBackend().install(monkeypatch)
+    backend.create_pipeline_run("pipeline_0", step_names=["training"], children=3)
+    monkeypatch.setenv("INPUT_EXPERIMENT_NAME", "experiment")
+    monkeypatch.setenv("INPUT_PIPELINE_CHILD_RUN_NAME", "training")
+    monkeypatch.setenv("INPUT_WATCH_CHECKPOINT_FILE", str(tmp_path / "watch" / "checkpoint.json"))
+    monkeypatch.setenv("INPUT_WATCH_DURATION", "0")
+
+    run_watch()
+    assert len(backend.models) == 0
+    backend.create_pipeline_run("pipeline_1", step_names=["training"], children=3)
+    backend.create_pipeline_run("pipeline_2", step_names=["training"], children=3)
+    for child_run in backend.runs["pipeline_2_training_hd"].children:
+        child_run.metrics["metric_0"] = 0.1
+    backend.create_pipeline_run("pipeline_3", step_names=["training"], children=3).status = "Running"
+    run_watch()
+    run_watch()
+    assert [model.run.id for model in backend.models] == ["pipeline_1_training_hd_2"]
+    assert "::debug::Models of run 'pipeline_2' were not registered" in capsys.readouterr().out
+
+    backend.runs["pipeline_3"].status = "Completed"
+    run_watch()
+    assert [model.run.id for model in backend.models] == ["pipeline_1_training_hd_2", "pipeline_3_training_hd_2"]
+
+    monkeypatch.setenv("INPUT_WATCH_MIN_INTERVAL", "0")
+    with pytest.raises(AMLConfigurationException):
+        assert run_watch()
+
+
+def test_main_import_time():
+    """
+    Unit test to check that importing the action does not import the AML SDK
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=os.path.join(myPath, "..", "code"),
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True
+    )
+    import_times = {}
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and not line.endswith("| imported package"):
+            _, cumulative, module = line.split("|")
+            import_times[module.strip()] = int(cumulative)
+    for module in ["azureml", "adal", "msrest", "numpy"]:
+        assert module not in import_times
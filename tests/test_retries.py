@@ -0,0 +1,130 @@
+import os
+import sys
+import time
+import pytest
+import threading
+
+from types import SimpleNamespace
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from azureml.exceptions import WebserviceException
+from retries import SDK_CONNECTION_RETRIES, call_with_retries, configure_retries, configure_session_pool, create_session, get_retry_statistics, get_status_code
+
+
+class FaultInjectingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        with self.server.lock:
+            self.server.requests += 1
+            status_code, headers = self.server.failures.pop(0) if len(self.server.failures) > 0 else (200, {})
+        self.send_response(status_code)
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FaultInjectingHandler)
+    server.lock = threading.Lock()
+    server.failures = []
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    configure_retries(max_retries=3, deadline=120.0, base_delay=0.01, max_delay=0.05)
+    yield server
+    server.shutdown()
+    server.server_close()
+    configure_retries(max_retries=3, deadline=120.0, base_delay=0.5, max_delay=30.0)
+
+
+def get_json(session, url):
+    response = session.get(url, timeout=5)
+    response.raise_for_status()
+    return response.json()
+
+
+def test_call_with_retries_transient_errors(server):
+    """
+    Unit test to check that throttling and unavailable responses are retried with a pooled session and that Retry-After is honored
+    """
+    server.failures = [(429, {"Retry-After": "0.2"}), (503, {})]
+    session = create_session(max_workers=2)
+    start = time.monotonic()
+    assert call_with_retries(get_json, session, f"http://127.0.0.1:{server.server_address[1]}/") == {}
+    assert time.monotonic() - start >= 0.2
+    assert server.requests == 3
+    statistics = get_retry_statistics()
+    assert statistics["calls"] == 1
+    assert statistics["retries"] == 2
+    assert statistics["backoff_seconds"] >= 0.2
+
+
+def test_call_with_retries_limits(server):
+    """
+    Unit test to check that permanent errors, exhausted retries, deadlines and registrations are not retried
+    """
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    session = create_session(max_workers=1)
+    server.failures = [(404, {})]
+    with pytest.raises(Exception):
+        assert call_with_retries(get_json, session, url)
+    assert server.requests == 1
+
+    server.failures = [(500, {})] * 3
+    with pytest.raises(Exception):
+        assert call_with_retries(get_json, session, url, max_retries=1)
+    assert server.requests == 3
+
+    server.failures = [(429, {"Retry-After": "60"})]
+    with pytest.raises(Exception):
+        assert call_with_retries(get_json, session, url, deadline=1.0)
+    assert server.requests == 4
+
+    server.failures = [(500, {})]
+    with pytest.raises(Exception):
+        assert call_with_retries(get_json, session, url, idempotent=False)
+    assert server.requests == 5
+
+
+def test_get_status_code_webservice_exception():
+    """
+    Unit test to check that the status code of model management errors is read from the message
+    """
+    assert get_status_code(WebserviceException("Received bad response from Model Management Service:\nResponse Code: 503\nHeaders: {}")) == 503
+    assert get_status_code(WebserviceException("Model not found", status_code="404")) == 404
+    assert get_status_code(WebserviceException("Model not found")) is None
+
+
+def test_configure_session_pool():
+    """
+    Unit test to check that the pooled session keeps the connection retries of the session of the SDK
+    """
+    workspace = SimpleNamespace(service_context=SimpleNamespace(_session=None))
+    configure_session_pool(workspace, max_workers=4)
+    for prefix in ["http://", "https://"]:
+        adapter = workspace.service_context._session.get_adapter(prefix)
+        assert adapter.max_retries.total == SDK_CONNECTION_RETRIES
+        assert adapter.max_retries.read is False
+        assert adapter.max_retries.respect_retry_after_header is False
+        assert adapter._pool_maxsize == 4
+
+
+def test_create_session_connection_retries():
+    """
+    Unit test to check that failed connections of the pooled session are retried by its adapter
+    """
+    session = create_session(max_workers=1)
+    retries = []
+    increment = session.get_adapter("http://").max_retries.increment
+    session.get_adapter("http://").max_retries.increment = lambda *args, **kwargs: retries.append(1) or increment(*args, **kwargs)
+    with pytest.raises(Exception):
+        assert session.get("http://127.0.0.1:9/", timeout=1.0)
+    assert len(retries) >= 1
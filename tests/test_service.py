@@ -0,0 +1,129 @@
+import os
+import sys
+import stat
+import pytest
+import asyncio
+import tempfile
+import threading
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from service import AMLServiceException, RegistrationService, serve, send_request, wait_for_job
+from executors import ContextThreadPoolExecutor
+from utils import AMLConfigurationException
+
+
+@pytest.fixture
+def socket_path():
+    # Unix socket paths are limited to about 100 characters
+    directory = tempfile.mkdtemp(prefix="aml-")
+    yield os.path.join(directory, "service.sock")
+    os.rmdir(directory)
+
+
+def start_service(socket_path, handler, **kwargs):
+    service = RegistrationService(handler=handler, workspace_key="workspace", **kwargs)
+    server = serve(socket_path=socket_path, service=service)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return service, server
+
+
+def stop_service(service, server, socket_path):
+    server.shutdown()
+    server.server_close()
+    service.shutdown()
+    os.unlink(socket_path)
+
+
+def test_service_jobs(socket_path):
+    """
+    Unit test to check that jobs are run by the service with their own output and status
+    """
+    def handler(job):
+        print(f"::set-output name=model_name::{job['model_name']}")
+        if job.get("fail", False):
+            raise ValueError("Model could not be registered")
+
+    service, server = start_service(socket_path, handler)
+    try:
+        assert send_request(socket_path, {"action": "ping"})["statistics"]["running"] == 0
+        job_ids = [send_request(socket_path, {"action": "submit", "job": {"model_name": f"model-{i}", "fail": i == 2}, "workspace_key": "workspace"})["job_id"] for i in range(3)]
+        jobs = [wait_for_job(socket_path, job_id) for job_id in job_ids]
+        assert [job["status"] for job in jobs] == ["succeeded", "succeeded", "failed"]
+        assert [job["output"] for job in jobs] == [[f"::set-output name=model_name::model-{i}", "\n"] for i in range(2)] + [jobs[2]["output"]]
+        assert jobs[2]["error"] == "Model could not be registered"
+        assert jobs[2]["error_type"] == "ValueError"
+        assert send_request(socket_path, {"action": "status", "job_id": job_ids[0]})["job"]["status"] == "succeeded"
+
+        with pytest.raises(AMLServiceException):
+            assert send_request(socket_path, {"action": "submit", "job": {}, "workspace_key": "other-workspace"})
+        with pytest.raises(AMLServiceException):
+            assert send_request(socket_path, {"action": "status", "job_id": "unknown"})
+    finally:
+        stop_service(service, server, socket_path)
+
+
+def test_service_queue_limit(socket_path):
+    """
+    Unit test to check that jobs are rejected when the queue of the service is full
+    """
+    release = threading.Event()
+    service, server = start_service(socket_path, lambda job: release.wait(5), max_workers=1, max_queue_size=1)
+    try:
+        job_ids = [send_request(socket_path, {"action": "submit", "job": {}, "workspace_key": "workspace"})["job_id"]]
+        while send_request(socket_path, {"action": "status", "job_id": job_ids[0]})["job"]["status"] != "running":
+            pass
+        job_ids.append(send_request(socket_path, {"action": "submit", "job": {}, "workspace_key": "workspace"})["job_id"])
+        with pytest.raises(AMLServiceException):
+            assert send_request(socket_path, {"action": "submit", "job": {}, "workspace_key": "workspace"})
+        assert send_request(socket_path, {"action": "wait", "job_id": job_ids[1], "timeout": 0.01})["job"]["status"] == "queued"
+        release.set()
+        assert [wait_for_job(socket_path, job_id)["status"] for job_id in job_ids] == ["succeeded", "succeeded"]
+    finally:
+        release.set()
+        stop_service(service, server, socket_path)
+
+
+def test_service_worker_output(socket_path):
+    """
+    Unit test to check that the output of the executors of a job is written to the log of the job
+    """
+    def handler(job):
+        with ContextThreadPoolExecutor(max_workers=2) as executor:
+            list(executor.map(lambda i: print(f"::error::Model {i} of job '{job['name']}' could not be registered"), range(2)))
+
+            async def load_datasets():
+                await asyncio.get_event_loop().run_in_executor(executor, print, f"::warning::Dataset of job '{job['name']}' not found")
+            asyncio.run(load_datasets())
+
+    service, server = start_service(socket_path, handler)
+    try:
+        assert stat.S_IMODE(os.stat(socket_path).st_mode) == 0o600
+        job_ids = [send_request(socket_path, {"action": "submit", "job": {"name": name}, "workspace_key": "workspace"})["job_id"] for name in ["a", "b"]]
+        for name, job_id in zip(["a", "b"], job_ids):
+            output = "".join(wait_for_job(socket_path, job_id)["output"])
+            assert output.count("::error::Model") == 2
+            assert output.count(f"of job '{name}'") == 3
+            assert f"::warning::Dataset of job '{name}' not found" in output
+    finally:
+        stop_service(service, server, socket_path)
+
+
+def test_service_stopped(socket_path):
+    """
+    Unit test to check that waiting for a job fails with a clear error if the service stops before the job finished
+    """
+    release = threading.Event()
+    service, server = start_service(socket_path, lambda job: release.wait(5))
+    try:
+        job_id = send_request(socket_path, {"action": "submit", "job": {}, "workspace_key": "workspace"})["job_id"]
+        server.shutdown()
+        server.server_close()
+        with pytest.raises(AMLConfigurationException):
+            assert wait_for_job(socket_path, job_id)
+    finally:
+        release.set()
+        service.shutdown()
+        os.unlink(socket_path)
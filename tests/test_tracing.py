@@ -0,0 +1,119 @@
+import os
+import sys
+import json
+import pytest
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from concurrent.futures import ThreadPoolExecutor
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from tracing import start_trace, trace_phase, traced, get_trace, finish_trace
+from fake_aml import FakeBackend
+
+
+@traced("helper")
+def helper(fail=False):
+    if fail:
+        raise ValueError("helper failed")
+    return 1
+
+
+def test_trace_phase_nesting_and_durations(tmp_path, capsys):
+    """
+    Unit test to check that phases are nested, summed per name and written to the trace file
+    """
+    start_trace()
+    with trace_phase("load_workspace", cached=False):
+        helper()
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        list(executor.map(lambda _: helper(), range(3)))
+    with pytest.raises(ValueError):
+        helper(fail=True)
+    trace_file = str(tmp_path / "trace" / "trace.json")
+    durations = finish_trace(trace_file=trace_file)
+
+    assert sorted(durations.keys()) == ["action", "helper", "load_workspace"]
+    with open(trace_file) as f:
+        trace = json.load(f)
+    spans = {span["span_id"]: span for span in trace["spans"]}
+    root_span = [span for span in spans.values() if span["name"] == "action"][0]
+    load_span = [span for span in spans.values() if span["name"] == "load_workspace"][0]
+    helper_spans = [span for span in spans.values() if span["name"] == "helper"]
+    assert root_span["parent_id"] is None
+    assert load_span["parent_id"] == root_span["span_id"]
+    assert load_span["attributes"] == {"cached": False}
+    assert len(helper_spans) == 5
+    assert len([span for span in helper_spans if span["parent_id"] == load_span["span_id"]]) == 1
+    assert len([span for span in helper_spans if span["parent_id"] == root_span["span_id"]]) == 4
+    assert [span["attributes"].get("error", None) for span in helper_spans if span["status"] == "error"] == ["ValueError"]
+    output = capsys.readouterr().out
+    assert f"::set-output name=phase_durations::{json.dumps(durations)}" in output
+    assert f"::set-output name=trace_file::{trace_file}" in output
+
+
+def test_trace_upload_phase(monkeypatch):
+    """
+    Unit test to check that the upload of a registered model is recorded as its own span of the registration
+    """
+    from main import register_model
+
+    backend = FakeBackend().install(monkeypatch)
+    run = backend.add_run("run", file_names=["outputs/model.pkl"])
+    start_trace()
+    register_model(
+        workspace=backend.workspace,
+        parameters={"model_name": "model", "model_file_name": "model.pkl", "force_registration": True},
+        default_model_name="model",
+        best_run=run,
+        datasets={}
+    )
+    spans = {span["name"]: span for span in get_trace()["spans"]}
+    assert spans["upload"]["parent_id"] == spans["register_model"]["span_id"]
+    assert spans["upload"]["attributes"] == {"source": "run"}
+    assert spans["upload"]["duration"] <= spans["register_model"]["duration"]
+
+
+class CollectorHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.server.requests.append((self.path, json.loads(body)))
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"{}")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def test_finish_trace_otlp_export(capsys):
+    """
+    Unit test to check that spans are exported to an OTLP collector and that export errors do not fail the action
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", 0), CollectorHandler)
+    server.requests = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        start_trace()
+        with trace_phase("register_model"):
+            helper()
+        finish_trace(otlp_endpoint=f"http://127.0.0.1:{server.server_address[1]}/")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert len(server.requests) == 1
+    path, payload = server.requests[0]
+    assert path == "/v1/traces"
+    spans = payload["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert sorted(span["name"] for span in spans) == ["action", "helper", "register_model"]
+    assert len({span["traceId"] for span in spans}) == 1
+    assert all(int(span["endTimeUnixNano"]) >= int(span["startTimeUnixNano"]) for span in spans)
+    assert len(get_trace()["spans"]) == 3
+
+    finish_trace(otlp_endpoint=f"http://127.0.0.1:{server.server_address[1]}")
+    assert "::warning::Could not export trace" in capsys.readouterr().out
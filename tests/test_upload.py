@@ -0,0 +1,156 @@
+import os
+import re
+import sys
+import base64
+import hashlib
+import threading
+import pytest
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlparse, parse_qs
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from upload import stage_model, upload_files_to_blobs
+from utils import AMLConfigurationException
+
+
+class BlobStorageHandler(BaseHTTPRequestHandler):
+    # Minimal emulation of the Put Blob, Put Block and Put Block List operations
+    def do_PUT(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        data = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        with self.server.lock:
+            self.server.requests += 1
+            if self.server.failures > 0:
+                self.server.failures -= 1
+                self.send_response(503)
+                self.end_headers()
+                return
+        md5 = self.headers.get("Content-MD5", None)
+        if md5 is not None and md5 != base64.b64encode(hashlib.md5(data).digest()).decode("utf-8"):
+            self.send_response(400)
+            self.end_headers()
+            return
+        comp = query.get("comp", [None])[0]
+        with self.server.lock:
+            if comp == "block":
+                self.server.blocks[(url.path, query["blockid"][0])] = data
+            elif comp == "blocklist":
+                block_ids = re.findall("<Latest>(.*?)</Latest>", data.decode("utf-8"))
+                self.server.blobs[url.path] = b"".join(self.server.blocks[(url.path, block_id)] for block_id in block_ids)
+            else:
+                self.server.blobs[url.path] = data
+        self.send_response(201)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class BlobStorageServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def blob_storage():
+    server = BlobStorageServer(("127.0.0.1", 0), BlobStorageHandler)
+    server.lock = threading.Lock()
+    server.blobs = {}
+    server.blocks = {}
+    server.requests = 0
+    server.failures = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def create_files(tmp_path):
+    (tmp_path / "small.bin").write_bytes(os.urandom(100))
+    (tmp_path / "large.bin").write_bytes(os.urandom(10000))
+    (tmp_path / "empty.bin").write_bytes(b"")
+    return [str(tmp_path / name) for name in ["small.bin", "large.bin", "empty.bin"]]
+
+
+def test_upload_files_to_blobs(tmp_path, blob_storage):
+    """
+    Unit test to check that the upload_files_to_blobs function uploads small files and blocks of large files
+    """
+    file_paths = create_files(tmp_path)
+    base_url = f"http://127.0.0.1:{blob_storage.server_port}/container"
+    result = upload_files_to_blobs(
+        file_urls=[(file_path, f"{base_url}/{os.path.basename(file_path)}?sv=token") for file_path in file_paths],
+        block_size=1024,
+        max_workers=4
+    )
+    assert result["bytes"] == 10100
+    assert result["retries"] == 0
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            assert blob_storage.blobs[f"/container/{os.path.basename(file_path)}"] == f.read()
+    assert blob_storage.requests == 2 + 10 + 1
+
+
+def test_upload_files_to_blobs_retries(tmp_path, blob_storage, monkeypatch):
+    """
+    Unit test to check that the upload_files_to_blobs function retries failed blocks
+    """
+    monkeypatch.setattr("upload.time.sleep", lambda seconds: None)
+    file_paths = create_files(tmp_path)
+    base_url = f"http://127.0.0.1:{blob_storage.server_port}/container"
+    blob_storage.failures = 3
+    result = upload_files_to_blobs(
+        file_urls=[(file_path, f"{base_url}/{os.path.basename(file_path)}") for file_path in file_paths],
+        block_size=1024,
+        max_workers=1,
+        max_retries=3
+    )
+    assert result["retries"] == 3
+    with open(file_paths[1], "rb") as f:
+        assert blob_storage.blobs["/container/large.bin"] == f.read()
+
+    blob_storage.failures = 10
+    with pytest.raises(AMLConfigurationException):
+        assert upload_files_to_blobs(
+            file_urls=[(file_paths[0], f"{base_url}/small.bin")],
+            max_retries=2
+        )
+
+
+def test_stage_model_validation(tmp_path, monkeypatch):
+    """
+    Unit test to check that invalid model names and paths are rejected before any artifact is created
+    """
+    from azureml.exceptions import WebserviceException
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "model.pkl").write_text("model")
+    (tmp_path / "empty").mkdir()
+    with pytest.raises(WebserviceException):
+        assert stage_model(workspace=None, model_path="model.pkl", model_name="-invalid name")
+    with pytest.raises((FileNotFoundError, WebserviceException)):
+        assert stage_model(workspace=None, model_path="missing.pkl", model_name="model")
+    with pytest.raises(AMLConfigurationException):
+        assert stage_model(workspace=None, model_path="empty", model_name="model")
+
+
+@pytest.mark.skipif("AZURITE_CONTAINER_URL" not in os.environ, reason="Set AZURITE_CONTAINER_URL to a container URL with SAS token of a running Azurite blob emulator")
+def test_upload_files_to_blobs_azurite(tmp_path):
+    """
+    Integration test to check the upload_files_to_blobs function against the Azurite blob emulator
+    """
+    import requests
+    container_url, _, sas_token = os.environ["AZURITE_CONTAINER_URL"].partition("?")
+    file_paths = create_files(tmp_path)
+    upload_files_to_blobs(
+        file_urls=[(file_path, f"{container_url}/{os.path.basename(file_path)}?{sas_token}") for file_path in file_paths],
+        block_size=1024
+    )
+    for file_path in file_paths:
+        with open(file_path, "rb") as f:
+            assert requests.get(f"{container_url}/{os.path.basename(file_path)}?{sas_token}").content == f.read()
@@ -5,7 +5,9 @@
 myPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, os.path.join(myPath, "..", "code"))
 
-from utils import validate_json, AMLConfigurationException
+import azureml.core
+
+from utils import validate_json, get_validator, find_model_file, hash_model_path, get_datasets, get_best_run, compare_metrics, get_run_artifact_index, find_run_artifact, AMLConfigurationException, AMLModelPerformanceException
 from schemas import parameters_schema
 
 
@@ -53,3 +55,267 @@ def test_validate_json_invalid_schema():
             schema=schema_object,
             input_name="PARAMETERS_FILE"
         )
+
+
+def test_validate_json_cached_validator_fail_fast(capsys):
+    """
+    Unit test to check that validators are compiled once per schema and that the fail fast mode only reports the first error
+    """
+    assert get_validator(parameters_schema)[0] is get_validator(parameters_schema)[0]
+    json_object = {
+        "cpu_cores": "0.1",
+        "memory_gb": "0.5"
+    }
+    for fail_fast, error_count in [(False, 2), (True, 1)]:
+        with pytest.raises(AMLConfigurationException):
+            assert validate_json(
+                data=json_object,
+                schema=parameters_schema,
+                input_name="PARAMETERS_FILE",
+                fail_fast=fail_fast
+            )
+        assert capsys.readouterr().out.count("::error::JSON validation error") == error_count
+
+
+def test_find_model_file_shallowest_match(tmp_path):
+    """
+    Unit test to check that the find_model_file function selects the shallowest and alphabetically first match
+    """
+    for path in ["b/model.pkl", "a/c/model.pkl", "c/model.pkl", ".git/model.pkl"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("model")
+    model_path = find_model_file(
+        directory=str(tmp_path),
+        file_name="model.pkl"
+    )
+    assert model_path == os.path.join(str(tmp_path), "b", "model.pkl")
+
+
+def test_find_model_file_excluded_directories(tmp_path):
+    """
+    Unit test to check that the find_model_file function skips excluded and ignored directories
+    """
+    for path in [".git/model.pkl", "data/model.pkl", "outputs/model.pkl"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("model")
+    (tmp_path / ".amlignore").write_text("# comment\ndata/\n")
+    model_path = find_model_file(
+        directory=str(tmp_path),
+        file_name="model.pkl"
+    )
+    assert model_path == os.path.join(str(tmp_path), "outputs", "model.pkl")
+
+
+def test_find_model_file_index_file(tmp_path):
+    """
+    Unit test to check the find_model_file function with a path index
+    """
+    for path in ["a/b/model.pkl", "z/model.pkl"]:
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text("model")
+    (tmp_path / "index.txt").write_text("a/b/model.pkl\nz/model.pkl\nmissing/deep/model.pkl\n")
+    model_path = find_model_file(
+        directory=str(tmp_path),
+        file_name="model.pkl",
+        index_file=str(tmp_path / "index.txt")
+    )
+    assert model_path == os.path.join(str(tmp_path), "z", "model.pkl")
+
+
+def test_find_model_file_no_match(tmp_path):
+    """
+    Unit test to check the find_model_file function if no model file exists
+    """
+    with pytest.raises(AMLConfigurationException):
+        assert find_model_file(
+            directory=str(tmp_path),
+            file_name="model.pkl"
+        )
+
+
+def test_get_datasets_deduplication_and_failures(monkeypatch):
+    """
+    Unit test to check that the get_datasets function requests every name once and reports failures
+    """
+    requested_names = []
+
+    class FakeDataset():
+        @staticmethod
+        def get_by_name(workspace, name, version):
+            requested_names.append(name)
+            if name == "missing":
+                raise Exception("Dataset not found")
+            return f"dataset-{name}"
+
+    monkeypatch.setattr(azureml.core, "Dataset", FakeDataset)
+    datasets, failures = get_datasets(
+        workspace=None,
+        names=["train", "missing", "train", None, "test", "missing"]
+    )
+    assert datasets == {"train": "dataset-train", "test": "dataset-test"}
+    assert list(failures.keys()) == ["missing"]
+    assert sorted(requested_names) == ["missing", "test", "train"]
+
+
+class FakeRun():
+    def __init__(self, metrics, run_id="run"):
+        self.id = run_id
+        self.metrics = metrics
+        self.requested_names = []
+
+    def get_metrics(self, name=None):
+        self.requested_names.append(name)
+        return {name: self.metrics[name]} if name in self.metrics else {}
+
+
+class FakeProductionModel():
+    def __init__(self, run):
+        self.run = run
+
+
+def test_compare_metrics_series_aggregation():
+    """
+    Unit test to check that the compare_metrics function only loads requested metrics and aggregates series
+    """
+    production_run = FakeRun(metrics={"accuracy": [0.5, 0.8], "loss": 0.3, "epoch_time": [1.0] * 1000}, run_id="production")
+    run = FakeRun(metrics={"accuracy": [0.9, 0.85], "loss": 0.2, "epoch_time": [1.0] * 1000})
+    compare_metrics(
+        workspace=None,
+        run=run,
+        model_name="model",
+        metrics_max=["accuracy"],
+        metrics_min=["loss"],
+        production_models={"model": [FakeProductionModel(run=production_run)]},
+        metrics_aggregation="last"
+    )
+    assert sorted(run.requested_names) == ["accuracy", "loss"]
+    assert sorted(production_run.requested_names) == ["accuracy", "loss"]
+    with pytest.raises(AMLModelPerformanceException):
+        assert compare_metrics(
+            workspace=None,
+            run=run,
+            model_name="model",
+            metrics_max=[],
+            metrics_min=["accuracy"],
+            production_models={"model": [FakeProductionModel(run=production_run)]},
+            metrics_aggregation="mean"
+        )
+
+
+def test_compare_metrics_missing_metric():
+    """
+    Unit test to check the compare_metrics function with a metric that was not logged
+    """
+    production_run = FakeRun(metrics={"accuracy": 0.8}, run_id="production")
+    run = FakeRun(metrics={})
+    with pytest.raises(AMLConfigurationException):
+        assert compare_metrics(
+            workspace=None,
+            run=run,
+            model_name="model",
+            metrics_max=["accuracy"],
+            metrics_min=[],
+            production_models={"model": [FakeProductionModel(run=production_run)]}
+        )
+
+
+def test_hash_model_path(tmp_path):
+    """
+    Unit test to check the hash_model_path function with files and folders
+    """
+    (tmp_path / "model" / "weights").mkdir(parents=True)
+    (tmp_path / "model" / "weights" / "layer.bin").write_bytes(b"\x00" * 1000)
+    (tmp_path / "model" / "config.json").write_text("{}")
+    folder_hash = hash_model_path(model_path=str(tmp_path / "model"), chunk_size=64)
+    assert folder_hash == hash_model_path(model_path=str(tmp_path / "model"), chunk_size=128, use_mmap=True)
+    (tmp_path / "model" / "weights" / "layer.bin").rename(tmp_path / "model" / "weights" / "other.bin")
+    assert folder_hash != hash_model_path(model_path=str(tmp_path / "model"))
+
+    (tmp_path / "model.pkl").write_text("model")
+    file_hash = hash_model_path(model_path=str(tmp_path / "model.pkl"))
+    (tmp_path / "copy").mkdir()
+    (tmp_path / "copy" / "model.pkl").write_text("model")
+    assert file_hash == hash_model_path(model_path=str(tmp_path / "copy" / "model.pkl"), use_mmap=True)
+
+
+class FakeTreeRun():
+    def __init__(self, run_id, run_type="azureml.scriptrun", name=None, children=(), metrics=None, status="Completed"):
+        self.id = run_id
+        self.type = run_type
+        self.status = status
+        self._run_dto = {"name": name}
+        self.children = list(children)
+        self.metrics = metrics if metrics is not None else {}
+        self.loaded_children = 0
+
+    def get_children(self):
+        for child in self.children:
+            self.loaded_children += 1
+            yield child
+
+    def get_metrics(self, name=None):
+        return {name: self.metrics[name]} if name in self.metrics else {}
+
+
+def test_get_best_run_pipeline_single_pass():
+    """
+    Unit test to check that the get_best_run function lists pipeline steps once and reuses them for other step names
+    """
+    best_child = FakeTreeRun(run_id="hd_1")
+    sweep_run = FakeTreeRun(run_id="hd", run_type="hyperdrive", metrics={"best_child_by_primary_metric": {"run_id": ["hd_0", "hd_1"], "metric_value": [0.5, 0.9], "final": [False, True]}})
+    training_step = FakeTreeRun(run_id="step_1", name="model_training", children=[sweep_run, FakeTreeRun(run_id="other")])
+    scoring_step = FakeTreeRun(run_id="step_2", name="model_scoring")
+    pipeline_run = FakeTreeRun(run_id="pipeline", run_type="azureml.PipelineRun", children=[training_step, scoring_step])
+    run_cache = {"hd_1": best_child}
+    assert get_best_run(experiment=None, run=pipeline_run, pipeline_child_run_name="model_training", run_cache=run_cache) is best_child
+    assert get_best_run(experiment=None, run=pipeline_run, pipeline_child_run_name="model_scoring", run_cache=run_cache) is scoring_step
+    assert pipeline_run.loaded_children == 2
+    assert training_step.loaded_children == 1
+    with pytest.raises(AMLConfigurationException):
+        assert get_best_run(experiment=None, run=pipeline_run, pipeline_child_run_name="model_evaluation", run_cache=run_cache)
+
+
+def test_get_best_run_duplicate_step_names():
+    """
+    Unit test to check that the get_best_run function fails for duplicate pipeline step names
+    """
+    pipeline_run = FakeTreeRun(run_id="pipeline", run_type="azureml.PipelineRun", children=[FakeTreeRun(run_id="step_1", name="model_training"), FakeTreeRun(run_id="step_2", name="model_training")])
+    with pytest.raises(AMLConfigurationException):
+        assert get_best_run(experiment=None, run=pipeline_run, pipeline_child_run_name="model_training")
+
+
+class FakeArtifactRun():
+    def __init__(self, file_names, run_id="run"):
+        self.id = run_id
+        self.file_names = file_names
+        self.listings = 0
+
+    def get_file_names(self):
+        self.listings += 1
+        return list(self.file_names)
+
+
+def test_find_run_artifact_queries():
+    """
+    Unit test to check that the find_run_artifact function prefers exact names and supports patterns, directories and paths
+    """
+    run = FakeArtifactRun(file_names=[
+        "outputs/model.pkl.bak",
+        "outputs/checkpoints/step_1/model.pkl",
+        "outputs/model.pkl",
+        "outputs/onnx/model.onnx",
+        "logs/driver_log.txt"
+    ])
+    index_cache = {}
+    index = get_run_artifact_index(run=run, index_cache=index_cache)
+    assert get_run_artifact_index(run=run, index_cache=index_cache) is index
+    assert run.listings == 1
+    assert find_run_artifact(index=index, file_name="model.pkl") == "outputs/model.pkl"
+    assert find_run_artifact(index=index, file_name="*.onnx") == "outputs/onnx/model.onnx"
+    assert find_run_artifact(index=index, file_name="onnx") == "outputs/onnx"
+    assert find_run_artifact(index=index, file_name="outputs/checkpoints") == "outputs/checkpoints"
+    assert find_run_artifact(index=index, file_name="driver_log") == "logs/driver_log.txt"
+    with pytest.raises(AMLConfigurationException):
+        assert find_run_artifact(index=index, file_name="model.joblib")
+    with pytest.raises(AMLConfigurationException):
+        assert find_run_artifact(index=index, file_name="outputs/check")
@@ -0,0 +1,105 @@
+import os
+import sys
+import json
+import pytest
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+from watch import PollInterval, get_checkpoint_key, poll_experiment, watch_experiment
+from utils import AMLModelPerformanceException
+from fake_aml import FakeBackend
+
+
+def create_handler(errors=None):
+    registered = []
+
+    def handler(run):
+        registered.append(run.id)
+        if run.id in (errors or {}):
+            raise errors[run.id]
+        return [{"index": 0, "model_name": "model", "model_version": len(registered), "model_id": f"model:{len(registered)}"}]
+    return handler, registered
+
+
+def test_poll_experiment(tmp_path):
+    """
+    Unit test to check that only runs that completed since the checkpoint are registered and that failed registrations are retried
+    """
+    backend = FakeBackend(page_size=2)
+    for i in range(5):
+        backend.add_run(f"old_{i}")
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    key = get_checkpoint_key(backend.experiment)
+    handler, registered = create_handler(errors={"failing": ValueError("Service unavailable"), "worse": AMLModelPerformanceException("Model does not perform better")})
+
+    assert poll_experiment(backend.experiment, checkpoint_file, key, handler) == (0, 0)
+    assert registered == []
+    backend.add_run("running", status="Running")
+    for run_id in ["new", "failing", "worse"]:
+        backend.add_run(run_id)
+    backend.add_run("canceled", status="Canceled")
+    assert poll_experiment(backend.experiment, checkpoint_file, key, handler) == (3, 2)
+    assert registered == ["new", "failing", "worse"]
+
+    backend.runs["running"].status = "Completed"
+    assert poll_experiment(backend.experiment, checkpoint_file, key, handler, max_attempts=2) == (2, 0)
+    assert registered[3:] == ["running", "failing"]
+    with open(checkpoint_file) as f:
+        checkpoint = json.load(f)[key]
+    assert {run_id: state["status"] for run_id, state in checkpoint["runs"].items()} == {"canceled": "skipped"}
+
+    # Listing stops at the first page once all runs are processed
+    calls = backend.calls["get_runs"]
+    assert poll_experiment(backend.experiment, checkpoint_file, key, handler) == (0, 0)
+    assert backend.calls["get_runs"] == calls + 1
+    assert len(registered) == 5
+
+
+def test_poll_experiment_restart(tmp_path):
+    """
+    Unit test to check that a watcher that stopped while registering a run continues with that run and does not register other runs again
+    """
+    backend = FakeBackend()
+    checkpoint_file = str(tmp_path / "checkpoint.json")
+    key = get_checkpoint_key(backend.experiment, pipeline_child_run_name="model_training")
+    handler, registered = create_handler(errors={"run_1": KeyboardInterrupt()})
+    poll_experiment(backend.experiment, checkpoint_file, key, handler)
+    for i in range(3):
+        backend.add_run(f"run_{i}")
+
+    with pytest.raises(KeyboardInterrupt):
+        assert poll_experiment(backend.experiment, checkpoint_file, key, handler)
+    handler, registered = create_handler()
+    assert poll_experiment(backend.experiment, checkpoint_file, key, handler) == (2, 0)
+    assert registered == ["run_1", "run_2"]
+
+
+def test_poll_interval():
+    """
+    Unit test to check that the poll interval grows while no runs complete and is reset by completed runs
+    """
+    poll_interval = PollInterval(minimum=10, maximum=80)
+    assert [poll_interval.update(new_runs=0, pending_runs=0) for i in range(4)] == [20, 40, 80, 80]
+    assert poll_interval.update(new_runs=1, pending_runs=0) == 10
+    assert [poll_interval.update(new_runs=0, pending_runs=1) for i in range(3)] == [20, 20, 20]
+
+
+def test_watch_experiment(tmp_path):
+    """
+    Unit test to check that the watcher polls until the duration has passed
+    """
+    backend = FakeBackend()
+    handler, registered = create_handler()
+    sleeps = []
+    watch_experiment(
+        experiment=backend.experiment,
+        checkpoint_file=str(tmp_path / "checkpoint.json"),
+        key=get_checkpoint_key(backend.experiment),
+        handler=handler,
+        poll_interval=PollInterval(minimum=30, maximum=600),
+        duration=100,
+        sleep=lambda seconds: sleeps.append(seconds) or len(sleeps) > 1 or backend.add_run("run_1")
+    )
+    assert sleeps == [60, 30, 60]
+    assert registered == ["run_1"]
@@ -0,0 +1,99 @@
+import os
+import sys
+import json
+import time
+import base64
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(myPath, "..", "code"))
+
+import azureml.core
+
+from workspace_cache import get_cache_key, get_token_expiry, load_cached_workspace, save_workspace_cache, invalidate_workspace_cache
+
+
+def create_token(expires_on):
+    payload = base64.urlsafe_b64encode(json.dumps({"exp": expires_on}).encode("utf-8")).decode("utf-8").rstrip("=")
+    return f"header.{payload}.signature"
+
+
+class FakeAuth():
+    def __init__(self, arm_token=None):
+        self._cached_arm_token = arm_token
+        self._cached_graph_token = None
+        self._cached_azureml_client_token = None
+
+
+class FakeWorkspace():
+    def __init__(self, subscription_id, resource_group, workspace_name, auth=None, _location=None, _disable_service_check=False, _workspace_id=None):
+        self.subscription_id = subscription_id
+        self.resource_group = resource_group
+        self.name = workspace_name
+        self.location = _location
+        self._workspace_id = _workspace_id
+        self._discovery_url_internal = None
+        self.discovery_url = "https://discovery"
+
+
+def write_config(tmp_path, workspace_name="workspace"):
+    (tmp_path / "aml_arm_config.json").write_text(json.dumps({
+        "subscription_id": "subscription",
+        "resource_group": "resource-group",
+        "workspace_name": workspace_name
+    }))
+
+
+def test_get_token_expiry():
+    """
+    Unit test to check the get_token_expiry function with valid and invalid tokens
+    """
+    assert get_token_expiry(create_token(expires_on=1234)) == 1234
+    assert get_token_expiry("invalid") == 0
+    assert get_token_expiry(None) == 0
+
+
+def test_get_cache_key(tmp_path):
+    """
+    Unit test to check that the get_cache_key function depends on credentials and workspace
+    """
+    credentials = {"tenantId": "tenant", "clientId": "client", "clientSecret": "secret"}
+    assert get_cache_key(credentials, "AzureCloud", str(tmp_path), "aml_arm_config.json") is None
+    write_config(tmp_path)
+    key = get_cache_key(credentials, "AzureCloud", str(tmp_path), "aml_arm_config.json")
+    assert key is not None
+    assert key != get_cache_key(dict(credentials, clientSecret="other"), "AzureCloud", str(tmp_path), "aml_arm_config.json")
+    write_config(tmp_path, workspace_name="other")
+    assert key != get_cache_key(credentials, "AzureCloud", str(tmp_path), "aml_arm_config.json")
+
+
+def test_workspace_cache_roundtrip(tmp_path, monkeypatch):
+    """
+    Unit test to check that a cached workspace and its tokens are restored and can be invalidated
+    """
+    monkeypatch.setattr(azureml.core, "Workspace", FakeWorkspace)
+    cache_file = str(tmp_path / "cache" / "cache.json")
+    token = create_token(expires_on=int(time.time()) + 3600)
+    workspace = FakeWorkspace("subscription", "resource-group", "workspace", _location="westeurope", _workspace_id="id")
+    save_workspace_cache(cache_file=cache_file, key="key", workspace=workspace, auth=FakeAuth(arm_token=token))
+    assert oct(os.stat(cache_file).st_mode & 0o777) == oct(0o600)
+
+    auth = FakeAuth()
+    cached_workspace = load_cached_workspace(cache_file=cache_file, key="key", auth=auth)
+    assert auth._cached_arm_token == token
+    assert cached_workspace.name == "workspace"
+    assert cached_workspace.location == "westeurope"
+    assert cached_workspace._workspace_id == "id"
+    assert cached_workspace._discovery_url_internal == "https://discovery"
+
+    invalidate_workspace_cache(cache_file=cache_file, key="key")
+    assert load_cached_workspace(cache_file=cache_file, key="key", auth=FakeAuth()) is None
+
+
+def test_workspace_cache_expired_token(tmp_path):
+    """
+    Unit test to check that tokens close to their expiry are not cached
+    """
+    cache_file = str(tmp_path / "cache.json")
+    workspace = FakeWorkspace("subscription", "resource-group", "workspace")
+    save_workspace_cache(cache_file=cache_file, key="key", workspace=workspace, auth=FakeAuth(arm_token=create_token(expires_on=int(time.time()) + 60)))
+    assert load_cached_workspace(cache_file=cache_file, key="key", auth=FakeAuth()) is None